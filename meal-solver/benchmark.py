@@ -0,0 +1,317 @@
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import platform
+import itertools
+import contextlib
+import subprocess
+from math import comb
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+
+import numpy as np
+
+import solver
+from solver import SOLVER_BACKENDS, prepare_problem, build_rule_model, generate_optimized_days, resolve_backend
+from matrix_model import FORMULATIONS, build_matrix_model
+
+# Per-gram macros for a pool of common ingredients (calories, protein)
+INGREDIENT_POOL = {
+    "chicken breast": (1.65, 0.31), "salmon": (2.08, 0.20), "lean beef": (2.50, 0.26),
+    "turkey": (1.35, 0.29), "tofu": (0.76, 0.08), "eggs": (1.55, 0.13),
+    "greek yogurt": (0.59, 0.10), "cottage cheese": (0.98, 0.11), "whey protein": (4.00, 0.80),
+    "white rice": (1.30, 0.027), "brown rice": (1.12, 0.026), "pasta": (1.31, 0.05),
+    "oats": (3.89, 0.169), "potato": (0.77, 0.02), "sweet potato": (0.86, 0.016),
+    "bread": (2.65, 0.09), "tortilla": (3.10, 0.08), "quinoa": (1.20, 0.044),
+    "broccoli": (0.34, 0.028), "spinach": (0.23, 0.029), "bell pepper": (0.31, 0.01),
+    "banana": (0.89, 0.011), "berries": (0.57, 0.007), "avocado": (1.60, 0.02),
+    "olive oil": (8.84, 0.0), "butter": (7.17, 0.009), "cheddar": (4.02, 0.25),
+    "peanut butter": (5.88, 0.25), "honey": (3.04, 0.003), "almonds": (5.79, 0.21),
+}
+
+def synthetic_library(num_meals, ingredients_per_meal=4, scalable_per_meal=2, seed=0):
+    rng = random.Random(seed)
+    names = sorted(INGREDIENT_POOL)
+    meals = []
+    for j in range(num_meals):
+        picked = rng.sample(names, ingredients_per_meal)
+        ingredients = []
+        for idx, name in enumerate(picked):
+            if idx < scalable_per_meal:
+                ingredients.append({"name": name, "main": 1, "grams": rng.choice([100, 150, 200])})
+            else:
+                ingredients.append({"name": name, "main": 0, "grams": rng.choice([5, 10, 20, 30, 50])})
+        meals.append({"name": f"Meal {j + 1}", "ingredients": ingredients})
+
+    ingredient_macros = {
+        name: {"calories_per_gram": cal, "protein_per_gram": prot}
+        for name, (cal, prot) in INGREDIENT_POOL.items()
+    }
+    return meals, ingredient_macros
+
+def time_call(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def compare_builders(num_meals, meals_per_day, repeat):
+    meals, ingredient_macros = synthetic_library(num_meals, seed=num_meals)
+
+    # Build every combination so both paths see the same model size
+    with contextlib.redirect_stderr(io.StringIO()):
+        problem = prepare_problem(meals, ingredient_macros, meals_per_day, 2000, 150, prescreen=False)
+        rules_time, model = time_call(lambda: build_rule_model(problem), repeat)
+        matrix_time, mm = time_call(lambda: build_matrix_model(problem), repeat)
+
+    return {
+        "meals": num_meals,
+        "mealsPerDay": meals_per_day,
+        "combinations": len(problem["combinations"]),
+        "rulesRows": model.nconstraints(),
+        "matrixRows": mm.num_rows,
+        "matrixNonzeros": mm.nnz,
+        "rulesMs": round(rules_time * 1000, 2),
+        "matrixMs": round(matrix_time * 1000, 2),
+        "speedup": round(rules_time / matrix_time, 1),
+    }
+
+# === SOLVE SUITE ===
+
+# Parameter grids of the solve suite. "quick" is meant for every change to the
+# solver, "full" before merging anything that touches the model.
+SUITES = {
+    "quick": {
+        "meals": [10],
+        "ingredientsPerMeal": [4],
+        "scalableRatio": [0.5],
+        "mealsPerDay": [2, 3, 4, 5, 6],
+        "targets": [[2000, 150]],
+    },
+    "full": {
+        "meals": [8, 12, 16],
+        "ingredientsPerMeal": [3, 5, 7],
+        "scalableRatio": [0.3, 0.6],
+        "mealsPerDay": [2, 3, 4, 5, 6],
+        "targets": [[1600, 110], [2200, 160], [2800, 210]],
+    },
+}
+
+# Measurements compared against the baseline, lower is better
+TIMED_FIELDS = ["prepareMs", "buildMs", "solveMs", "extractMs", "totalMs"]
+
+def suite_cases(grid, builder="matrix", max_combinations=None, formulation="standard", backend="auto",
+                time_limit=None):
+    cases = []
+    for num_meals, per_meal, ratio, meals_per_day, (calories, protein) in itertools.product(
+            grid["meals"], grid["ingredientsPerMeal"], grid["scalableRatio"], grid["mealsPerDay"], grid["targets"]):
+        if max_combinations is not None and comb(num_meals, meals_per_day) > max_combinations:
+            continue
+        scalable = min(per_meal, max(1, round(per_meal * ratio)))
+        case_id = f"m{num_meals}-i{per_meal}-s{scalable}-k{meals_per_day}-c{calories}-p{protein}-{builder}"
+        cases.append({
+            "id": case_id,
+            "meals": num_meals,
+            "ingredientsPerMeal": per_meal,
+            "scalablePerMeal": scalable,
+            "mealsPerDay": meals_per_day,
+            "targetCalories": calories,
+            "targetProtein": protein,
+            "builder": builder,
+            # Not part of the id, so a run with another formulation compares against
+            # a standard baseline case by case
+            "formulation": formulation,
+            "backend": backend,
+            # Seconds per solve; a case that hits it reports status timeLimit
+            "timeLimit": time_limit,
+            # Stable across grid edits, so a case always sees the same library
+            "seed": zlib.crc32(case_id.encode("utf-8")),
+        })
+    return cases
+
+def run_case(case):
+    solver.set_log_level("error")
+    meals, ingredient_macros = synthetic_library(case["meals"], case["ingredientsPerMeal"],
+                                                 case["scalablePerMeal"], seed=case["seed"])
+    result = generate_optimized_days(meals, ingredient_macros, case["mealsPerDay"],
+                                     case["targetCalories"], case["targetProtein"], builder=case["builder"],
+                                     formulation=case.get("formulation", "standard"),
+                                     backend=case.get("backend", "auto"), time_limit=case.get("timeLimit"))
+
+    metrics = result["metrics"]
+    phases = metrics["phases"]
+    def phase_ms(*names):
+        return round(sum(phases[name]["wallMs"] for name in names if name in phases), 3)
+
+    return {
+        "status": result["status"],
+        "objective": result["objective"],
+        # "auto" (or "highs" without highspy) resolves per process, record what ran
+        "solverBackend": metrics["solver"].get("backend"),
+        "combinations": result["pruning"]["kept"],
+        "rows": metrics["model"].get("rows"),
+        "nonzeros": metrics["model"].get("nonzeros"),
+        "nodes": metrics["solver"].get("nodes"),
+        "prepareMs": phase_ms("ingredientClassification", "combinationGeneration"),
+        "buildMs": phase_ms("modelConstruction"),
+        "solveMs": phase_ms("solverInvocation"),
+        "extractMs": phase_ms("resultExtraction"),
+        "totalMs": metrics["totalMs"],
+        "peakRssMb": metrics["peakRssMb"],
+        "solverPeakRssMb": metrics["solverPeakRssMb"],
+    }
+
+def measure_case(case, repeat):
+    # A fresh process per run keeps peak RSS from leaking between cases; timings
+    # are the best of all runs, the objective has to agree between runs
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            runs.append(pool.submit(run_case, case).result())
+
+    measured = dict(runs[0])
+    for field in TIMED_FIELDS + ["peakRssMb", "solverPeakRssMb"]:
+        values = [run[field] for run in runs if run[field] is not None]
+        measured[field] = min(values) if values else None
+    measured["deterministic"] = len(set((run["status"], run["objective"]) for run in runs)) == 1
+    return {**case, **measured}
+
+def environment(backend="auto"):
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "backend": resolve_backend(backend),
+        "highspy": None,
+        "glpsol": None,
+        "commit": None,
+    }
+    try:
+        info["highspy"] = metadata.version("highspy")
+    except metadata.PackageNotFoundError:
+        pass
+    glpsol = shutil.which("glpsol")
+    if glpsol is not None:
+        proc = subprocess.run([glpsol, "--version"], stdout=subprocess.PIPE, text=True)
+        info["glpsol"] = proc.stdout.splitlines()[0] if proc.stdout else None
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        pass
+    return info
+
+def compare_to_baseline(cases, baseline, tolerance, min_ms):
+    # Any change of status or objective is a correctness regression; a timing or
+    # memory field regresses when it is both tolerance-relative and min_ms worse
+    previous = {case["id"]: case for case in baseline["cases"]}
+    regressions = []
+    compared = 0
+    for case in cases:
+        old = previous.get(case["id"])
+        if old is None:
+            continue
+        compared += 1
+        if (case["status"], case["objective"]) != (old["status"], old["objective"]):
+            regressions.append(f"{case['id']}: {old['status']}/{old['objective']} -> {case['status']}/{case['objective']}")
+        if not case["deterministic"]:
+            regressions.append(f"{case['id']}: objective differs between runs")
+        for field in TIMED_FIELDS:
+            if case[field] > max(old[field] * (1 + tolerance), old[field] + min_ms):
+                regressions.append(f"{case['id']}: {field} {old[field]} -> {case[field]}")
+        if case["peakRssMb"] is not None and old.get("peakRssMb") is not None \
+                and case["peakRssMb"] > old["peakRssMb"] * (1 + tolerance):
+            regressions.append(f"{case['id']}: peakRssMb {old['peakRssMb']} -> {case['peakRssMb']}")
+    return compared, regressions
+
+def run_suite(args):
+    grid = SUITES[args.suite]
+    if args.grid:
+        with open(args.grid) as f:
+            grid = {**grid, **json.load(f)}
+
+    cases = suite_cases(grid, args.builder, args.max_combinations, args.formulation, args.backend, args.time_limit)
+    print(f"{'case':<36} {'combos':>7} {'status':>9} {'obj':>5} {'nodes':>7} {'prep ms':>9} {'build ms':>9} "
+          f"{'solve ms':>10} {'extract ms':>11} {'rss MB':>7}")
+    measured = []
+    for case in cases:
+        r = measure_case(case, args.repeat)
+        measured.append(r)
+        print(f"{r['id']:<36} {r['combinations']:>7} {r['status']:>9} {r['objective']:>5} {r['nodes'] or 0:>7} "
+              f"{r['prepareMs']:>9} {r['buildMs']:>9} {r['solveMs']:>10} {r['extractMs']:>11} {r['peakRssMb'] or '-':>7}")
+        sys.stdout.flush()
+
+    environment_info = environment(args.backend)
+    results = {"suite": args.suite, "grid": grid, "repeat": args.repeat, "environment": environment_info,
+               "cases": measured}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    baseline_backend = baseline.get("environment", {}).get("backend")
+    if baseline_backend is not None and baseline_backend != environment_info["backend"]:
+        print(f"\nNote: the baseline ran on {baseline_backend}, this run on {environment_info['backend']}")
+    compared, regressions = compare_to_baseline(measured, baseline, args.tolerance, args.min_ms)
+    print(f"\nCompared {compared} case(s) against {args.baseline} "
+          f"(tolerance {args.tolerance:.0%}, min {args.min_ms} ms)")
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    if not regressions:
+        print("  no regressions")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare model build time of the rule-based and sparse matrix paths, or with --suite run "
+                    "end-to-end solves over a grid of synthetic libraries and check them against a baseline")
+    parser.add_argument("--meals", default="6,10,15,20", help="comma separated meal library sizes")
+    parser.add_argument("--meals-per-day", default="3,4", help="comma separated meals per day")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (best time is reported)")
+    parser.add_argument("--max-combinations", type=int, default=20000, help="skip cases larger than this")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--suite", choices=list(SUITES), help="run the end-to-end solve suite with this grid")
+    parser.add_argument("--grid", help="JSON file overriding keys of the suite grid")
+    parser.add_argument("--builder", choices=["matrix", "rules"], default="matrix", help="model builder for the suite")
+    parser.add_argument("--formulation", choices=FORMULATIONS, default="standard",
+                        help="matrix model formulation for the suite")
+    parser.add_argument("--backend", choices=SOLVER_BACKENDS, default="auto", help="solver backend for the suite")
+    parser.add_argument("--time-limit", type=float, default=120.0,
+                        help="seconds per suite solve; cases that hit it report status timeLimit")
+    parser.add_argument("--baseline", help="results file of an earlier --suite run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown vs the baseline")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    if args.suite:
+        sys.exit(run_suite(args))
+
+    results = []
+    print(f"{'meals':>6} {'k':>3} {'combos':>8} {'rows(rules)':>12} {'rows(matrix)':>13} {'rules ms':>10} {'matrix ms':>10} {'speedup':>8}")
+    for num_meals in [int(x) for x in args.meals.split(",")]:
+        for meals_per_day in [int(x) for x in args.meals_per_day.split(",")]:
+            if comb(num_meals, meals_per_day) > args.max_combinations:
+                continue
+            r = compare_builders(num_meals, meals_per_day, args.repeat)
+            results.append(r)
+            print(f"{r['meals']:>6} {r['mealsPerDay']:>3} {r['combinations']:>8} {r['rulesRows']:>12} {r['matrixRows']:>13} "
+                  f"{r['rulesMs']:>10} {r['matrixMs']:>10} {r['speedup']:>7}x")
+            sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
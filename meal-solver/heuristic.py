@@ -0,0 +1,218 @@
+import time
+import numpy as np
+from matrix_model import portion_layout
+from lp_screen import screening_data, nutrients_fit
+
+# Approximate solve for large libraries. Every meal gets a list of candidate
+# portion vectors that meet its per-meal limits; a local search then picks one
+# candidate and one position per meal, scoring all combinations a move touches
+# against the day window in one vectorized pass. There is no optimality proof, so
+# results are marked heuristic (and may seed the MIP as a start). The search runs
+# until its deadline or its last perturbation round, whichever comes first; a sweep
+# costs tens of milliseconds at 30 meals / 4 per day, so without a deadline the full
+# run takes seconds there.
+
+# Portion grams per scalable ingredient are taken from this many log-spaced points
+GRID_POINTS = 16
+# Candidates kept per meal, spread over its calorie / protein range
+MAX_CANDIDATES = 128
+MAX_SWEEPS = 50
+# Perturb-and-repair rounds after the first local optimum
+PERTURB_ROUNDS = 30
+# Seconds of search a request gets unless it sets heuristicSeconds (its timeLimit,
+# when shorter, still applies)
+TIME_BUDGET = 0.5
+
+def meal_candidates(data, j):
+    # (grams, calories, protein, tracked nutrient amounts) of the candidate portion
+    # vectors of meal j
+    settings = data["settings"]
+    ptr = data["meal_ptr"]
+    size = ptr[j + 1] - ptr[j]
+    grid = np.geomspace(settings["min_portion_grams"], settings["max_portion_grams"], GRID_POINTS)
+    if size == 0:
+        grams = np.zeros((1, 0))
+    elif size == 1:
+        grams = grid[:, None]
+    else:
+        # One ingredient at one grid point, all others at another
+        a, b = np.meshgrid(grid, grid, indexing="ij")
+        a, b = a.ravel(), b.ravel()
+        blocks = []
+        for i in range(size):
+            block = np.repeat(b[:, None], size, axis=1)
+            block[:, i] = a
+            blocks.append(block)
+        grams = np.unique(np.concatenate(blocks), axis=0)
+
+    calories = data["fixed_cal"][j] + grams @ data["portion_cal"][ptr[j]:ptr[j + 1]]
+    protein = data["fixed_prot"][j] + grams @ data["portion_prot"][ptr[j]:ptr[j + 1]]
+    cpg = settings["calories_per_gram_protein"]
+    ok = (
+        (calories >= settings["meal_min_calories"]) & (calories <= settings["meal_max_calories"]) &
+        (cpg * protein >= settings["meal_protein_min_pct"] * calories) &
+        (cpg * protein <= settings["meal_protein_max_pct"] * calories)
+    )
+    nutrients = data["nutrients"]
+    if nutrients is None:
+        amounts = np.zeros((len(grams), 0))
+    else:
+        amounts = nutrients["fixed"][j] + grams @ nutrients["portion"][ptr[j]:ptr[j + 1]]
+        ok &= ((amounts >= nutrients["meal_lower"]) & (amounts <= nutrients["meal_upper"])).all(axis=1)
+    grams, calories, protein, amounts = grams[ok], calories[ok], protein[ok], amounts[ok]
+    if len(grams) > MAX_CANDIDATES:
+        order = np.lexsort((protein, calories))
+        keep = order[np.linspace(0, len(order) - 1, MAX_CANDIDATES).round().astype(np.int64)]
+        grams, calories, protein, amounts = grams[keep], calories[keep], protein[keep], amounts[keep]
+    return grams, calories, protein, amounts
+
+def in_window(day_cal, day_prot, day_nut, data):
+    cal_lo, cal_hi = data["day_calories"]
+    prot_lo, prot_hi = data["day_protein"]
+    fits = (day_cal >= cal_lo) & (day_cal <= cal_hi) & (day_prot >= prot_lo) & (day_prot <= prot_hi)
+    if data["nutrients"] is not None:
+        fits &= nutrients_fit(day_nut, data["nutrients"])
+    return fits
+
+def local_search(state, context, deadline=None):
+    # Sweeps over the meals: each one moves to the (candidate, position) that makes the
+    # most of its combinations valid, given everyone else's current choice
+    position, choice, meal_cal, meal_prot, meal_nut = state
+    combos, weights, candidates, member_ptr, member_combo, member_slot, k, data = context
+    sweeps = 0
+    moves = 0
+    improved = True
+    while improved and sweeps < MAX_SWEEPS and (deadline is None or time.perf_counter() < deadline):
+        improved = False
+        sweeps += 1
+        for j in range(len(candidates)):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            _, calories, protein, amounts = candidates[j]
+            rows = member_combo[member_ptr[j]:member_ptr[j + 1]]
+            if len(calories) == 0 or len(rows) == 0:
+                continue
+            slots = member_slot[member_ptr[j]:member_ptr[j + 1]]
+            members = combos[rows]
+            others_ok = ((position[members] == np.arange(k)) | (members == j)).all(axis=1)
+            others_cal = meal_cal[members].sum(axis=1) - meal_cal[j]
+            others_prot = meal_prot[members].sum(axis=1) - meal_prot[j]
+            others_nut = meal_nut[members].sum(axis=1) - meal_nut[j]
+
+            fits = in_window(others_cal[None, :] + calories[:, None], others_prot[None, :] + protein[:, None],
+                             others_nut[None, :, :] + amounts[:, None, :], data)
+            slot_weights = np.zeros((len(rows), k))
+            slot_weights[np.arange(len(rows)), slots] = weights[rows] * others_ok
+            score = fits.astype(float) @ slot_weights
+
+            current = score[choice[j], position[j]] if position[j] >= 0 else 0.0
+            best = np.unravel_index(score.argmax(), score.shape)
+            if score[best] > current + 1e-9:
+                choice[j], position[j] = best
+                meal_cal[j], meal_prot[j], meal_nut[j] = calories[choice[j]], protein[choice[j]], amounts[choice[j]]
+                improved = True
+                moves += 1
+    return sweeps, moves
+
+def valid_combinations(state, combos, k, data):
+    position, _, meal_cal, meal_prot, meal_nut = state
+    return (position[combos] == np.arange(k)).all(axis=1) & in_window(
+        meal_cal[combos].sum(axis=1), meal_prot[combos].sum(axis=1), meal_nut[combos].sum(axis=1), data)
+
+def solve_heuristic(problem, deadline=None):
+    data = screening_data(problem)
+    meals = problem["meals"]
+    combos = problem["combination_indices"]
+    n = len(meals)
+    k = problem["meals_per_day"]
+    C = len(combos)
+    weights = problem.get("combination_weights")
+    weights = np.ones(C) if weights is None else np.asarray(weights, dtype=float)
+    candidates = [meal_candidates(data, j) for j in range(n)]
+
+    # The combinations each meal is in, and its slot in them
+    order = np.argsort(combos.ravel(), kind="stable")
+    member_ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(combos.ravel(), minlength=n), out=member_ptr[1:])
+    member_combo = order // k
+    member_slot = order % k
+    context = (combos, weights, candidates, member_ptr, member_combo, member_slot, k, data)
+    movable = [j for j in range(n) if len(candidates[j][1]) > 0 and member_ptr[j] < member_ptr[j + 1]]
+
+    # Start: every meal in its most common slot, with the candidate nearest to its
+    # share of the day targets
+    position = np.full(n, -1)
+    choice = np.full(n, -1)
+    meal_cal = np.zeros(n)
+    meal_prot = np.zeros(n)
+    meal_nut = np.zeros((n, 0 if data["nutrients"] is None else len(data["nutrients"]["day_lower"])))
+    settings = problem["settings"]
+    for j in movable:
+        _, calories, protein, amounts = candidates[j]
+        position[j] = np.bincount(member_slot[member_ptr[j]:member_ptr[j + 1]], minlength=k).argmax()
+        distance = (((calories - problem["target_calories"] / k) / settings["calorie_slack"]) ** 2 +
+                    ((protein - problem["target_protein"] / k) / settings["protein_slack"]) ** 2)
+        choice[j] = distance.argmin()
+        meal_cal[j], meal_prot[j], meal_nut[j] = calories[choice[j]], protein[choice[j]], amounts[choice[j]]
+
+    state = (position, choice, meal_cal, meal_prot, meal_nut)
+    sweeps, moves = local_search(state, context, deadline)
+    best_state = tuple(a.copy() for a in state)
+    best = weights[valid_combinations(state, combos, k, data)].sum()
+
+    # Iterated local search: a few meals jump to a random candidate and slot, the search
+    # repairs around them, and the result is kept when it is no worse. Seeded, so the
+    # same request gives the same plan.
+    rng = np.random.default_rng(0)
+    rounds = 0
+    for _ in range(PERTURB_ROUNDS if movable else 0):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        rounds += 1
+        for j in rng.choice(movable, size=min(len(movable), max(2, n // 10)), replace=False).tolist():
+            _, calories, protein, amounts = candidates[j]
+            choice[j] = rng.integers(len(calories))
+            position[j] = rng.choice(member_slot[member_ptr[j]:member_ptr[j + 1]])
+            meal_cal[j], meal_prot[j], meal_nut[j] = calories[choice[j]], protein[choice[j]], amounts[choice[j]]
+        round_sweeps, round_moves = local_search(state, context, deadline)
+        sweeps += round_sweeps
+        moves += round_moves
+        objective = weights[valid_combinations(state, combos, k, data)].sum()
+        if objective >= best:
+            best = objective
+            best_state = tuple(a.copy() for a in state)
+        else:
+            for a, kept in zip(state, best_state):
+                a[:] = kept
+
+    position, choice, meal_cal, meal_prot, meal_nut = best_state
+    valid = valid_combinations(best_state, combos, k, data)
+    used = position >= 0
+
+    portion_keys, _, _, _ = portion_layout(problem)
+    ptr = data["meal_ptr"]
+    grams = np.zeros(ptr[-1])
+    for j in np.flatnonzero(used).tolist():
+        grams[ptr[j]:ptr[j + 1]] = candidates[j][0][choice[j]]
+
+    return {
+        "status": "heuristic",
+        "objective": float(weights[valid].sum()),
+        "stats": {
+            "solver": {
+                "backend": "heuristic",
+                "termination": "heuristic",
+                "nodes": 0,
+                "gapPct": None,
+                "limit": None,
+                "sweeps": sweeps,
+                "moves": moves,
+                "rounds": rounds,
+                "candidates": int(sum(len(c[0]) for c in candidates)),
+            },
+        },
+        "meal_used": {m: float(used[j]) for j, m in enumerate(meals)},
+        "meal_position": {(m, p): float(position[j] == p) for j, m in enumerate(meals) for p in range(k)},
+        "meal_portions": dict(zip(portion_keys, grams.tolist())),
+        "combination_valid": valid.astype(float).tolist(),
+    }
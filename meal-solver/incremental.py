@@ -0,0 +1,129 @@
+import numpy as np
+from result_cache import meal_fingerprint
+
+# Output grams are rounded to 0.1 g, so the exact previous portion lies within this
+# distance of the reported value
+GRAMS_ROUNDING = 0.05
+
+# "keep" pins unchanged meals to their previous positions and portions, "warm" only
+# starts from the previous plan
+INCREMENTAL_MODES = ["keep", "warm"]
+
+def check_previous(previous):
+    # A previous result is usable only as a complete single-day result (either schema)
+    if not isinstance(previous, dict):
+        raise ValueError("previous must be a result object")
+    if "error" in previous:
+        raise ValueError("previous is an error response, not a result")
+    if "streamedDays" in previous:
+        raise ValueError("previous is a streamed result without its days; pass the result with validDays")
+    if "validDays" not in previous:
+        raise ValueError("previous has no validDays; only single-day results can be used for an incremental solve")
+    days = previous["validDays"]
+    if not isinstance(days, list) or not all(
+            isinstance(day, dict) and all(field in day for field in ("meals", "positions", "ingredientPortions"))
+            for day in days):
+        raise ValueError("previous validDays must be days with meals, positions and ingredientPortions")
+    if not isinstance(previous.get("fingerprint"), dict):
+        raise ValueError("Previous result has no fingerprint, it cannot be used for an incremental solve")
+
+def solution_fingerprint(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein,
+                         nutrients=None):
+    # nutrients: the tracked nutrient bounds as requested, None when there are none
+    names = list(nutrients) if nutrients else ()
+    fingerprint = {
+        "meals": {meal["name"]: meal_fingerprint(meal, ingredient_macros, names) for meal in meals_input},
+        "mealsPerDay": meals_per_day,
+        "targetCalories": target_calories,
+        "targetProtein": target_protein,
+    }
+    if nutrients:
+        fingerprint["nutrients"] = nutrients
+    return fingerprint
+
+def diff_previous(fingerprint, previous):
+    old = previous.get("fingerprint")
+    if old is None:
+        raise ValueError("Previous result has no fingerprint, it cannot be used for an incremental solve")
+
+    old_meals = old["meals"]
+    new_meals = fingerprint["meals"]
+    return {
+        "changedMeals": [m for m in new_meals if m in old_meals and old_meals[m] != new_meals[m]],
+        "addedMeals": [m for m in new_meals if m not in old_meals],
+        "removedMeals": [m for m in old_meals if m not in new_meals],
+        "targetsChanged": (
+            old["targetCalories"] != fingerprint["targetCalories"] or
+            old["targetProtein"] != fingerprint["targetProtein"] or
+            old.get("nutrients") != fingerprint.get("nutrients")
+        ),
+        "mealsPerDayChanged": old["mealsPerDay"] != fingerprint["mealsPerDay"],
+    }
+
+def delta_is_empty(delta):
+    return not (delta["changedMeals"] or delta["addedMeals"] or delta["removedMeals"]
+                or delta["targetsChanged"] or delta["mealsPerDayChanged"])
+
+def warm_start_from_previous(problem, previous, delta, mode):
+    # Meals whose data is unchanged keep the positions and portions of the previous
+    # solution. The previous days built only from such meals are still feasible, so
+    # their count is a valid lower bound (cutoff) on the new optimum.
+    if delta["targetsChanged"] or delta["mealsPerDayChanged"]:
+        return None
+
+    touched = set(delta["changedMeals"]) | set(delta["addedMeals"]) | set(delta["removedMeals"])
+    meals = set(problem["meals"])
+
+    kept_days = [day for day, _ in carried_days(problem, previous["validDays"])
+                 if not touched.intersection(day["meals"])]
+    start = {"cutoff": len(kept_days), "fixed_meals": {}, "solution": previous_plan(problem, kept_days)}
+    if mode != "keep":
+        return start
+
+    for day in kept_days:
+        for m in day["meals"]:
+            if m in start["fixed_meals"] or m not in meals:
+                continue
+            portions = {}
+            for i in problem["scalable_ingredients"][m]:
+                grams = day["ingredientPortions"].get(m, {}).get(i, {}).get("grams")
+                if grams is None:
+                    break
+                portions[i] = (max(0.0, grams - GRAMS_ROUNDING), grams + GRAMS_ROUNDING)
+            else:
+                start["fixed_meals"][m] = {"position": day["positions"][m], "portions": portions}
+
+    return start
+
+def carried_days(problem, days):
+    # The previous days that are still days of the new model, with their combination
+    # index: slot p of a combination holds its p-th meal in input order, so a day whose
+    # meals were reordered in the library no longer matches its previous positions
+    order = {m: j for j, m in enumerate(problem["meals"])}
+    combination_index = {combo: c for c, combo in enumerate(problem["combinations"])}
+    carried = []
+    for day in days:
+        if not all(m in order for m in day["meals"]):
+            continue
+        combo = tuple(sorted(day["meals"], key=order.get))
+        c = combination_index.get(combo)
+        if c is not None and all(day["positions"][m] == p for p, m in enumerate(combo)):
+            carried.append((day, c))
+    return carried
+
+def previous_plan(problem, days):
+    # The given previous days as a solution dict without portions: their meals in their
+    # previous positions and their combinations valid. As a partial MIP start HiGHS
+    # recomputes the portions, which the previous result only reports rounded.
+    k = problem["meals_per_day"]
+    position = {}
+    valid = np.zeros(len(problem["combinations"]))
+    for day, c in carried_days(problem, days):
+        valid[c] = 1.0
+        position.update((m, day["positions"][m]) for m in day["meals"])
+    return {
+        "meal_used": {m: float(m in position) for m in problem["meals"]},
+        "meal_position": {(m, p): float(position.get(m) == p) for m in problem["meals"] for p in range(k)},
+        "meal_portions": None,
+        "combination_valid": valid.tolist(),
+    }
@@ -0,0 +1,121 @@
+import sys
+import json
+import argparse
+from collections.abc import Mapping
+import numpy as np
+
+# Per-gram nutrient columns every table has; any other "<nutrient>_per_gram" key
+# that all ingredients carry is stored as well
+NUTRIENTS = ["calories_per_gram", "protein_per_gram"]
+
+# Shared ingredient library: one record per ingredient, its id is the record index.
+# Stored as a plain .npy structured array so worker processes can map the same file
+# read-only instead of each holding (and parsing) their own copy.
+
+class IngredientTable:
+    def __init__(self, records):
+        self.records = records
+        self.ids = {name: i for i, name in enumerate(records["name"].tolist())}
+        self.nutrients = [field for field in records.dtype.names if field != "name"]
+        self.columns = {nutrient: records[nutrient] for nutrient in self.nutrients}
+
+    def __len__(self):
+        return len(self.records)
+
+    def id_of(self, name):
+        if name not in self.ids:
+            raise ValueError(f"Ingredient '{name}' is not in the ingredient table")
+        return self.ids[name]
+
+    def name_of(self, ingredient_id):
+        if not isinstance(ingredient_id, int) or isinstance(ingredient_id, bool):
+            raise ValueError(f"Ingredient id {ingredient_id!r} must be an integer")
+        if not 0 <= ingredient_id < len(self.records):
+            raise ValueError(f"Ingredient id {ingredient_id} is not in the ingredient table")
+        return str(self.records["name"][ingredient_id])
+
+class TableRow(Mapping):
+    # One record's per-gram values, read from the table columns on access
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, nutrient):
+        return float(self.table.columns[nutrient][self.row])
+
+    def __iter__(self):
+        return iter(self.table.nutrients)
+
+    def __len__(self):
+        return len(self.table.nutrients)
+
+class TableMacros(Mapping):
+    # The ingredient_macros of a request backed by the table: the request's own entries,
+    # then a table row for each other ingredient it uses (rows never repeats own).
+    # per_gram() gathers a whole column slice at once instead of going through
+    # per-ingredient mappings.
+    def __init__(self, table, own, rows):
+        self.table = table
+        self.own = own
+        self.rows = rows
+
+    def __getitem__(self, name):
+        if name in self.own:
+            return self.own[name]
+        return TableRow(self.table, self.rows[name])
+
+    def __contains__(self, name):
+        return name in self.own or name in self.rows
+
+    def __iter__(self):
+        yield from self.own
+        yield from self.rows
+
+    def __len__(self):
+        return len(self.own) + len(self.rows)
+
+    def per_gram(self, names, nutrient):
+        values = np.empty(len(names))
+        from_table = [j for j, name in enumerate(names) if name not in self.own]
+        rows = np.array([self.rows[names[j]] for j in from_table], dtype=np.int64)
+        values[from_table] = self.table.columns[nutrient][rows]
+        for j, name in enumerate(names):
+            if name in self.own:
+                values[j] = self.own[name][nutrient]
+        return values
+
+def per_gram_values(ingredient_macros, names, nutrient):
+    # Per-gram values of these ingredients as one array
+    if isinstance(ingredient_macros, TableMacros):
+        return ingredient_macros.per_gram(names, nutrient)
+    return np.array([ingredient_macros[name][nutrient] for name in names], dtype=float)
+
+def build_table(ingredient_macros):
+    names = sorted(ingredient_macros)
+    width = max([len(name) for name in names] + [1])
+    shared = set.intersection(*(set(ingredient_macros[name]) for name in names)) if names else set()
+    nutrients = NUTRIENTS + sorted(key for key in shared if key.endswith("_per_gram") and key not in NUTRIENTS)
+    records = np.zeros(len(names), dtype=[("name", f"U{width}")] + [(nutrient, "f8") for nutrient in nutrients])
+    records["name"] = names
+    for nutrient in nutrients:
+        records[nutrient] = [float(ingredient_macros[name][nutrient]) for name in names]
+    return IngredientTable(records)
+
+def save_table(table, path):
+    np.save(path, table.records, allow_pickle=False)
+
+def load_table(path):
+    return IngredientTable(np.load(path, mmap_mode="r", allow_pickle=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the shared ingredient table from an ingredientMacros JSON object")
+    parser.add_argument("macros", help="JSON file with {name: {calories_per_gram, protein_per_gram, ...}} ('-' for stdin)")
+    parser.add_argument("table", help="output .npy file")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.macros == "-" else open(args.macros)
+    with source:
+        table = build_table(json.load(source))
+    save_table(table, args.table)
+    # The name -> id map the app sends ids from
+    print(json.dumps(table.ids))
@@ -0,0 +1,266 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from matrix_model import portion_layout
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# Exact standalone check of every combination: can its meals, used on their own,
+# meet the per-meal limits and the daily window at the same time? That is a tiny LP
+# per combination, independent of all others, so chunks of them are spread over a
+# process pool. The interval prescreen answers a relaxation of the same question.
+# Each feasible combination keeps the portions its LP found, from which a MIP start
+# is assembled.
+
+# Combinations per task handed to a worker
+CHUNK_SIZE = 2048
+
+# Set by init_screen() in every process that screens
+screen_state = None
+
+def screening_available():
+    return highspy is not None
+
+def screening_data(problem):
+    # Everything a worker needs, as plain arrays: per-meal ragged portion coefficients
+    # (in portion column order), fixed totals and the bounds
+    meals = problem["meals"]
+    settings = problem["settings"]
+    _, portion_meal, portion_ids, portion_counts = portion_layout(problem)
+    meal_ptr = np.zeros(len(meals) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(portion_meal, minlength=len(meals)), out=meal_ptr[1:])
+    nutrients = problem.get("nutrients")
+    if nutrients is not None:
+        # (portion x nutrient) coefficients, (meal x nutrient) fixed amounts and the bounds
+        nutrients = {
+            "portion": portion_counts[:, None] * nutrients["per_gram"][portion_ids],
+            "fixed": nutrients["fixed"],
+            "meal_lower": nutrients["meal_lower"],
+            "meal_upper": nutrients["meal_upper"],
+            "day_lower": nutrients["day_lower"],
+            "day_upper": nutrients["day_upper"],
+        }
+    return {
+        "meal_ptr": meal_ptr,
+        "portion_cal": portion_counts * problem["calories_per_gram"][portion_ids],
+        "portion_prot": portion_counts * problem["protein_per_gram"][portion_ids],
+        "fixed_cal": np.array([problem["fixed_meal_calories"][m] for m in meals], dtype=float),
+        "fixed_prot": np.array([problem["fixed_meal_protein"][m] for m in meals], dtype=float),
+        "settings": settings,
+        "target_calories": problem["target_calories"],
+        "target_protein": problem["target_protein"],
+        "day_calories": (problem["target_calories"] - settings["calorie_slack"],
+                         problem["target_calories"] + settings["calorie_slack"]),
+        "day_protein": (problem["target_protein"] - settings["protein_slack"],
+                        problem["target_protein"] + settings["protein_slack"]),
+        "nutrients": nutrients,
+    }
+
+def nutrients_fit(day_nut, nutrients, tol=0.0):
+    # Whether day amounts (..., nutrient) are within every tracked nutrient's day bounds
+    return ((day_nut >= nutrients["day_lower"] - tol) & (day_nut <= nutrients["day_upper"] + tol)).all(axis=-1)
+
+def init_screen(data):
+    global screen_state
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    screen_state = {"data": data, "highs": h}
+
+def combination_lp(combo, data):
+    # Columns: the combination's portions, meal by meal, at min..max grams (every meal
+    # is used), then the day's calorie and protein deviations above / below target.
+    # Rows: per meal its calorie window and both protein-balance limits, then the day
+    # totals, which hit the target up to deviations bounded by the slack. Tracked
+    # nutrients add a ranged row per meal and per day. Minimising the relative deviation
+    # keeps portions away from the window edges, so they are more likely to suit the
+    # meals' other combinations as well.
+    settings = data["settings"]
+    ptr = data["meal_ptr"]
+    cal_min, cal_max = settings["meal_min_calories"], settings["meal_max_calories"]
+    lo_pct, hi_pct = settings["meal_protein_min_pct"], settings["meal_protein_max_pct"]
+    cpg = settings["calories_per_gram_protein"]
+
+    blocks = [np.arange(ptr[j], ptr[j + 1]) for j in combo]
+    entries = np.concatenate(blocks)
+    cal = data["portion_cal"][entries]
+    prot = data["portion_prot"][entries]
+    fixed_cal = data["fixed_cal"][list(combo)]
+    fixed_prot = data["fixed_prot"][list(combo)]
+
+    index = []
+    value = []
+    start = [0]
+    offset = 0
+    for block in blocks:
+        local = np.arange(offset, offset + len(block))
+        block_cal = cal[offset:offset + len(block)]
+        block_prot = prot[offset:offset + len(block)]
+        for coefficients in (block_cal, cpg * block_prot - lo_pct * block_cal, cpg * block_prot - hi_pct * block_cal):
+            index.append(local)
+            value.append(coefficients)
+            start.append(start[-1] + len(block))
+        offset += len(block)
+    P = len(entries)
+    everything = np.arange(P)
+    index += [everything, [P, P + 1], everything, [P + 2, P + 3]]
+    value += [cal, [-1.0, 1.0], prot, [-1.0, 1.0]]
+    start += [start[-1] + P + 2, start[-1] + 2 * P + 4]
+
+    lower = np.column_stack([cal_min - fixed_cal, lo_pct * fixed_cal - cpg * fixed_prot,
+                             np.full(len(combo), -np.inf)]).ravel()
+    upper = np.column_stack([cal_max - fixed_cal, np.full(len(combo), np.inf),
+                             hi_pct * fixed_cal - cpg * fixed_prot]).ravel()
+    day = [data["target_calories"] - fixed_cal.sum(), data["target_protein"] - fixed_prot.sum()]
+    row_lower = [lower, day]
+    row_upper = [upper, day]
+    cal_slack, prot_slack = settings["calorie_slack"], settings["protein_slack"]
+
+    nutrients = data["nutrients"]
+    if nutrients is not None:
+        nut = nutrients["portion"][entries]
+        fixed_nut = nutrients["fixed"][list(combo)]
+        offset = 0
+        for block in blocks:
+            local = np.arange(offset, offset + len(block))
+            for coefficients in nut[offset:offset + len(block)].T:
+                index.append(local)
+                value.append(coefficients)
+                start.append(start[-1] + len(block))
+            offset += len(block)
+        for coefficients in nut.T:
+            index.append(everything)
+            value.append(coefficients)
+            start.append(start[-1] + P)
+        row_lower += [(nutrients["meal_lower"] - fixed_nut).ravel(), nutrients["day_lower"] - fixed_nut.sum(axis=0)]
+        row_upper += [(nutrients["meal_upper"] - fixed_nut).ravel(), nutrients["day_upper"] - fixed_nut.sum(axis=0)]
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = P + 4
+    lp.num_row_ = len(start) - 1
+    lp.col_cost_ = np.concatenate([np.zeros(P), [1 / cal_slack, 1 / cal_slack, 1 / prot_slack, 1 / prot_slack]])
+    lp.col_lower_ = np.concatenate([np.full(P, float(settings["min_portion_grams"])), np.zeros(4)])
+    lp.col_upper_ = np.concatenate([np.full(P, float(settings["max_portion_grams"])),
+                                    [cal_slack, cal_slack, prot_slack, prot_slack]])
+    lp.row_lower_ = np.concatenate(row_lower)
+    lp.row_upper_ = np.concatenate(row_upper)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.num_col_ = P + 4
+    lp.a_matrix_.num_row_ = len(start) - 1
+    lp.a_matrix_.start_ = np.array(start, dtype=np.int32)
+    lp.a_matrix_.index_ = np.concatenate(index).astype(np.int32)
+    lp.a_matrix_.value_ = np.concatenate(value).astype(float)
+    return lp
+
+def screen_chunk(combos):
+    # (feasible mask, portions of every feasible combination); a combination whose LP
+    # ends in any status other than infeasible is kept
+    h = screen_state["highs"]
+    data = screen_state["data"]
+    feasible = np.ones(len(combos), dtype=bool)
+    portions = []
+    for c, combo in enumerate(combos.tolist()):
+        h.passModel(combination_lp(combo, data))
+        h.run()
+        status = h.getModelStatus()
+        if status == highspy.HighsModelStatus.kInfeasible:
+            feasible[c] = False
+        elif status == highspy.HighsModelStatus.kOptimal:
+            portions.append(np.asarray(h.getSolution().col_value)[:-4])
+        else:
+            portions.append(None)
+    return feasible, portions
+
+def screen_combinations(problem, workers=1):
+    # Returns the feasible mask over problem["combination_indices"] and, for each
+    # feasible combination, its standalone portions (None when the LP gave none)
+    data = screening_data(problem)
+    combos = problem["combination_indices"]
+    chunks = [combos[i:i + CHUNK_SIZE] for i in range(0, len(combos), CHUNK_SIZE)]
+    if workers <= 1 or len(chunks) <= 1:
+        init_screen(data)
+        results = [screen_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=init_screen,
+                                 initargs=(data,)) as pool:
+            results = list(pool.map(screen_chunk, chunks))
+    feasible = np.concatenate([r[0] for r in results]) if results else np.zeros(0, dtype=bool)
+    portions = [p for r in results for p in r[1]]
+    return feasible, portions
+
+def greedy_start(problem, mm, portions, tol=1e-9):
+    # MIP start from the standalone portions. Combinations are taken in order; one is
+    # accepted when each of its meals is still free or already sits in the combination's
+    # slot, and the day stays in its window with the portions already chosen. Accepted
+    # meals keep that combination's portions, which meet their per-meal limits on their
+    # own. Finally every combination is checked against the chosen portions (and the
+    # tracked nutrients' day bounds).
+    data = screening_data(problem)
+    combos = problem["combination_indices"]
+    n = len(problem["meals"])
+    k = problem["meals_per_day"]
+    ptr = data["meal_ptr"]
+    cal_lo, cal_hi = data["day_calories"]
+    prot_lo, prot_hi = data["day_protein"]
+    nutrients = data["nutrients"]
+
+    grams = np.zeros(ptr[-1])
+    position = np.full(n, -1)
+    for combo, x in zip(combos.tolist(), portions):
+        if x is None:
+            continue
+        trial = x.copy()
+        offset = 0
+        fits = True
+        for slot, j in enumerate(combo):
+            size = ptr[j + 1] - ptr[j]
+            if position[j] >= 0:
+                if position[j] != slot:
+                    fits = False
+                    break
+                trial[offset:offset + size] = grams[ptr[j]:ptr[j + 1]]
+            offset += size
+        if not fits:
+            continue
+        entries = np.concatenate([np.arange(ptr[j], ptr[j + 1]) for j in combo])
+        day_cal = data["fixed_cal"][list(combo)].sum() + trial @ data["portion_cal"][entries]
+        day_prot = data["fixed_prot"][list(combo)].sum() + trial @ data["portion_prot"][entries]
+        if not (cal_lo - tol <= day_cal <= cal_hi + tol and prot_lo - tol <= day_prot <= prot_hi + tol):
+            continue
+        if nutrients is not None:
+            day_nut = nutrients["fixed"][list(combo)].sum(axis=0) + trial @ nutrients["portion"][entries]
+            if not nutrients_fit(day_nut, nutrients, tol):
+                continue
+        offset = 0
+        for slot, j in enumerate(combo):
+            size = ptr[j + 1] - ptr[j]
+            if position[j] < 0:
+                grams[ptr[j]:ptr[j + 1]] = trial[offset:offset + size]
+                position[j] = slot
+            offset += size
+
+    used = position >= 0
+    portion_meal = np.repeat(np.arange(n), np.diff(ptr))
+    meal_cal = np.where(used, data["fixed_cal"], 0.0) + np.bincount(portion_meal, grams * data["portion_cal"], minlength=n)
+    meal_prot = np.where(used, data["fixed_prot"], 0.0) + np.bincount(portion_meal, grams * data["portion_prot"], minlength=n)
+    day_cal = meal_cal[combos].sum(axis=1)
+    day_prot = meal_prot[combos].sum(axis=1)
+    valid = (
+        (position[combos] == np.arange(k)).all(axis=1) &
+        (day_cal >= cal_lo - tol) & (day_cal <= cal_hi + tol) & (day_prot >= prot_lo - tol) & (day_prot <= prot_hi + tol)
+    )
+    if nutrients is not None:
+        meal_nut = np.where(used[:, None], nutrients["fixed"], 0.0)
+        np.add.at(meal_nut, portion_meal, grams[:, None] * nutrients["portion"])
+        valid &= nutrients_fit(meal_nut[combos].sum(axis=1), nutrients, tol)
+
+    columns = mm.columns
+    start = np.zeros(mm.num_cols)
+    start[:ptr[-1]] = grams / mm.col_scale[:ptr[-1]]
+    for j, m in enumerate(problem["meals"]):
+        if used[j]:
+            start[columns["meal_used"][m]] = 1.0
+            start[columns["meal_position"][m, int(position[j])]] = 1.0
+    start[columns["combination_valid"]] = valid
+    return start, int(valid.sum())
@@ -0,0 +1,726 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+from prescreen import meal_intervals
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# Sparse (CSR) form of the day-combination MIP. Columns are laid out as
+# [meal portions | meal used | meal position | combination valid], where
+# portion columns exist only for each meal's own scalable ingredients.
+
+FORMULATIONS = ["standard", "tight"]
+
+# Portion unit of the tight formulation: hectograms keep the gram coefficients
+# (calories / protein per gram) and the portion bounds near 1
+TIGHT_PORTION_UNIT = 100.0
+
+class MatrixModel:
+    def __init__(self):
+        self.num_cols = 0
+        self.col_lower = []
+        self.col_upper = []
+        self.col_integer = []
+        self.col_scale = []
+        self.objective = []
+        self.row_blocks = []
+        self.num_rows = 0
+        self.row_lower = []
+        self.row_upper = []
+        self.columns = {}
+
+    def add_columns(self, count, lower=0.0, upper=np.inf, integer=False, cost=0.0, scale=1.0):
+        # A column with scale s holds value / s; bounds are given in its own units
+        start = self.num_cols
+        self.num_cols += count
+        self.col_lower.append(np.full(count, lower, dtype=float))
+        self.col_upper.append(np.full(count, upper, dtype=float))
+        self.col_integer.append(np.full(count, integer, dtype=bool))
+        self.col_scale.append(np.full(count, scale, dtype=float))
+        self.objective.append(np.full(count, cost, dtype=float))
+        return np.arange(start, start + count)
+
+    def add_rows(self, count, rows, cols, vals, lower=-np.inf, upper=np.inf):
+        # rows are local to this block (0..count-1)
+        start = self.num_rows
+        self.num_rows += count
+        self.row_blocks.append((np.asarray(rows) + start, np.asarray(cols), np.asarray(vals, dtype=float)))
+        self.row_lower.append(np.broadcast_to(np.asarray(lower, dtype=float), (count,)))
+        self.row_upper.append(np.broadcast_to(np.asarray(upper, dtype=float), (count,)))
+
+    def finalize(self, scale_rows=False):
+        self.col_lower = np.concatenate(self.col_lower)
+        self.col_upper = np.concatenate(self.col_upper)
+        self.col_integer = np.concatenate(self.col_integer)
+        self.col_scale = np.concatenate(self.col_scale)
+        self.objective = np.concatenate(self.objective)
+        self.row_lower = np.concatenate(self.row_lower)
+        self.row_upper = np.concatenate(self.row_upper)
+
+        rows = np.concatenate([b[0] for b in self.row_blocks])
+        cols = np.concatenate([b[1] for b in self.row_blocks])
+        vals = np.concatenate([b[2] for b in self.row_blocks])
+        self.row_blocks = None
+
+        order = np.argsort(rows, kind="stable")
+        self.indices = cols[order].astype(np.int64)
+        self.data = vals[order]
+        self.indptr = np.zeros(self.num_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.num_rows), out=self.indptr[1:])
+
+        if scale_rows:
+            # Divide every row by its largest coefficient so all rows are on the same scale
+            lengths = np.diff(self.indptr)
+            row_max = np.ones(self.num_rows)
+            nonempty = lengths > 0
+            row_max[nonempty] = np.maximum.reduceat(np.abs(self.data), self.indptr[:-1][nonempty])
+            row_max[row_max == 0] = 1.0
+            self.data = self.data / np.repeat(row_max, lengths)
+            self.row_lower = self.row_lower / row_max
+            self.row_upper = self.row_upper / row_max
+        return self
+
+    def unscale(self, values):
+        # Column values in their natural units (grams for portions)
+        return np.asarray(values, dtype=float) * self.col_scale
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+def gather_rows(groups, ptr, cols, vals):
+    # For each row of `groups` (e.g. the meals of a combination), concatenate the
+    # ragged per-meal entries ptr[m]:ptr[m+1] of `cols` / `vals`
+    flat = groups.ravel()
+    lengths = ptr[flat + 1] - ptr[flat]
+    offsets = np.cumsum(lengths) - lengths
+    pos = np.arange(lengths.sum()) - np.repeat(offsets, lengths) + np.repeat(ptr[flat], lengths)
+    row_lengths = lengths.reshape(groups.shape).sum(axis=1)
+    rows = np.repeat(np.arange(len(groups)), row_lengths)
+    return rows, cols[pos], vals[pos]
+
+def build_matrix_model(problem, warm_start=None, window_combinations=None, aggregate_positions=False, week=None,
+                       formulation="standard"):
+    meals = problem["meals"]
+    combos = problem["combination_indices"]
+    settings = problem["settings"]
+    n = len(meals)
+    k = problem["meals_per_day"]
+    C = len(combos)
+    if formulation not in FORMULATIONS:
+        raise ValueError(f"Unknown formulation '{formulation}'")
+    tight = formulation == "tight"
+    unit = TIGHT_PORTION_UNIT if tight else 1.0
+
+    mm = MatrixModel()
+
+    portion_keys, portion_meal, portion_ids, portion_counts = portion_layout(problem)
+    portion_cal = portion_counts * unit * problem["calories_per_gram"][portion_ids]
+    portion_prot = portion_counts * unit * problem["protein_per_gram"][portion_ids]
+    P = len(portion_keys)
+
+    portion_cols = mm.add_columns(P, scale=unit)
+    used_cols = mm.add_columns(n, upper=1.0, integer=True)
+    position_cols = mm.add_columns(n * k, upper=1.0, integer=True).reshape(n, k)
+    # With a week schedule the objective counts scheduled days instead of valid combinations;
+    # collapsed meal classes weight each combination by the member days it stands for
+    day_cost = problem.get("combination_weights", 1.0)
+    valid_cols = mm.add_columns(C, upper=1.0, integer=True, cost=day_cost if week is None else 0.0)
+
+    mm.columns = {
+        "meal_portions": dict(zip(portion_keys, portion_cols.tolist())),
+        "meal_used": dict(zip(meals, used_cols.tolist())),
+        "meal_position": {(m, p): int(position_cols[j, p]) for j, m in enumerate(meals) for p in range(k)},
+        "combination_valid": valid_cols,
+    }
+
+    fixed_cal = np.array([problem["fixed_meal_calories"][m] for m in meals], dtype=float)
+    fixed_prot = np.array([problem["fixed_meal_protein"][m] for m in meals], dtype=float)
+
+    # Portion bounds: min * used <= portion <= max * used
+    portion_rows = np.repeat(np.arange(P), 2)
+    portion_entry_cols = np.column_stack([portion_cols, used_cols[portion_meal]]).ravel()
+    mm.add_rows(P, portion_rows, portion_entry_cols,
+                np.column_stack([np.ones(P), np.full(P, -settings["max_portion_grams"] / unit)]).ravel(), upper=0.0)
+    mm.add_rows(P, portion_rows, portion_entry_cols,
+                np.column_stack([np.ones(P), np.full(P, -settings["min_portion_grams"] / unit)]).ravel(), lower=0.0)
+
+    # Each meal takes at most one position, and is used iff it is positioned
+    meal_rows = np.repeat(np.arange(n), k)
+    mm.add_rows(n, meal_rows, position_cols.ravel(), np.ones(n * k), upper=1.0)
+    mm.add_rows(n, np.concatenate([np.arange(n), meal_rows]), np.concatenate([used_cols, position_cols.ravel()]),
+                np.concatenate([np.ones(n), -np.ones(n * k)]), lower=0.0, upper=0.0)
+
+    # Per-meal calorie / protein rows as ragged vectors: portions first, then the used column
+    meal_ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(portion_meal, minlength=n) + 1, out=meal_ptr[1:])
+    order = np.argsort(np.concatenate([portion_meal, np.arange(n)]), kind="stable")
+    meal_cols = np.concatenate([portion_cols, used_cols])[order]
+    meal_cal = np.concatenate([portion_cal, fixed_cal])[order]
+    meal_prot = np.concatenate([portion_prot, fixed_prot])[order]
+    used_entry = meal_ptr[1:] - 1
+    meal_of_entry = np.repeat(np.arange(n), np.diff(meal_ptr))
+
+    # min_cal * used <= calories <= max_cal * used
+    cal_lower = meal_cal.copy()
+    cal_lower[used_entry] -= settings["meal_min_calories"]
+    mm.add_rows(n, meal_of_entry, meal_cols, cal_lower, lower=0.0)
+    cal_upper = meal_cal.copy()
+    cal_upper[used_entry] -= settings["meal_max_calories"]
+    mm.add_rows(n, meal_of_entry, meal_cols, cal_upper, upper=0.0)
+
+    # min_pct * calories <= 4 * protein <= max_pct * calories
+    cpg = settings["calories_per_gram_protein"]
+    mm.add_rows(n, meal_of_entry, meal_cols, cpg * meal_prot - settings["meal_protein_min_pct"] * meal_cal, lower=0.0)
+    mm.add_rows(n, meal_of_entry, meal_cols, cpg * meal_prot - settings["meal_protein_max_pct"] * meal_cal, upper=0.0)
+
+    # Tracked nutrients: one (entry x nutrient) coefficient block on the same ragged layout
+    nutrients = problem.get("nutrients")
+    if nutrients is not None:
+        portion_nut = (portion_counts * unit)[:, None] * nutrients["per_gram"][portion_ids]
+        meal_nut = np.concatenate([portion_nut, nutrients["fixed"]])[order]
+        add_meal_nutrient_rows(mm, meal_of_entry, meal_cols, meal_nut, used_entry, nutrients["meal_lower"], lower=True)
+        add_meal_nutrient_rows(mm, meal_of_entry, meal_cols, meal_nut, used_entry, nutrients["meal_upper"], lower=False)
+
+    # A valid combination needs each of its meals in the matching position
+    slot_cols = position_cols[combos, np.arange(k)]
+    if aggregate_positions:
+        # One row per (meal, position): sum of its combinations' valid <= count * position.
+        # Same integer solutions as the per-combination rows with n * k rows instead of C * k
+        slot_rows = slot_cols.ravel() - position_cols[0, 0]
+        slot_counts = np.bincount(slot_rows, minlength=n * k)
+        mm.add_rows(n * k, np.concatenate([slot_rows, np.arange(n * k)]),
+                    np.concatenate([np.repeat(valid_cols, k), position_cols.ravel()]),
+                    np.concatenate([np.ones(C * k), -slot_counts.astype(float)]), upper=0.0)
+    else:
+        consistency_rows = np.repeat(np.arange(C * k), 2)
+        consistency_cols = np.column_stack([np.repeat(valid_cols, k), slot_cols.ravel()]).ravel()
+        consistency_vals = np.tile([1.0, -1.0], C * k)
+        mm.add_rows(C * k, consistency_rows, consistency_cols, consistency_vals, upper=0.0)
+
+    if tight:
+        # A meal can only take a position some kept combination puts it in; the other
+        # position columns are fixed to 0. This only shrinks the model: it breaks no
+        # symmetry, and HiGHS node counts do not change beyond run-to-run noise.
+        slot_used = np.zeros((n, k), dtype=bool)
+        slot_used[combos, np.arange(k)] = True
+        empty_slots = position_cols[~slot_used]
+
+    # Daily calorie / protein window for valid combinations, relaxed by big-M otherwise.
+    # With window_combinations only that working set gets rows (lazy row generation)
+    window = np.arange(C) if window_combinations is None else np.asarray(window_combinations, dtype=np.int64)
+    W = len(window)
+    combo_rows, combo_cols, combo_cal = gather_rows(combos[window], meal_ptr, meal_cols, meal_cal)
+    _, _, combo_prot = gather_rows(combos[window], meal_ptr, meal_cols, meal_prot)
+    rows = np.concatenate([combo_rows, np.arange(W)])
+    cols = np.concatenate([combo_cols, valid_cols[window]])
+    cal_lo = problem["target_calories"] - settings["calorie_slack"]
+    cal_hi = problem["target_calories"] + settings["calorie_slack"]
+    prot_lo = problem["target_protein"] - settings["protein_slack"]
+    prot_hi = problem["target_protein"] + settings["protein_slack"]
+    if tight:
+        # Per-combination big-M: the most its meals can add up to. Where even that
+        # stays inside the window the upper row can never bind and is left out.
+        meal_cal_max, meal_prot_max = meal_upper_bounds(problem)
+        mm.add_rows(W, rows, cols, np.concatenate([combo_cal, np.full(W, -cal_lo)]), lower=0.0)
+        add_upper_window_rows(mm, W, combo_rows, combo_cols, combo_cal, valid_cols[window],
+                              meal_cal_max[combos[window]].sum(axis=1), cal_hi)
+        mm.add_rows(W, rows, cols, np.concatenate([combo_prot, np.full(W, -prot_lo)]), lower=0.0)
+        add_upper_window_rows(mm, W, combo_rows, combo_cols, combo_prot, valid_cols[window],
+                              meal_prot_max[combos[window]].sum(axis=1), prot_hi)
+    else:
+        big_m = settings["big_m"]
+        mm.add_rows(W, rows, cols, np.concatenate([combo_cal, np.full(W, -cal_lo)]), lower=0.0)
+        mm.add_rows(W, rows, cols, np.concatenate([combo_cal, np.full(W, big_m - cal_hi)]), upper=big_m)
+        mm.add_rows(W, rows, cols, np.concatenate([combo_prot, np.full(W, -prot_lo)]), lower=0.0)
+        mm.add_rows(W, rows, cols, np.concatenate([combo_prot, np.full(W, big_m - prot_hi)]), upper=big_m)
+
+    if nutrients is not None:
+        # Day bounds of every tracked nutrient. Lower: total - lo * valid >= 0, one block
+        # for all nutrients (amounts are never negative, so lo <= 0 needs no row). Upper:
+        # per-combination M from the meals' reachable amounts, in both formulations since
+        # nutrient units vary too much for one constant.
+        _, _, combo_nut = gather_rows(combos[window], meal_ptr, meal_cols, meal_nut)
+        day_lower = nutrients["day_lower"]
+        tracked = np.flatnonzero(day_lower > 0)
+        T = len(tracked)
+        vals = np.concatenate([combo_nut[:, tracked], np.tile(-day_lower[tracked], (W, 1))])
+        mm.add_rows(W * T, (np.arange(T)[:, None] * W + rows).ravel(), np.tile(cols, T), vals.T.ravel(), lower=0.0)
+        nut_max = np.maximum(nutrients["meal_range"][1], 0.0)[combos[window]].sum(axis=1)
+        for t in np.flatnonzero(np.isfinite(nutrients["day_upper"])).tolist():
+            add_upper_window_rows(mm, W, combo_rows, combo_cols, combo_nut[:, t], valid_cols[window],
+                                  nut_max[:, t], nutrients["day_upper"][t])
+
+    if week is not None:
+        add_week_schedule(mm, combos, n, valid_cols, week)
+
+    if warm_start is not None and warm_start["cutoff"] > 0:
+        # The previous solution still reaches this many days
+        mm.add_rows(1, np.zeros(C, dtype=np.int64), valid_cols, np.ones(C), lower=float(warm_start["cutoff"]))
+
+    mm.finalize(scale_rows=tight)
+
+    if warm_start is not None:
+        # Unchanged meals keep their position and (rounded) portions
+        for m, fixed in warm_start["fixed_meals"].items():
+            mm.col_lower[mm.columns["meal_used"][m]] = 1.0
+            for p in range(k):
+                j = mm.columns["meal_position"][m, p]
+                if p == fixed["position"]:
+                    mm.col_lower[j] = 1.0
+                else:
+                    mm.col_upper[j] = 0.0
+            for i, (lower, upper) in fixed["portions"].items():
+                j = mm.columns["meal_portions"][m, i]
+                mm.col_lower[j] = lower / unit
+                mm.col_upper[j] = upper / unit
+
+    if tight:
+        # A position a warm start keeps stays allowed
+        mm.col_upper[empty_slots] = mm.col_lower[empty_slots]
+
+    return mm
+
+def start_from_solution(mm, solution):
+    # Column values (in column units) of a solution dict, e.g. to offer it as a MIP start.
+    # Without "meal_portions" the portion columns stay unset (NaN), see offer_start().
+    columns = mm.columns
+    start = np.zeros(mm.num_cols)
+    for m, j in columns["meal_used"].items():
+        start[j] = solution["meal_used"][m]
+    for key, j in columns["meal_position"].items():
+        start[j] = solution["meal_position"][key]
+    for key, j in columns["meal_portions"].items():
+        start[j] = solution["meal_portions"][key] if solution.get("meal_portions") is not None else np.nan
+    start[columns["combination_valid"]] = solution["combination_valid"]
+    return start / mm.col_scale
+
+def portion_layout(problem):
+    # Portion columns: one per (meal, distinct scalable ingredient); repeated
+    # ingredients keep their multiplicity in the coefficients
+    ingredient_index = problem["ingredient_index"]
+    portion_keys = []
+    portion_meal = []
+    portion_ids = []
+    portion_counts = []
+    for j, m in enumerate(problem["meals"]):
+        counts = {}
+        for i in problem["scalable_ingredients"][m]:
+            counts[i] = counts.get(i, 0) + 1
+        for i, count in counts.items():
+            portion_keys.append((m, i))
+            portion_meal.append(j)
+            portion_ids.append(ingredient_index[i])
+            portion_counts.append(count)
+    return (portion_keys, np.array(portion_meal, dtype=np.int64), np.array(portion_ids, dtype=np.int64),
+            np.array(portion_counts, dtype=float))
+
+def meal_upper_bounds(problem):
+    # Most calories / protein each meal can contribute to a day (0 when it can never be used)
+    meals = problem["meals"]
+    settings = problem["settings"]
+    scalable_ids = problem["scalable_ids"]
+    _, cal_hi, _, prot_hi, usable = meal_intervals(
+        [problem["fixed_meal_calories"][m] for m in meals],
+        [problem["fixed_meal_protein"][m] for m in meals],
+        [problem["calories_per_gram"][scalable_ids[m]].sum() for m in meals],
+        [problem["protein_per_gram"][scalable_ids[m]].sum() for m in meals],
+        settings["min_portion_grams"], settings["max_portion_grams"],
+        settings["meal_min_calories"], settings["meal_max_calories"],
+        settings["meal_protein_min_pct"], settings["meal_protein_max_pct"], settings["calories_per_gram_protein"],
+    )
+    return np.where(usable, np.maximum(cal_hi, 0.0), 0.0), np.where(usable, np.maximum(prot_hi, 0.0), 0.0)
+
+def add_upper_window_rows(mm, W, combo_rows, combo_cols, combo_vals, valid_cols, big_m, hi):
+    # total + (M - hi) * valid <= M, only for combinations whose M exceeds hi
+    binding = np.flatnonzero(big_m > hi)
+    local = np.full(W, -1, dtype=np.int64)
+    local[binding] = np.arange(len(binding))
+    keep = local[combo_rows] >= 0
+    B = len(binding)
+    mm.add_rows(B, np.concatenate([local[combo_rows[keep]], np.arange(B)]),
+                np.concatenate([combo_cols[keep], valid_cols[binding]]),
+                np.concatenate([combo_vals[keep], big_m[binding] - hi]), upper=big_m[binding])
+
+def add_meal_nutrient_rows(mm, meal_of_entry, meal_cols, meal_nut, used_entry, bound, lower):
+    # bound * used <= amount (lower) or amount <= bound * used, as one block of rows per
+    # nutrient with a finite bound
+    n = len(used_entry)
+    tracked = np.flatnonzero(np.isfinite(bound))
+    T = len(tracked)
+    vals = meal_nut[:, tracked].copy()
+    vals[used_entry] -= bound[tracked]
+    rows = (np.arange(T)[:, None] * n + meal_of_entry).ravel()
+    cols = np.tile(meal_cols, T)
+    if lower:
+        mm.add_rows(n * T, rows, cols, vals.T.ravel(), lower=0.0)
+    else:
+        mm.add_rows(n * T, rows, cols, vals.T.ravel(), upper=0.0)
+
+def add_week_schedule(mm, combos, n, valid_cols, week):
+    # Picks how many of the week's days each valid combination fills. Portions are
+    # per meal, so they are shared by every day a meal appears on.
+    C, k = combos.shape
+    days = week["days"]
+    repeats = week["max_repeats"]
+
+    count_cols = mm.add_columns(C, upper=float(repeats), integer=True, cost=1.0)
+    scheduled_cols = mm.add_columns(C, upper=1.0, integer=True)
+    unique_cols = mm.add_columns(n, upper=1.0, integer=True)
+    mm.columns["day_count"] = count_cols
+    mm.columns["meal_scheduled"] = unique_cols
+
+    # count <= repeats * scheduled, scheduled <= count, scheduled <= valid
+    pair_rows = np.repeat(np.arange(C), 2)
+    mm.add_rows(C, pair_rows, np.column_stack([count_cols, scheduled_cols]).ravel(),
+                np.tile([1.0, -float(repeats)], C), upper=0.0)
+    mm.add_rows(C, pair_rows, np.column_stack([scheduled_cols, count_cols]).ravel(), np.tile([1.0, -1.0], C), upper=0.0)
+    mm.add_rows(C, pair_rows, np.column_stack([scheduled_cols, valid_cols]).ravel(), np.tile([1.0, -1.0], C), upper=0.0)
+
+    # At most `days` days in the week
+    mm.add_rows(1, np.zeros(C, dtype=np.int64), count_cols, np.ones(C), upper=float(days))
+
+    # A scheduled combination marks all its meals as part of the week, and a meal
+    # only counts as part of the week when one of its combinations is scheduled
+    mm.add_rows(C, np.concatenate([np.arange(C), np.repeat(np.arange(C), k)]),
+                np.concatenate([scheduled_cols, unique_cols[combos.ravel()]]),
+                np.concatenate([np.full(C, float(k)), -np.ones(C * k)]), upper=0.0)
+    mm.add_rows(n, np.concatenate([np.arange(n), combos.ravel()]),
+                np.concatenate([unique_cols, np.repeat(scheduled_cols, k)]),
+                np.concatenate([np.ones(n), -np.ones(C * k)]), upper=0.0)
+
+    # Variety: number of distinct meals over the week
+    max_unique = week["max_unique"] if week["max_unique"] is not None else np.inf
+    mm.add_rows(1, np.zeros(n, dtype=np.int64), unique_cols, np.ones(n),
+                lower=float(week["min_unique"]), upper=float(max_unique))
+
+def meal_nutrient_totals(problem, solution):
+    # (meal x nutrient) amounts of the tracked nutrients in a solution
+    nutrients = problem["nutrients"]
+    totals = np.zeros((len(problem["meals"]), len(nutrients["names"])))
+    for j, m in enumerate(problem["meals"]):
+        totals[j] = nutrients["fixed"][j] * solution["meal_used"][m]
+        for i, idx in zip(problem["scalable_ingredients"][m], problem["scalable_ids"][m].tolist()):
+            totals[j] += solution["meal_portions"][m, i] * nutrients["per_gram"][idx]
+    return totals
+
+def window_violations(problem, solution, tol=1e-6):
+    # Combinations marked valid whose day totals miss the calorie / protein window (or
+    # a tracked nutrient's day bounds)
+    meals = problem["meals"]
+    settings = problem["settings"]
+    calories_per_gram = problem["calories_per_gram"]
+    protein_per_gram = problem["protein_per_gram"]
+    meal_cal = np.zeros(len(meals))
+    meal_prot = np.zeros(len(meals))
+    for j, m in enumerate(meals):
+        used = solution["meal_used"][m]
+        meal_cal[j] = problem["fixed_meal_calories"][m] * used
+        meal_prot[j] = problem["fixed_meal_protein"][m] * used
+        for i, idx in zip(problem["scalable_ingredients"][m], problem["scalable_ids"][m].tolist()):
+            grams = solution["meal_portions"][m, i]
+            meal_cal[j] += grams * calories_per_gram[idx]
+            meal_prot[j] += grams * protein_per_gram[idx]
+
+    combos = problem["combination_indices"]
+    day_cal = meal_cal[combos].sum(axis=1)
+    day_prot = meal_prot[combos].sum(axis=1)
+    valid = np.asarray(solution["combination_valid"]) > 0.5
+    outside = (
+        (day_cal < problem["target_calories"] - settings["calorie_slack"] - tol) |
+        (day_cal > problem["target_calories"] + settings["calorie_slack"] + tol) |
+        (day_prot < problem["target_protein"] - settings["protein_slack"] - tol) |
+        (day_prot > problem["target_protein"] + settings["protein_slack"] + tol)
+    )
+    nutrients = problem.get("nutrients")
+    if nutrients is not None:
+        day_nut = meal_nutrient_totals(problem, solution)[combos].sum(axis=1)
+        outside |= ((day_nut < nutrients["day_lower"] - tol) | (day_nut > nutrients["day_upper"] + tol)).any(axis=1)
+    return np.flatnonzero(valid & outside)
+
+# === GLPK HAND-OFF ===
+
+def format_terms(cols, vals):
+    terms = [f"{'+' if v >= 0 else '-'} {abs(v)!r} x{c}" for c, v in zip(cols, vals)]
+    # keep lines short for the LP reader
+    return "\n  ".join(" ".join(terms[t:t + 8]) for t in range(0, len(terms), 8))
+
+def write_lp(mm, path):
+    indptr, indices, data = mm.indptr.tolist(), mm.indices.tolist(), mm.data.tolist()
+    row_lower, row_upper = mm.row_lower.tolist(), mm.row_upper.tolist()
+    with open(path, "w") as f:
+        f.write("\\* meal-solver matrix model *\\\n\nmaximize\nobj:\n  ")
+        # every column appears in the objective so GLPK numbers columns in our order
+        f.write(format_terms(range(mm.num_cols), mm.objective.tolist()))
+        f.write("\n\nsubject to\n")
+        for r in range(mm.num_rows):
+            start, end = indptr[r], indptr[r + 1]
+            terms = format_terms(indices[start:end], data[start:end]) if end > start else "0 x0"
+            lo, hi = row_lower[r], row_upper[r]
+            if lo == hi:
+                sense = f"= {lo!r}"
+            elif lo == -np.inf:
+                sense = f"<= {hi!r}"
+            else:
+                sense = f">= {lo!r}"
+            f.write(f"r{r}:\n  {terms}\n  {sense}\n")
+            if lo != hi and lo != -np.inf and hi != np.inf:
+                # Ranged row: the upper side goes on a second row
+                f.write(f"r{r}u:\n  {terms}\n  <= {hi!r}\n")
+
+        # Integers other than plain 0/1 binaries (fixed by a warm start, day counts) are
+        # written as bounded generals
+        lower, upper = mm.col_lower, mm.col_upper
+        plain_binary = mm.col_integer & (lower == 0) & (upper == 1)
+        f.write("\nbounds\n")
+        for j in np.flatnonzero(~plain_binary & ((lower != 0) | np.isfinite(upper))).tolist():
+            lo, hi = float(lower[j]), float(upper[j])
+            if lo == hi:
+                f.write(f"  x{j} = {lo!r}\n")
+            elif hi == np.inf:
+                f.write(f"  x{j} >= {lo!r}\n")
+            else:
+                f.write(f"  {lo!r} <= x{j} <= {hi!r}\n")
+
+        f.write("\ngeneral\n")
+        for j in np.flatnonzero(mm.col_integer & ~plain_binary).tolist():
+            f.write(f"  x{j}\n")
+
+        f.write("\nbinary\n")
+        for j in np.flatnonzero(plain_binary).tolist():
+            f.write(f"  x{j}\n")
+        f.write("\nend\n")
+
+def read_glpk_solution(path, num_cols):
+    values = np.zeros(num_cols)
+    status = "other"
+    objective = None
+    statuses = {"o": "optimal", "f": "feasible", "n": "infeasible", "u": "other"}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "s" and parts[1] == "mip":
+                status = statuses.get(parts[4], "other")
+                objective = float(parts[5])
+            elif parts[0] == "j":
+                values[int(parts[1]) - 1] = float(parts[2])
+    return status, objective, values
+
+def glpsol_stats(output):
+    # The last "+ ..." progress line of the branch-and-bound log carries the relative
+    # gap and the (active; completed) node counts
+    stats = {"nodes": 0, "gapPct": None, "limit": None}
+    for line in output.splitlines():
+        if "TIME LIMIT EXCEEDED" in line:
+            stats["limit"] = "time"
+        elif "RELATIVE MIP GAP TOLERANCE REACHED" in line:
+            stats["limit"] = "gap"
+        if not line.startswith("+"):
+            continue
+        nodes = re.search(r"\(\s*(\d+);\s*(\d+)\)", line)
+        if nodes:
+            stats["nodes"] = int(nodes.group(1)) + int(nodes.group(2))
+        gap = re.search(r"(\d+(?:\.\d+)?)%", line)
+        stats["gapPct"] = float(gap.group(1)) if gap else None
+    return stats
+
+def glpsol_incumbent(line):
+    # "+  1089: >>>>>   3.000000000e+01 <=   4.900000000e+01  63.3% (10; 1)" marks a new
+    # incumbent: its objective, the current bound and the relative gap
+    match = re.match(r"\+\s*\d+:\s*>>>>>\s*(\S+)\s*<=\s*(\S+)\s*(?:(\d+(?:\.\d+)?)%)?", line)
+    if match is None:
+        return None
+    bound = float(match.group(2)) if match.group(2) not in ("+inf", "tree") else None
+    gap_pct = float(match.group(3)) if match.group(3) is not None else None
+    return float(match.group(1)), bound, gap_pct
+
+def solve_with_glpsol(mm, log=None, time_limit=None, mip_gap=None, on_incumbent=None):
+    executable = shutil.which("glpsol")
+    if executable is None:
+        raise RuntimeError("glpsol executable not found on PATH")
+
+    with tempfile.TemporaryDirectory(prefix="meal-solver-") as workdir:
+        lp_path = os.path.join(workdir, "model.lp")
+        sol_path = os.path.join(workdir, "model.sol")
+        write_lp(mm, lp_path)
+
+        command = [executable, "--cpxlp", lp_path, "-w", sol_path]
+        if time_limit is not None:
+            # glpsol only takes whole seconds
+            command += ["--tmlim", str(max(1, int(time_limit)))]
+        if mip_gap is not None:
+            command += ["--mipgap", repr(float(mip_gap))]
+        if on_incumbent is None:
+            proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            output, returncode = proc.stdout, proc.returncode
+        else:
+            # Read the log while glpsol runs; it only reports incumbent values, not the
+            # incumbent itself, so there is no solution to hand over
+            lines = []
+            with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True) as proc:
+                for line in proc.stdout:
+                    lines.append(line)
+                    incumbent = glpsol_incumbent(line)
+                    if incumbent is not None:
+                        on_incumbent(*incumbent, None)
+            output, returncode = "".join(lines), proc.returncode
+        if log is not None:
+            for line in output.splitlines():
+                log(f"   [glpsol] {line}")
+        if returncode != 0 or not os.path.exists(sol_path):
+            raise RuntimeError(f"glpsol failed with return code {returncode}")
+
+        status, objective, values = read_glpk_solution(sol_path, mm.num_cols)
+        stats = {"termination": status, "returnCode": returncode, **glpsol_stats(output)}
+        return status, objective, values, stats
+
+# === HIGHS HAND-OFF ===
+
+def highs_available():
+    return highspy is not None
+
+def new_highs(log=None):
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", log is not None)
+    h.setOptionValue("log_to_console", False)
+    return h
+
+def highs_lp(mm):
+    lp = highspy.HighsLp()
+    lp.num_col_ = mm.num_cols
+    lp.num_row_ = mm.num_rows
+    lp.sense_ = highspy.ObjSense.kMaximize
+    lp.col_cost_ = mm.objective
+    lp.col_lower_ = mm.col_lower
+    lp.col_upper_ = mm.col_upper
+    lp.row_lower_ = mm.row_lower
+    lp.row_upper_ = mm.row_upper
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.num_col_ = mm.num_cols
+    lp.a_matrix_.num_row_ = mm.num_rows
+    lp.a_matrix_.start_ = mm.indptr
+    lp.a_matrix_.index_ = mm.indices
+    lp.a_matrix_.value_ = mm.data
+    lp.integrality_ = np.where(mm.col_integer, highspy.HighsVarType.kInteger, highspy.HighsVarType.kContinuous).tolist()
+    return lp
+
+def run_highs(h, num_cols, log=None, mip_gap=None):
+    # Nothing touches the disk unless a log is wanted, and then only this run's own log file
+    with tempfile.TemporaryDirectory(prefix="meal-solver-") as workdir:
+        if log is not None:
+            h.setOptionValue("log_file", os.path.join(workdir, "highs.log"))
+        h.run()
+        if log is not None:
+            h.setOptionValue("log_file", "")
+            with open(os.path.join(workdir, "highs.log")) as f:
+                for line in f:
+                    log(f"   [highs] {line.rstrip()}")
+
+    model_status = h.getModelStatus()
+    info = h.getInfo()
+    has_solution = info.primal_solution_status == 2
+    if model_status == highspy.HighsModelStatus.kOptimal:
+        status = "optimal"
+    elif model_status == highspy.HighsModelStatus.kInfeasible:
+        status = "infeasible"
+    else:
+        status = "feasible" if has_solution else "other"
+
+    values = np.asarray(h.getSolution().col_value) if has_solution else np.zeros(num_cols)
+    objective = info.objective_function_value if has_solution else None
+    # HiGHS calls a solve that stopped at the requested gap optimal
+    limit = None
+    if model_status == highspy.HighsModelStatus.kTimeLimit:
+        limit = "time"
+    elif mip_gap is not None and has_solution and info.mip_gap > 1e-9:
+        limit = "gap"
+    stats = {
+        "termination": status,
+        "modelStatus": h.modelStatusToString(model_status),
+        "nodes": int(info.mip_node_count),
+        "gapPct": round(info.mip_gap * 100, 4) if has_solution else None,
+        "limit": limit,
+    }
+    return status, objective, values, stats
+
+def offer_start(h, start):
+    # Column values offered as the first incumbent (HiGHS drops them when they are
+    # infeasible for the model). A start with unset (NaN) columns is partial: HiGHS
+    # fills those in by solving an LP with the given discrete columns fixed.
+    start = np.asarray(start, dtype=float)
+    given = np.flatnonzero(~np.isnan(start))
+    if len(given) < len(start):
+        h.setSolution(len(given), given.astype(np.int32), start[given])
+        return
+    solution = highspy.HighsSolution()
+    solution.col_value = np.asarray(start, dtype=float).tolist()
+    solution.value_valid = True
+    h.setSolution(solution)
+
+def solve_with_highs(mm, log=None, time_limit=None, mip_gap=None, on_incumbent=None, start=None):
+    # In-process: the CSR arrays are passed to HiGHS as-is
+    h = new_highs(log)
+    if on_incumbent is not None:
+        def improving(event):
+            data = event.data_out
+            bound = data.mip_dual_bound if np.isfinite(data.mip_dual_bound) else None
+            gap_pct = round(data.mip_gap * 100, 4) if np.isfinite(data.mip_gap) else None
+            on_incumbent(data.objective_function_value, bound, gap_pct, np.array(data.mip_solution))
+        h.cbMipImprovingSolution.subscribe(improving)
+    if time_limit is not None:
+        h.setOptionValue("time_limit", float(time_limit))
+    if mip_gap is not None:
+        h.setOptionValue("mip_rel_gap", float(mip_gap))
+    h.passModel(highs_lp(mm))
+    if start is not None:
+        offer_start(h, start)
+    return run_highs(h, mm.num_cols, log, mip_gap)
+
+class HighsSession:
+    # One HiGHS model kept across a series of solves whose models share their sparsity
+    # pattern (e.g. the same combinations under other targets). Each later model is
+    # applied as a delta: only coefficients and bounds that differ are changed.
+    def __init__(self, mm, log=None, mip_gap=None):
+        self.h = new_highs(log)
+        self.log = log
+        self.mip_gap = mip_gap
+        if mip_gap is not None:
+            self.h.setOptionValue("mip_rel_gap", float(mip_gap))
+        self.h.passModel(highs_lp(mm))
+        self.mm = mm
+        self.entry_rows = np.repeat(np.arange(mm.num_rows), np.diff(mm.indptr))
+
+    def update(self, mm):
+        old = self.mm
+        if (mm.num_rows, mm.num_cols) != (old.num_rows, old.num_cols) or \
+                not np.array_equal(mm.indptr, old.indptr) or not np.array_equal(mm.indices, old.indices):
+            raise ValueError("HiGHS session models must share their sparsity pattern")
+
+        h = self.h
+        coefficients = np.flatnonzero(mm.data != old.data)
+        for e in coefficients.tolist():
+            h.changeCoeff(int(self.entry_rows[e]), int(mm.indices[e]), float(mm.data[e]))
+        rows = np.flatnonzero((mm.row_lower != old.row_lower) | (mm.row_upper != old.row_upper))
+        if len(rows):
+            h.changeRowsBounds(len(rows), rows.astype(np.int32), mm.row_lower[rows], mm.row_upper[rows])
+        cols = np.flatnonzero((mm.col_lower != old.col_lower) | (mm.col_upper != old.col_upper))
+        if len(cols):
+            h.changeColsBounds(len(cols), cols.astype(np.int32), mm.col_lower[cols], mm.col_upper[cols])
+        self.mm = mm
+        return {"coefficients": len(coefficients), "rowBounds": len(rows), "columnBounds": len(cols)}
+
+    def solve(self, time_limit=None, start=None):
+        # start: column values of an earlier solve
+        h = self.h
+        h.setOptionValue("time_limit", float(time_limit) if time_limit is not None else np.inf)
+        if start is not None:
+            offer_start(h, start)
+        return run_highs(h, self.mm.num_cols, self.log, self.mip_gap)
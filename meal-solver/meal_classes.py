@@ -0,0 +1,152 @@
+from itertools import product
+import numpy as np
+from nutrients import per_gram_key
+
+# Meals with the same nutritional structure (equal fixed calorie / protein / tracked
+# nutrient totals and the same per-gram values for their scalable portions) behave
+# identically in the model. Only one representative per class is solved; its days are expanded back out
+# to every member afterwards.
+
+def nutrient_values(macros, nutrient_names):
+    return tuple(float(macros[per_gram_key(name)]) for name in nutrient_names)
+
+def scalable_signature(meal, ingredient_macros, nutrient_names=()):
+    # (count, calories/g, protein/g, tracked nutrients/g, name) of every distinct
+    # scalable ingredient, sorted, so members of a class line up portion by portion
+    counts = {}
+    for ing in meal["ingredients"]:
+        if ing.get("main", 0) != 0:
+            counts[ing["name"]] = counts.get(ing["name"], 0) + 1
+    return sorted(
+        (count, float(ingredient_macros[name]["calories_per_gram"]), float(ingredient_macros[name]["protein_per_gram"]),
+         nutrient_values(ingredient_macros[name], nutrient_names), name)
+        for name, count in counts.items()
+    )
+
+def class_key(meal, ingredient_macros, nutrient_names=()):
+    # Fixed totals are summed in ingredient order, exactly as prepare_problem does
+    fixed_calories = 0
+    fixed_protein = 0
+    fixed_nutrients = np.zeros(len(nutrient_names))
+    for ing in meal["ingredients"]:
+        if ing.get("main", 0) == 0:
+            fixed_calories += ing["grams"] * ingredient_macros[ing["name"]]["calories_per_gram"]
+            fixed_protein += ing["grams"] * ingredient_macros[ing["name"]]["protein_per_gram"]
+            fixed_nutrients += ing["grams"] * np.array(nutrient_values(ingredient_macros[ing["name"]], nutrient_names))
+    portions = tuple(entry[:4] for entry in scalable_signature(meal, ingredient_macros, nutrient_names))
+    return fixed_calories, fixed_protein, tuple(fixed_nutrients.tolist()), portions
+
+def meal_classes(meals_input, ingredient_macros, nutrient_names=()):
+    # Lists of meal indices, in input order; the first member represents the class
+    classes = {}
+    for index, meal in enumerate(meals_input):
+        missing = any(
+            ing["name"] not in ingredient_macros or
+            any(per_gram_key(name) not in ingredient_macros[ing["name"]] for name in nutrient_names)
+            for ing in meal["ingredients"]
+        )
+        if missing:
+            # Left alone so prepare_problem reports the missing ingredient or nutrient
+            key = ("meal", index)
+        else:
+            key = class_key(meal, ingredient_macros, nutrient_names)
+        classes.setdefault(key, []).append(index)
+    return list(classes.values())
+
+def ordered_choices(slots):
+    # Number of ways to pick one input index per slot with the indices increasing
+    # along the slots
+    counts = np.ones(len(slots[0]))
+    for previous, current in zip(slots, slots[1:]):
+        below = np.concatenate([[0.0], np.cumsum(counts)])
+        counts = below[np.searchsorted(previous, current)]
+    return counts.sum()
+
+def combination_weights(combination_indices, classes):
+    # Member days behind each combination of representatives (meal j represents
+    # classes[j]). A day's i-th meal in input order has to take position i, and members
+    # take their representative's position, so only choices of members whose input
+    # order keeps the slot order are days.
+    sizes = np.array([len(c) for c in classes])
+    members = [np.asarray(c) for c in classes]
+    weights = np.ones(len(combination_indices))
+    for row in np.flatnonzero((sizes[combination_indices] > 1).any(axis=1)).tolist():
+        weights[row] = ordered_choices([members[j] for j in combination_indices[row].tolist()])
+    return weights
+
+def expand_solution(problem, solution, meals_input, classes):
+    # Problem and solution over every member meal, for result extraction: members take
+    # their representative's position and portions, and each valid combination of
+    # representatives becomes one day per choice of members that keeps the slot order
+    # (see combination_weights). Days that would pair two members of the same class
+    # are not produced.
+    macros = problem["ingredient_macros"]
+    k = problem["meals_per_day"]
+    nutrients = problem.get("nutrients")
+    nutrient_names = nutrients["names"] if nutrients is not None else ()
+    members = {meals_input[c[0]]["name"]: [meals_input[i] for i in c] for c in classes}
+    member_indices = {meals_input[c[0]]["name"]: c for c in classes}
+    input_order = {}
+    for index, meal in enumerate(meals_input):
+        input_order.setdefault(meal["name"], index)
+
+    ingredient_index = dict(problem["ingredient_index"])
+    calories_per_gram = problem["calories_per_gram"].tolist()
+    protein_per_gram = problem["protein_per_gram"].tolist()
+    nutrient_per_gram = nutrients["per_gram"].tolist() if nutrients is not None else None
+    meals = []
+    fixed_ingredients = {}
+    scalable_ingredients = {}
+    meal_used = {}
+    meal_position = {}
+    meal_portions = {}
+    for rep in problem["meals"]:
+        rep_signature = scalable_signature(members[rep][0], macros, nutrient_names)
+        for meal in members[rep]:
+            m = meal["name"]
+            meals.append(m)
+            fixed_ingredients[m] = [ing["name"] for ing in meal["ingredients"] if ing.get("main", 0) == 0]
+            scalable_ingredients[m] = [ing["name"] for ing in meal["ingredients"] if ing.get("main", 0) != 0]
+            for ing in meal["ingredients"]:
+                if ing["name"] not in ingredient_index:
+                    ingredient_index[ing["name"]] = len(calories_per_gram)
+                    calories_per_gram.append(macros[ing["name"]]["calories_per_gram"])
+                    protein_per_gram.append(macros[ing["name"]]["protein_per_gram"])
+                    if nutrient_per_gram is not None:
+                        nutrient_per_gram.append(list(nutrient_values(macros[ing["name"]], nutrient_names)))
+
+            meal_used[m] = solution["meal_used"][rep]
+            for p in range(k):
+                meal_position[m, p] = solution["meal_position"][rep, p]
+            for entry, rep_entry in zip(scalable_signature(meal, macros, nutrient_names), rep_signature):
+                meal_portions[m, entry[4]] = solution["meal_portions"][rep, rep_entry[4]]
+    meals.sort(key=input_order.get)
+
+    combinations = []
+    for c in np.flatnonzero(np.asarray(solution["combination_valid"]) > 0.5).tolist():
+        for choice in product(*(member_indices[m] for m in problem["combinations"][c])):
+            if all(a < b for a, b in zip(choice, choice[1:])):
+                combinations.append(tuple(meals_input[i]["name"] for i in choice))
+
+    expanded_problem = {
+        **problem,
+        "meals": meals,
+        "fixed_ingredients": fixed_ingredients,
+        "scalable_ingredients": scalable_ingredients,
+        "ingredient_index": ingredient_index,
+        "calories_per_gram": np.array(calories_per_gram, dtype=float),
+        "protein_per_gram": np.array(protein_per_gram, dtype=float),
+        "combinations": combinations,
+    }
+    if nutrients is not None:
+        # Only the per-gram table is needed to report member nutrients
+        expanded_problem["nutrients"] = {**nutrients, "per_gram": np.array(nutrient_per_gram, dtype=float)}
+    expanded_solution = {
+        **solution,
+        "objective": len(combinations),
+        "meal_used": meal_used,
+        "meal_position": meal_position,
+        "meal_portions": meal_portions,
+        "combination_valid": [1.0] * len(combinations),
+    }
+    return expanded_problem, expanded_solution
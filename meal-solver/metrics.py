@@ -0,0 +1,94 @@
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Request phases in the order they run; repeated phases (lazy rounds) accumulate
+PHASES = [
+    "inputParsing",
+    "cacheLookup",
+    "ingredientClassification",
+    "combinationGeneration",
+    "lpScreening",
+    "heuristicSearch",
+    "modelConstruction",
+    "solverInvocation",
+    "resultExtraction",
+]
+
+def peak_rss_mb(who="self"):
+    # ru_maxrss is the high-water mark of the process (or of its waited-for children,
+    # which is where glpsol shows up). Linux reports KiB, macOS bytes.
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    scale = 1 << 20 if sys.platform == "darwin" else 1 << 10
+    return round(usage.ru_maxrss / scale, 1)
+
+class Metrics:
+    def __init__(self, progress=None):
+        # progress: optional callable receiving live progress events (dicts)
+        self.started = time.perf_counter()
+        self.progress = progress
+        self.phases = {}
+        self.running = {}
+        self.model = {}
+        self.solver = {}
+
+    def start(self, name):
+        # Python heap peaks are only available when tracing was switched on
+        # (--trace-memory); the process RSS high-water mark is always recorded
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.running[name] = time.perf_counter()
+
+    def stop(self, name):
+        seconds = time.perf_counter() - self.running.pop(name)
+        heap_peak_mb = tracemalloc.get_traced_memory()[1] / (1 << 20) if tracemalloc.is_tracing() else None
+        self.record(name, seconds, heap_peak_mb)
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def record(self, name, seconds, heap_peak_mb=None):
+        entry = self.phases.setdefault(name, {"wallMs": 0.0, "calls": 0})
+        entry["wallMs"] = round(entry["wallMs"] + seconds * 1000, 3)
+        entry["calls"] += 1
+        entry["peakRssMb"] = peak_rss_mb()
+        if heap_peak_mb is not None:
+            entry["heapPeakMb"] = round(max(entry.get("heapPeakMb", 0.0), heap_peak_mb), 3)
+        self.emit("phase", phase=name, wallMs=round(seconds * 1000, 3))
+
+    def emit(self, event, **fields):
+        if self.progress is not None:
+            self.progress({"event": event, "elapsedMs": round((time.perf_counter() - self.started) * 1000, 3), **fields})
+
+    def set_model(self, rows, columns, nonzeros, binaries):
+        self.model = {"rows": rows, "columns": columns, "nonzeros": nonzeros, "binaries": binaries}
+
+    def set_solver(self, stats):
+        # Lazy row generation solves several times; the last solve is the one reported
+        rounds = self.solver.get("solves", 0) + 1
+        self.solver = {**stats, "solves": rounds}
+
+    def to_dict(self):
+        ordered = {name: self.phases[name] for name in PHASES if name in self.phases}
+        ordered.update((name, entry) for name, entry in self.phases.items() if name not in ordered)
+        return {
+            "totalMs": round((time.perf_counter() - self.started) * 1000, 3),
+            "phases": ordered,
+            "model": self.model,
+            "solver": self.solver,
+            "peakRssMb": peak_rss_mb(),
+            "solverPeakRssMb": peak_rss_mb("children"),
+        }
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Nutrients tracked beyond the built-in calorie / protein rules. Each one is read from
+# the "<name>_per_gram" key of the ingredient macros and may carry per-meal and
+# per-day bounds, e.g.
+#   "nutrients": {"carbs": {"meal": {"min": 20, "max": 120}, "day": {"min": 150, "max": 250}},
+#                 "fiber": {"day": {"min": 25}}}
+# All of them live in one (ingredient x nutrient) matrix, so their constraints are
+# built in bulk and another nutrient is another column, not more code.
+
+def per_gram_key(name):
+    return f"{name}_per_gram"
+
+def parse_nutrients(spec):
+    # None when nothing beyond calories / protein is tracked
+    if not spec:
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError("nutrients must be an object of {name: {meal, day}} bounds")
+    names = list(spec)
+    bounds = {}
+    for scope in ("meal", "day"):
+        lower = []
+        upper = []
+        for name in names:
+            limits = (spec[name] or {}).get(scope) or {}
+            lower.append(float(limits.get("min", -np.inf)))
+            upper.append(float(limits.get("max", np.inf)))
+            if lower[-1] > upper[-1]:
+                raise ValueError(f"Nutrient '{name}' has a {scope} minimum above its maximum")
+        bounds[f"{scope}_lower"] = np.array(lower)
+        bounds[f"{scope}_upper"] = np.array(upper)
+    return {"names": names, "spec": spec, **bounds}
+
+def nutrient_table(names, ingredient_names, ingredient_macros):
+    # (ingredient x nutrient) amounts per gram
+    table = np.zeros((len(ingredient_names), len(names)))
+    for i, ingredient in enumerate(ingredient_names):
+        for t, name in enumerate(names):
+            value = ingredient_macros[ingredient].get(per_gram_key(name))
+            if value is None:
+                raise ValueError(f"Ingredient '{ingredient}' has no {per_gram_key(name)}")
+            if value < 0:
+                raise ValueError(f"Ingredient '{ingredient}' has a negative {per_gram_key(name)}")
+            table[i, t] = value
+    return table
+
+def meal_nutrient_ranges(fixed, scalable_per_gram, min_grams, max_grams, lower, upper):
+    # (meal x nutrient) range each meal can reach with every scalable ingredient between
+    # its portion bounds, cut to the per-meal bounds; a meal is usable only when every
+    # range is non-empty
+    lo = np.maximum(fixed + min_grams * scalable_per_gram, lower)
+    hi = np.minimum(fixed + max_grams * scalable_per_gram, upper)
+    usable = (lo <= hi + 1e-6).all(axis=1)
+    return lo, hi, usable
+
+def total_key(name):
+    # Per-meal output key, next to totalCalories / totalProtein
+    return f"total{name[:1].upper()}{name[1:]}"
@@ -0,0 +1,108 @@
+import json
+from nutrients import total_key
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Result schemas. "standard" repeats every meal's breakdown in each day that has it,
+# twice (mealsDetailed and ingredientPortions). "compact" keeps one table of meal
+# breakdowns and lists days as indices into it:
+#   "format": "compact",
+#   "mealTable": {"columns": ["grams", "calories", "protein", ...tracked nutrients],
+#                 "meals": [{"name", "position", "ingredients": [[name, grams, ...]], "totals": [calories, ...]}]},
+#   "validDays": [[meal index, ...], ...],     ("days" for weekly plans)
+#   "dayTotals": [[calories, protein, ...], ...]
+# All other fields are the same in both. expand_result() restores the standard schema.
+OUTPUT_FORMATS = ["standard", "compact"]
+
+# Encodings of the result channel; MessagePack objects are self-delimiting, so a
+# reader unpacks responses back to back without line framing
+ENCODINGS = ["json", "msgpack"]
+
+def msgpack_available():
+    return msgpack is not None
+
+def encode(response, encoding):
+    if encoding == "msgpack":
+        return msgpack.packb(response, use_bin_type=True)
+    return (json.dumps(response) + "\n").encode("utf-8")
+
+def day_list_key(result):
+    return "days" if "days" in result and "validDays" not in result else "validDays"
+
+def compact_result(result):
+    if "results" in result:
+        # Target grid: every target's result on its own
+        return {**result, "results": [compact_result(r) for r in result["results"]]}
+    key = day_list_key(result)
+    if key not in result:
+        return result
+    days = result[key]
+    columns = ["grams"] + (list(days[0]["totals"]) if days else ["calories", "protein"])
+    totals = columns[1:]
+
+    index = {}
+    meals = []
+    day_meals = []
+    day_totals = []
+    for day in days:
+        for m in day["meals"]:
+            if m in index:
+                continue
+            index[m] = len(meals)
+            detailed = day["mealsDetailed"][m]
+            meals.append({
+                "name": m,
+                "position": day["positions"][m],
+                "ingredients": [[entry["name"]] + [entry[c] for c in columns] for entry in detailed["ingredients"]],
+                "totals": [detailed[total_key(t)] for t in totals],
+            })
+        day_meals.append([index[m] for m in day["meals"]])
+        day_totals.append([day["totals"][t] for t in totals])
+
+    compact = {k: v for k, v in result.items() if k != key}
+    compact.update({
+        "format": "compact",
+        "mealTable": {"columns": columns, "meals": meals},
+        key: day_meals,
+        "dayTotals": day_totals,
+    })
+    return compact
+
+def expand_result(result):
+    if "results" in result:
+        return {**result, "results": [expand_result(r) for r in result["results"]]}
+    if result.get("format") != "compact":
+        return result
+    key = day_list_key(result)
+    columns = result["mealTable"]["columns"]
+    totals = columns[1:]
+
+    meals = []
+    for meal in result["mealTable"]["meals"]:
+        ingredients = [{"name": row[0], **dict(zip(columns, row[1:]))} for row in meal["ingredients"]]
+        detailed = {"ingredients": ingredients}
+        detailed.update((total_key(t), value) for t, value in zip(totals, meal["totals"]))
+        portions = {}
+        for entry in ingredients:
+            portions[entry["name"]] = {c: entry[c] for c in columns}
+        meals.append((meal["name"], meal["position"], detailed, portions))
+
+    days = []
+    for number, (day_meals, day_totals) in enumerate(zip(result[key], result["dayTotals"])):
+        day = {"day": number + 1} if key == "days" else {}
+        picked = [meals[j] for j in day_meals]
+        day.update({
+            "meals": [m for m, _, _, _ in picked],
+            "positions": {m: position for m, position, _, _ in picked},
+            "totals": dict(zip(totals, day_totals)),
+            "mealsDetailed": {m: detailed for m, _, detailed, _ in picked},
+            "ingredientPortions": {m: portions for m, _, _, portions in picked},
+        })
+        days.append(day)
+
+    expanded = {k: v for k, v in result.items() if k not in ("format", "mealTable", "dayTotals", key)}
+    expanded[key] = days
+    return expanded
@@ -0,0 +1,74 @@
+import numpy as np
+from itertools import combinations, chain, islice
+
+# Combinations are screened in blocks so the index array stays small
+# even for libraries with millions of combinations
+BLOCK_SIZE = 1 << 18
+
+def meal_intervals(fixed_calories, fixed_protein, scalable_calories_per_gram, scalable_protein_per_gram,
+                   min_grams, max_grams, meal_min_calories, meal_max_calories,
+                   protein_min_pct, protein_max_pct, calories_per_gram_protein):
+    fixed_calories = np.asarray(fixed_calories, dtype=float)
+    fixed_protein = np.asarray(fixed_protein, dtype=float)
+    scalable_calories_per_gram = np.asarray(scalable_calories_per_gram, dtype=float)
+    scalable_protein_per_gram = np.asarray(scalable_protein_per_gram, dtype=float)
+
+    # Range reachable with every scalable ingredient between its portion bounds
+    cal_lo = fixed_calories + min_grams * scalable_calories_per_gram
+    cal_hi = fixed_calories + max_grams * scalable_calories_per_gram
+    prot_lo = fixed_protein + min_grams * scalable_protein_per_gram
+    prot_hi = fixed_protein + max_grams * scalable_protein_per_gram
+
+    # Per-meal calorie window
+    cal_lo = np.maximum(cal_lo, meal_min_calories)
+    cal_hi = np.minimum(cal_hi, meal_max_calories)
+
+    # Protein balance: min_pct * cal <= protein * 4 <= max_pct * cal
+    prot_lo = np.maximum(prot_lo, cal_lo * protein_min_pct / calories_per_gram_protein)
+    prot_hi = np.minimum(prot_hi, cal_hi * protein_max_pct / calories_per_gram_protein)
+
+    # A meal whose window is empty can never be used, so no combination containing it can be valid
+    tol = 1e-6
+    usable = (cal_lo <= cal_hi + tol) & (prot_lo <= prot_hi + tol)
+    cal_lo = np.where(usable, cal_lo, np.inf)
+    prot_lo = np.where(usable, prot_lo, np.inf)
+
+    return cal_lo, cal_hi, prot_lo, prot_hi, usable
+
+def feasible_combinations(intervals, meals_per_day, calorie_window, protein_window, nutrients=None):
+    # nutrients: optional (meal x nutrient) reachable ranges and per-nutrient day bounds,
+    # checked for all tracked nutrients at once
+    cal_lo, cal_hi, prot_lo, prot_hi, _ = intervals
+    n = len(cal_lo)
+    tol = 1e-6
+
+    index_stream = chain.from_iterable(combinations(range(n), meals_per_day))
+    kept = []
+    total = 0
+    while True:
+        block = np.fromiter(islice(index_stream, BLOCK_SIZE * meals_per_day), dtype=np.int32)
+        if block.size == 0:
+            break
+        block = block.reshape(-1, meals_per_day)
+        total += len(block)
+
+        mask = (
+            (cal_lo[block].sum(axis=1) <= calorie_window[1] + tol) &
+            (cal_hi[block].sum(axis=1) >= calorie_window[0] - tol) &
+            (prot_lo[block].sum(axis=1) <= protein_window[1] + tol) &
+            (prot_hi[block].sum(axis=1) >= protein_window[0] - tol)
+        )
+        if nutrients is not None:
+            nut_lo, nut_hi, day_lower, day_upper = nutrients
+            mask &= (
+                (nut_lo[block].sum(axis=1) <= day_upper + tol).all(axis=1) &
+                (nut_hi[block].sum(axis=1) >= day_lower - tol).all(axis=1)
+            )
+        kept.append(block[mask])
+
+    if kept:
+        kept = np.concatenate(kept)
+    else:
+        kept = np.empty((0, meals_per_day), dtype=np.int32)
+
+    return kept, total
@@ -0,0 +1,147 @@
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Bump when the output schema or the model changes so stale entries are ignored
+CACHE_VERSION = 3
+
+def normalize_meal(meal):
+    # Only what changes the result is kept: scalable ("main") grams are
+    # re-optimized by the solver
+    ingredients = []
+    for ing in meal["ingredients"]:
+        main = ing.get("main", 0) != 0
+        ingredients.append([ing["name"], main, None if main else float(ing["grams"])])
+    return [meal["name"], ingredients]
+
+def ingredient_values(macros, nutrient_names=()):
+    # Calories and protein per gram, then the tracked nutrients (None when missing,
+    # which the solver reports)
+    values = [float(macros["calories_per_gram"]), float(macros["protein_per_gram"])]
+    for name in nutrient_names:
+        value = macros.get(f"{name}_per_gram")
+        values.append(None if value is None else float(value))
+    return values
+
+def meal_fingerprint(meal, ingredient_macros, nutrient_names=()):
+    normalized = normalize_meal(meal)
+    macros = [ingredient_values(ingredient_macros[ing[0]], nutrient_names) for ing in normalized[1]]
+    canonical = json.dumps([normalized, macros], separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+def cache_key(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein, options=None,
+              nutrient_names=()):
+    # Unused ingredient macros (and untracked nutrients) are irrelevant to the result
+    meals = [normalize_meal(meal) for meal in meals_input]
+    used_ingredients = set(ing[0] for meal in meals for ing in meal[1])
+
+    macros = {
+        name: ingredient_values(ingredient_macros[name], nutrient_names)
+        for name in sorted(used_ingredients) if name in ingredient_macros
+    }
+
+    canonical = json.dumps(
+        [CACHE_VERSION, meals, macros, int(meals_per_day), float(target_calories), float(target_protein), options or {}],
+        sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    def __init__(self, max_entries=128, max_memory_bytes=64 << 20, disk_path=None, max_disk_bytes=512 << 20):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_path = disk_path
+
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.db = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def connect(self):
+        if self.db is None and self.disk_path:
+            self.db = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self.db.commit()
+        return self.db
+
+    def get(self, key):
+        with self.lock:
+            text = self.memory.get(key)
+            if text is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(text)
+
+            db = self.connect()
+            if db is not None:
+                row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    db.commit()
+                    text = zlib.decompress(row[0]).decode("utf-8")
+                    self.remember(key, text)
+                    self.disk_hits += 1
+                    return json.loads(text)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        text = json.dumps(value, separators=(",", ":"))
+        with self.lock:
+            self.remember(key, text)
+
+            db = self.connect()
+            if db is not None:
+                blob = zlib.compress(text.encode("utf-8"))
+                db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time()),
+                )
+                self.evict_disk(db)
+                db.commit()
+
+    def remember(self, key, text):
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        if len(text) > self.max_memory_bytes:
+            return
+        self.memory[key] = text
+        self.memory_bytes += len(text)
+        while len(self.memory) > self.max_entries or self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def evict_disk(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            return {
+                "memoryHits": self.memory_hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "memoryEntries": len(self.memory),
+                "memoryBytes": self.memory_bytes,
+            }
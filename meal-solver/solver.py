@@ -1,15 +1,83 @@
+import os
 import sys
 import json
+import time
+import argparse
+import tempfile
+import threading
 import traceback
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pyomo.environ import *
 from itertools import combinations
+import numpy as np
+from prescreen import meal_intervals, feasible_combinations
+from matrix_model import (
+    build_matrix_model, window_violations, solve_with_glpsol, solve_with_highs, highs_available, HighsSession,
+    start_from_solution,
+)
+from result_cache import ResultCache, cache_key
+from incremental import (
+    INCREMENTAL_MODES, solution_fingerprint, diff_previous, delta_is_empty, warm_start_from_previous, check_previous,
+)
+from metrics import Metrics
+from meal_classes import meal_classes, combination_weights, expand_solution
+from lp_screen import screening_available, screen_combinations, greedy_start
+from heuristic import solve_heuristic, TIME_BUDGET
+from ingredient_table import load_table, TableMacros, per_gram_values
+from nutrients import parse_nutrients, nutrient_table, meal_nutrient_ranges, total_key
+from output_format import OUTPUT_FORMATS, ENCODINGS, msgpack_available, encode, compact_result, expand_result
 
-def log(msg):
-    print(f"[solver.py] {msg}", file=sys.stderr)
+# Set by configure_cache(); None disables result caching
+result_cache = None
+
+# Set by configure_ingredient_table(); shared library requests can refer to by id
+ingredient_table = None
+
+# Encoding of results on stdout / the batch output (see output_format.py)
+output_encoding = "json"
+
+# Default screeningWorkers of a request. Pool workers of serve / batch mode lower it
+# to their share of the CPUs, so screening pools do not multiply with --workers
+screening_workers_default = os.cpu_count() or 1
+
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+log_level = "info"
+
+# Per-meal / per-ingredient / per-combination lines are guarded by this flag at the
+# call site so their messages are never even formatted unless debugging
+debug_logging = False
+
+# "auto" solves in-process with HiGHS when highspy is installed and falls back to GLPK
+SOLVER_BACKENDS = ["auto", "highs", "glpk"]
+
+# "heuristic" trades the optimality proof for a result within a fixed search budget
+# (heuristicSeconds, see heuristic.py)
+ENGINES = ["mip", "heuristic"]
+
+# Proven results, which are reused from the cache
+CACHEABLE_STATUSES = ["optimal", "optimalGivenClasses"]
+
+# Options of the single day-plan solve and their defaults. Weekly and target-grid
+# requests are solved by models of their own and reject them instead of ignoring them.
+DAY_PLAN_OPTIONS = {"builder": "matrix", "previous": None, "lazyRows": False, "engine": "mip",
+                    "mipWarmStart": False, "lpScreening": False, "collapseMeals": False}
+
+def set_log_level(name):
+    global log_level, debug_logging
+    log_level = name
+    debug_logging = LOG_LEVELS[name] <= LOG_LEVELS["debug"]
+
+def log(msg, level="info"):
+    if LOG_LEVELS[level] >= LOG_LEVELS[log_level]:
+        print(f"[solver.py] {msg}", file=sys.stderr)
+
+def prepare_problem(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein, prescreen=True,
+                    metrics=None, nutrients=None):
+    if metrics is None:
+        metrics = Metrics()
 
-def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein):
-    log("🔹 Starting optimization function")
-    
     # Log input parameters
     log(f"📊 Input parameters:")
     log(f"   - Meals count: {len(meals_input)}")
@@ -19,8 +87,8 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
     log(f"   - Target protein: {target_protein}")
     
     # Log meal names for debugging
-    meal_names = [meal["name"] for meal in meals_input]
-    log(f"   - Meal names: {meal_names}")
+    if debug_logging:
+        log(f"   - Meal names: {[meal['name'] for meal in meals_input]}", level="debug")
     
     calorie_slack = 100
     protein_slack = 10
@@ -41,6 +109,9 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
     meal_protein_max_pct = 0.45
     calories_per_gram_protein = 4
 
+    min_portion_grams = 5
+    max_portion_grams = 500
+
     meals = [meal["name"] for meal in meals_input]
     
     # Separate ingredients by type and calculate fixed contributions
@@ -51,10 +122,12 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
     fixed_meal_protein = {}
     
     log("🔍 Processing meals and ingredients...")
-    
+    metrics.start("ingredientClassification")
+
     for meal in meals_input:
         meal_name = meal["name"]
-        log(f"   Processing meal: {meal_name}")
+        if debug_logging:
+            log(f"   Processing meal: {meal_name}", level="debug")
         
         ingredients[meal_name] = [ing["name"] for ing in meal["ingredients"]]
         fixed_ingredients[meal_name] = []
@@ -64,11 +137,12 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
         
         for ing in meal["ingredients"]:
             ing_name = ing["name"]
-            log(f"     - Ingredient: {ing_name}, main: {ing.get('main', 'N/A')}, grams: {ing.get('grams', 'N/A')}")
+            if debug_logging:
+                log(f"     - Ingredient: {ing_name}, main: {ing.get('main', 'N/A')}, grams: {ing.get('grams', 'N/A')}", level="debug")
             
             # Check if ingredient exists in macros
             if ing_name not in ingredient_macros:
-                log(f"❌ ERROR: Ingredient '{ing_name}' not found in ingredient_macros!")
+                log(f"❌ ERROR: Ingredient '{ing_name}' not found in ingredient_macros!", level="error")
                 raise ValueError(f"Ingredient '{ing_name}' not found in ingredient_macros")
             
             if ing.get("main", 0) == 0: # Fixed ingredient
@@ -78,29 +152,157 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
                 protein = grams * ingredient_macros[ing_name]['protein_per_gram']
                 fixed_meal_calories[meal_name] += calories
                 fixed_meal_protein[meal_name] += protein
-                log(f"       Fixed: {grams}g -> {calories:.1f} cal, {protein:.1f}g protein")
+                if debug_logging:
+                    log(f"       Fixed: {grams}g -> {calories:.1f} cal, {protein:.1f}g protein", level="debug")
             else:  # Scalable ingredient
                 scalable_ingredients[meal_name].append(ing_name)
-                log(f"       Scalable ingredient added")
-        
-        log(f"   Meal '{meal_name}' totals - Fixed: {fixed_meal_calories[meal_name]:.1f} cal, {fixed_meal_protein[meal_name]:.1f}g protein")
-        log(f"   Scalable ingredients: {scalable_ingredients[meal_name]}")
+                if debug_logging:
+                    log(f"       Scalable ingredient added", level="debug")
+
+        if debug_logging:
+            log(f"   Meal '{meal_name}' totals - Fixed: {fixed_meal_calories[meal_name]:.1f} cal, {fixed_meal_protein[meal_name]:.1f}g protein", level="debug")
+            log(f"   Scalable ingredients: {scalable_ingredients[meal_name]}", level="debug")
+
+    # Contiguous per-gram values of the ingredients this request uses; model building
+    # and extraction index these instead of the nested macro dicts
+    ingredient_names = sorted(set(i for m in meals for i in ingredients[m]))
+    ingredient_index = {name: idx for idx, name in enumerate(ingredient_names)}
+    calories_per_gram = per_gram_values(ingredient_macros, ingredient_names, "calories_per_gram")
+    protein_per_gram = per_gram_values(ingredient_macros, ingredient_names, "protein_per_gram")
+    scalable_ids = {m: np.array([ingredient_index[i] for i in scalable_ingredients[m]], dtype=np.int64) for m in meals}
+
+    # Tracked nutrients: one (ingredient x nutrient) matrix, and per meal its fixed
+    # amounts and the range it can reach within the per-meal bounds
+    nutrient_usable = np.ones(len(meals), dtype=bool)
+    if nutrients is not None:
+        log(f"🧪 Tracking nutrients: {nutrients['names']}")
+        per_gram = nutrient_table(nutrients["names"], ingredient_names, ingredient_macros)
+        fixed = np.zeros((len(meals), len(nutrients["names"])))
+        for j, meal in enumerate(meals_input):
+            for ing in meal["ingredients"]:
+                if ing.get("main", 0) == 0:
+                    fixed[j] += ing["grams"] * per_gram[ingredient_index[ing["name"]]]
+        scalable_per_gram = np.array([per_gram[scalable_ids[m]].sum(axis=0) for m in meals]).reshape(fixed.shape)
+        meal_lo, meal_hi, nutrient_usable = meal_nutrient_ranges(
+            fixed, scalable_per_gram, min_portion_grams, max_portion_grams,
+            nutrients["meal_lower"], nutrients["meal_upper"],
+        )
+        nutrients = {**nutrients, "per_gram": per_gram, "fixed": fixed, "meal_range": (meal_lo, meal_hi)}
+
+    metrics.stop("ingredientClassification")
 
     # Generate combinations
     log("🔢 Generating meal combinations...")
-    all_combinations = list(combinations(meals, meals_per_day))
-    log(f"   Total combinations: {len(all_combinations)}")
+    metrics.start("combinationGeneration")
+    if prescreen:
+        # Drop combinations that cannot reach the daily window given each meal's reachable range
+        intervals = meal_intervals(
+            [fixed_meal_calories[m] for m in meals],
+            [fixed_meal_protein[m] for m in meals],
+            [calories_per_gram[scalable_ids[m]].sum() for m in meals],
+            [protein_per_gram[scalable_ids[m]].sum() for m in meals],
+            min_portion_grams, max_portion_grams, meal_min_calories, meal_max_calories,
+            meal_protein_min_pct, meal_protein_max_pct, calories_per_gram_protein,
+        )
+        extra = None
+        if nutrients is not None:
+            cal_lo, cal_hi, prot_lo, prot_hi, usable = intervals
+            usable = usable & nutrient_usable
+            intervals = (np.where(usable, cal_lo, np.inf), cal_hi, prot_lo, prot_hi, usable)
+            extra = (*nutrients["meal_range"], nutrients["day_lower"], nutrients["day_upper"])
+        unusable_meals = [m for m, ok in zip(meals, intervals[4]) if not ok]
+        if unusable_meals:
+            log(f"   Meals that cannot meet per-meal limits: {unusable_meals}")
+
+        kept, total_combinations = feasible_combinations(
+            intervals, meals_per_day,
+            (target_calories - calorie_slack, target_calories + calorie_slack),
+            (target_protein - protein_slack, target_protein + protein_slack),
+            extra,
+        )
+    else:
+        kept = np.array(list(combinations(range(len(meals)), meals_per_day)), dtype=np.int32).reshape(-1, meals_per_day)
+        total_combinations = len(kept)
+    all_combinations = [tuple(meals[j] for j in row) for row in kept.tolist()]
+    metrics.stop("combinationGeneration")
+
+    pruned_combinations = total_combinations - len(all_combinations)
+    log(f"   Total combinations: {total_combinations}")
+    log(f"   Pruned as infeasible: {pruned_combinations}, remaining: {len(all_combinations)}")
     
-    if len(all_combinations) == 0:
-        log("❌ ERROR: No meal combinations generated!")
+    if total_combinations == 0:
+        log("❌ ERROR: No meal combinations generated!", level="error")
         raise ValueError("No meal combinations possible")
-    
+
+    pruning = {
+        "total": total_combinations,
+        "pruned": pruned_combinations,
+        "kept": len(all_combinations),
+    }
+
     # Log first few combinations for debugging
-    for i, combo in enumerate(all_combinations[:5]):
-        log(f"   Combo {i}: {combo}")
+    if debug_logging:
+        for i, combo in enumerate(all_combinations[:5]):
+            log(f"   Combo {i}: {combo}", level="debug")
     
+    return {
+        "meals_input": meals_input,
+        "ingredient_macros": ingredient_macros,
+        "meals_per_day": meals_per_day,
+        "target_calories": target_calories,
+        "target_protein": target_protein,
+        "meals": meals,
+        "fixed_ingredients": fixed_ingredients,
+        "scalable_ingredients": scalable_ingredients,
+        "ingredient_index": ingredient_index,
+        "calories_per_gram": calories_per_gram,
+        "protein_per_gram": protein_per_gram,
+        "scalable_ids": scalable_ids,
+        "fixed_meal_calories": fixed_meal_calories,
+        "fixed_meal_protein": fixed_meal_protein,
+        "combinations": all_combinations,
+        "combination_indices": kept,
+        "pruning": pruning,
+        "nutrients": nutrients,
+        "settings": {
+            "calorie_slack": calorie_slack,
+            "protein_slack": protein_slack,
+            "big_m": BIG_M,
+            "meal_min_calories": meal_min_calories,
+            "meal_max_calories": meal_max_calories,
+            "meal_protein_min_pct": meal_protein_min_pct,
+            "meal_protein_max_pct": meal_protein_max_pct,
+            "calories_per_gram_protein": calories_per_gram_protein,
+            "min_portion_grams": min_portion_grams,
+            "max_portion_grams": max_portion_grams,
+        },
+    }
+
+def build_rule_model(problem, warm_start=None):
+    meals = problem["meals"]
+    ingredient_macros = problem["ingredient_macros"]
+    meals_per_day = problem["meals_per_day"]
+    target_calories = problem["target_calories"]
+    target_protein = problem["target_protein"]
+    scalable_ingredients = problem["scalable_ingredients"]
+    fixed_meal_calories = problem["fixed_meal_calories"]
+    fixed_meal_protein = problem["fixed_meal_protein"]
+    all_combinations = problem["combinations"]
+    settings = problem["settings"]
+    calorie_slack = settings["calorie_slack"]
+    protein_slack = settings["protein_slack"]
+    BIG_M = settings["big_m"]
+    meal_min_calories = settings["meal_min_calories"]
+    meal_max_calories = settings["meal_max_calories"]
+    meal_protein_min_pct = settings["meal_protein_min_pct"]
+    meal_protein_max_pct = settings["meal_protein_max_pct"]
+    calories_per_gram_protein = settings["calories_per_gram_protein"]
+    min_portion_grams = settings["min_portion_grams"]
+    max_portion_grams = settings["max_portion_grams"]
+
     all_scalable_ingredients = list(set(i for m in meals for i in scalable_ingredients[m]))
-    log(f"   All scalable ingredients: {all_scalable_ingredients}")
+    if debug_logging:
+        log(f"   All scalable ingredients: {all_scalable_ingredients}", level="debug")
 
     # Create model
     log("🏗️ Creating Pyomo model...")
@@ -113,7 +315,7 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
         model.POSITIONS = Set(initialize=range(meals_per_day))
         log("   Sets created successfully")
     except Exception as e:
-        log(f"❌ ERROR creating sets: {e}")
+        log(f"❌ ERROR creating sets: {e}", level="error")
         raise
 
     # Create variables
@@ -125,7 +327,7 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
         model.combination_valid = Var(model.COMBINATIONS, domain=Binary)
         log("   Variables created successfully")
     except Exception as e:
-        log(f"❌ ERROR creating variables: {e}")
+        log(f"❌ ERROR creating variables: {e}", level="error")
         raise
 
     # Add constraints
@@ -134,25 +336,25 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
     def meal_portion_bounds(model, m, i):
         if i not in scalable_ingredients[m]:
             return model.meal_portions[m, i] == 0
-        return model.meal_portions[m, i] <= 500 * model.meal_used[m]
+        return model.meal_portions[m, i] <= max_portion_grams * model.meal_used[m]
     
     try:
         model.MealPortionBounds = Constraint(model.MEALS, model.SCALABLE_INGREDIENTS, rule=meal_portion_bounds)
         log("   MealPortionBounds constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealPortionBounds: {e}")
+        log(f"❌ ERROR adding MealPortionBounds: {e}", level="error")
         raise
 
     def meal_ingredient_consistency(model, m, i):
         if i not in scalable_ingredients[m]:
             return Constraint.Skip
-        return model.meal_portions[m, i] >= 5 * model.meal_used[m]
+        return model.meal_portions[m, i] >= min_portion_grams * model.meal_used[m]
     
     try:
         model.MealIngredientConsistency = Constraint(model.MEALS, model.SCALABLE_INGREDIENTS, rule=meal_ingredient_consistency)
         log("   MealIngredientConsistency constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealIngredientConsistency: {e}")
+        log(f"❌ ERROR adding MealIngredientConsistency: {e}", level="error")
         raise
 
     def meal_single_position(model, m):
@@ -162,7 +364,7 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
         model.MealSinglePosition = Constraint(model.MEALS, rule=meal_single_position)
         log("   MealSinglePosition constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealSinglePosition: {e}")
+        log(f"❌ ERROR adding MealSinglePosition: {e}", level="error")
         raise
 
     def meal_used_iff_positioned(model, m):
@@ -172,7 +374,7 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
         model.MealUsedIffPositioned = Constraint(model.MEALS, rule=meal_used_iff_positioned)
         log("   MealUsedIffPositioned constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealUsedIffPositioned: {e}")
+        log(f"❌ ERROR adding MealUsedIffPositioned: {e}", level="error")
         raise
 
     def meal_calorie_lower(model, m):
@@ -181,14 +383,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             total_calories = scalable_calories + fixed_meal_calories[m] * model.meal_used[m]
             return total_calories >= meal_min_calories * model.meal_used[m]
         except Exception as e:
-            log(f"❌ ERROR in meal_calorie_lower for meal {m}: {e}")
+            log(f"❌ ERROR in meal_calorie_lower for meal {m}: {e}", level="error")
             raise
     
     try:
         model.MealCalorieLower = Constraint(model.MEALS, rule=meal_calorie_lower)
         log("   MealCalorieLower constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealCalorieLower: {e}")
+        log(f"❌ ERROR adding MealCalorieLower: {e}", level="error")
         raise
 
     def meal_calorie_upper(model, m):
@@ -197,14 +399,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             total_calories = scalable_calories + fixed_meal_calories[m] * model.meal_used[m]
             return total_calories <= meal_max_calories * model.meal_used[m]
         except Exception as e:
-            log(f"❌ ERROR in meal_calorie_upper for meal {m}: {e}")
+            log(f"❌ ERROR in meal_calorie_upper for meal {m}: {e}", level="error")
             raise
     
     try:
         model.MealCalorieUpper = Constraint(model.MEALS, rule=meal_calorie_upper)
         log("   MealCalorieUpper constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealCalorieUpper: {e}")
+        log(f"❌ ERROR adding MealCalorieUpper: {e}", level="error")
         raise
 
     def meal_protein_balance_lower(model, m):
@@ -217,14 +419,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             
             return total_protein * calories_per_gram_protein >= total_calories * meal_protein_min_pct
         except Exception as e:
-            log(f"❌ ERROR in meal_protein_balance_lower for meal {m}: {e}")
+            log(f"❌ ERROR in meal_protein_balance_lower for meal {m}: {e}", level="error")
             raise
     
     try:
         model.MealProteinBalanceLower = Constraint(model.MEALS, rule=meal_protein_balance_lower)
         log("   MealProteinBalanceLower constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealProteinBalanceLower: {e}")
+        log(f"❌ ERROR adding MealProteinBalanceLower: {e}", level="error")
         raise
 
     def meal_protein_balance_upper(model, m):
@@ -237,14 +439,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             
             return total_protein * calories_per_gram_protein <= total_calories * meal_protein_max_pct
         except Exception as e:
-            log(f"❌ ERROR in meal_protein_balance_upper for meal {m}: {e}")
+            log(f"❌ ERROR in meal_protein_balance_upper for meal {m}: {e}", level="error")
             raise
     
     try:
         model.MealProteinBalanceUpper = Constraint(model.MEALS, rule=meal_protein_balance_upper)
         log("   MealProteinBalanceUpper constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding MealProteinBalanceUpper: {e}")
+        log(f"❌ ERROR adding MealProteinBalanceUpper: {e}", level="error")
         raise
 
     log("   Adding combination constraints...")
@@ -257,7 +459,7 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
                 model.CombinationPositionConsistency.add(model.combination_valid[c] <= model.meal_position[meal_at_pos, pos])
         log("   CombinationPositionConsistency constraints added")
     except Exception as e:
-        log(f"❌ ERROR adding CombinationPositionConsistency: {e}")
+        log(f"❌ ERROR adding CombinationPositionConsistency: {e}", level="error")
         raise
 
     def combination_calorie_lower(model, c):
@@ -270,14 +472,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             )
             return total_calories >= (target_calories - calorie_slack) * model.combination_valid[c]
         except Exception as e:
-            log(f"❌ ERROR in combination_calorie_lower for combination {c}: {e}")
+            log(f"❌ ERROR in combination_calorie_lower for combination {c}: {e}", level="error")
             raise
     
     try:
         model.CombinationCalorieLower = Constraint(model.COMBINATIONS, rule=combination_calorie_lower)
         log("   CombinationCalorieLower constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding CombinationCalorieLower: {e}")
+        log(f"❌ ERROR adding CombinationCalorieLower: {e}", level="error")
         raise
 
     def combination_calorie_upper(model, c):
@@ -290,14 +492,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             )
             return total_calories <= (target_calories + calorie_slack) * model.combination_valid[c] + BIG_M * (1 - model.combination_valid[c])
         except Exception as e:
-            log(f"❌ ERROR in combination_calorie_upper for combination {c}: {e}")
+            log(f"❌ ERROR in combination_calorie_upper for combination {c}: {e}", level="error")
             raise
     
     try:
         model.CombinationCalorieUpper = Constraint(model.COMBINATIONS, rule=combination_calorie_upper)
         log("   CombinationCalorieUpper constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding CombinationCalorieUpper: {e}")
+        log(f"❌ ERROR adding CombinationCalorieUpper: {e}", level="error")
         raise
 
     def combination_protein_lower(model, c):
@@ -310,14 +512,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             )
             return total_protein >= (target_protein - protein_slack) * model.combination_valid[c]
         except Exception as e:
-            log(f"❌ ERROR in combination_protein_lower for combination {c}: {e}")
+            log(f"❌ ERROR in combination_protein_lower for combination {c}: {e}", level="error")
             raise
     
     try:
         model.CombinationProteinLower = Constraint(model.COMBINATIONS, rule=combination_protein_lower)
         log("   CombinationProteinLower constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding CombinationProteinLower: {e}")
+        log(f"❌ ERROR adding CombinationProteinLower: {e}", level="error")
         raise
 
     def combination_protein_upper(model, c):
@@ -330,14 +532,14 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             )
             return total_protein <= (target_protein + protein_slack) * model.combination_valid[c] + BIG_M * (1 - model.combination_valid[c])
         except Exception as e:
-            log(f"❌ ERROR in combination_protein_upper for combination {c}: {e}")
+            log(f"❌ ERROR in combination_protein_upper for combination {c}: {e}", level="error")
             raise
     
     try:
         model.CombinationProteinUpper = Constraint(model.COMBINATIONS, rule=combination_protein_upper)
         log("   CombinationProteinUpper constraint added")
     except Exception as e:
-        log(f"❌ ERROR adding CombinationProteinUpper: {e}")
+        log(f"❌ ERROR adding CombinationProteinUpper: {e}", level="error")
         raise
 
     # Set objective
@@ -346,16 +548,86 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
         model.Objective = Objective(expr=sum(model.combination_valid[c] for c in model.COMBINATIONS), sense=maximize)
         log("   Objective set successfully")
     except Exception as e:
-        log(f"❌ ERROR setting objective: {e}")
+        log(f"❌ ERROR setting objective: {e}", level="error")
         raise
 
-    # Solve the model
+    if warm_start is not None:
+        log("♻️ Applying previous solution...")
+        for m, fixed in warm_start["fixed_meals"].items():
+            model.meal_used[m].fix(1)
+            for p in model.POSITIONS:
+                model.meal_position[m, p].fix(1 if p == fixed["position"] else 0)
+            for i, (lower, upper) in fixed["portions"].items():
+                model.meal_portions[m, i].setlb(lower)
+                model.meal_portions[m, i].setub(upper)
+        if warm_start["cutoff"] > 0:
+            model.IncumbentCutoff = Constraint(expr=sum(model.combination_valid[c] for c in model.COMBINATIONS) >= warm_start["cutoff"])
+        log(f"   Fixed meals: {len(warm_start['fixed_meals'])}, objective cutoff: {warm_start['cutoff']}")
+
+    return model
+
+def solver_number(value):
+    # Pyomo leaves statistics the solver did not report as UndefinedData and passes
+    # some parsed from the log through as strings
+    if isinstance(value, str):
+        try:
+            value = int(value) if value.isdigit() else float(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, (int, float)) else None
+
+def resolve_backend(backend):
+    if backend not in SOLVER_BACKENDS:
+        raise ValueError(f"Unknown solver backend '{backend}'")
+    if backend == "glpk":
+        return "glpk"
+    if highs_available():
+        return "highs"
+    if backend == "highs":
+        log("⚠️ HiGHS (highspy) is not installed, falling back to GLPK", level="warning")
+    return "glpk"
+
+def forward_log(path, prefix):
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                log(f"   [{prefix}] {line.rstrip()}", level="debug")
+
+def time_left(deadline):
+    return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+def solve_rule_model(model, problem, backend="glpk", deadline=None, mip_gap=None):
     log("🚀 Starting solver...")
     try:
-        solver = SolverFactory('glpk')
-        log("   GLPK solver factory created")
-        
-        result = solver.solve(model, tee=True, logfile="cbc.log")
+        solver = SolverFactory('appsi_highs' if backend == "highs" else 'glpk')
+        log(f"   {backend} solver factory created")
+
+        time_limit = time_left(deadline)
+        if backend == "highs":
+            if time_limit is not None:
+                solver.options["time_limit"] = time_limit
+            if mip_gap is not None:
+                solver.options["mip_rel_gap"] = mip_gap
+        else:
+            if time_limit is not None:
+                solver.options["tmlim"] = max(1, int(time_limit))
+            if mip_gap is not None:
+                solver.options["mipgap"] = mip_gap
+
+        # Every request gets its own log file, only read back when debugging. HiGHS
+        # runs in-process and writes nothing at all otherwise.
+        with tempfile.TemporaryDirectory(prefix="meal-solver-") as workdir:
+            logfile = os.path.join(workdir, "solver.log")
+            if backend == "highs":
+                solver.options["output_flag"] = debug_logging
+                solver.options["log_to_console"] = False
+                if debug_logging:
+                    solver.options["log_file"] = logfile
+                result = solver.solve(model, tee=False)
+            else:
+                result = solver.solve(model, tee=False, logfile=logfile)
+            if debug_logging:
+                forward_log(logfile, backend)
         log(f"   Solver finished with status: {result.solver.termination_condition}")
         log(f"   Solver return code: {result.solver.return_code}")
         
@@ -363,191 +635,1318 @@ def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, targe
             log(f"   Solver message: {result.solver.message}")
             
     except Exception as e:
-        log(f"❌ ERROR during solving: {e}")
+        log(f"❌ ERROR during solving: {e}", level="error")
         raise
 
-    # Process results
-    log("📊 Processing results...")
-    
     try:
         objective_value = model.Objective()
-        log(f"   Objective value: {objective_value}")
     except Exception as e:
-        log(f"❌ ERROR getting objective value: {e}")
+        log(f"❌ ERROR getting objective value: {e}", level="error")
         objective_value = 0
 
-    output = {
+    bounds = (solver_number(result.problem.lower_bound), solver_number(result.problem.upper_bound))
+    # Relative to the incumbent (the lower bound of this maximization), like GLPK and HiGHS
+    gap = None
+    if all(b is not None and abs(b) != float("inf") for b in bounds) and bounds[0] != 0:
+        gap = round(abs(bounds[1] - bounds[0]) / abs(bounds[0]) * 100, 4)
+
+    limit = None
+    if result.solver.termination_condition == TerminationCondition.maxTimeLimit:
+        limit = "time"
+    elif mip_gap is not None and gap:
+        limit = "gap"
+
+    return {
         "status": str(result.solver.termination_condition),
-        "objective": int(objective_value),
+        "objective": objective_value,
+        "stats": {
+            "model": {
+                "rows": solver_number(result.problem.number_of_constraints),
+                "columns": solver_number(result.problem.number_of_variables),
+                "nonzeros": solver_number(result.problem.number_of_nonzeros),
+                "binaries": sum(1 for v in model.component_data_objects(Var) if v.is_binary()),
+            },
+            "solver": {
+                "backend": backend,
+                "termination": str(result.solver.termination_condition),
+                "returnCode": solver_number(result.solver.return_code),
+                "nodes": solver_number(result.solver.statistics.branch_and_bound.number_of_created_subproblems),
+                "gapPct": gap,
+                "limit": limit,
+            },
+        },
+        # Variables stay None when the solver stopped without an incumbent
+        "meal_used": {m: model.meal_used[m].value or 0 for m in model.MEALS},
+        "meal_position": {(m, p): model.meal_position[m, p].value or 0 for m in model.MEALS for p in model.POSITIONS},
+        "meal_portions": {(m, i): model.meal_portions[m, i].value or 0 for m in model.MEALS for i in problem["scalable_ingredients"][m]},
+        "combination_valid": [model.combination_valid[c].value or 0 for c in model.COMBINATIONS],
+    }
+
+def solve_matrix_model(mm, backend="glpk", deadline=None, mip_gap=None, on_incumbent=None, start=None):
+    log("🚀 Starting solver...")
+    try:
+        log(f"   Matrix model: {mm.num_rows} rows, {mm.num_cols} columns, {mm.nnz} non-zeros")
+        if backend == "highs":
+            status, objective_value, values, solver_stats = solve_with_highs(
+                mm, log=log if debug_logging else None, time_limit=time_left(deadline), mip_gap=mip_gap,
+                on_incumbent=on_incumbent, start=start)
+        else:
+            # glpsol reads its model from an LP file, which has no way to carry a start
+            if start is not None:
+                log("   MIP start is not passed to GLPK", level="debug")
+            status, objective_value, values, solver_stats = solve_with_glpsol(
+                mm, log=log if debug_logging else None, time_limit=time_left(deadline), mip_gap=mip_gap,
+                on_incumbent=on_incumbent)
+        log(f"   Solver finished with status: {status}, nodes: {solver_stats['nodes']}, gap: {solver_stats['gapPct']}%")
+    except Exception as e:
+        log(f"❌ ERROR during solving: {e}", level="error")
+        raise
+    return matrix_solution(mm, backend, status, objective_value, values, solver_stats)
+
+def matrix_solution(mm, backend, status, objective_value, values, solver_stats):
+    values = mm.unscale(values)
+    columns = mm.columns
+    solution = {
+        "status": status,
+        "objective": objective_value or 0,
+        "stats": {
+            "model": {
+                "rows": mm.num_rows,
+                "columns": mm.num_cols,
+                "nonzeros": mm.nnz,
+                "binaries": int((mm.col_integer & (mm.col_upper <= 1)).sum()),
+            },
+            "solver": {"backend": backend, **solver_stats},
+        },
+        "meal_used": {m: values[j] for m, j in columns["meal_used"].items()},
+        "meal_position": {key: values[j] for key, j in columns["meal_position"].items()},
+        "meal_portions": {key: values[j] for key, j in columns["meal_portions"].items()},
+        "combination_valid": values[columns["combination_valid"]].tolist(),
+    }
+    if "day_count" in columns:
+        solution["day_count"] = values[columns["day_count"]].tolist()
+    return solution
+
+def incumbent_reporter(metrics, mm, backend, problem, meals_input, classes=None):
+    # Progress events for every improving solution. With HiGHS they carry the days of
+    # the incumbent, so a client can show them before the solve finishes.
+    if metrics.progress is None:
+        return None
+    metrics.emit("model", rows=mm.num_rows, columns=mm.num_cols, nonzeros=mm.nnz,
+                 binaries=int((mm.col_integer & (mm.col_upper <= 1)).sum()))
+
+    def on_incumbent(objective, bound, gap_pct, values):
+        fields = {"validDays": int(round(objective)), "bound": round(bound, 4) if bound is not None else None,
+                  "gapPct": gap_pct}
+        if values is not None:
+            solution = matrix_solution(mm, backend, "feasible", objective, values, {})
+            day_problem = problem
+            if classes is not None:
+                day_problem, solution = expand_solution(problem, solution, meals_input, classes)
+            output = {"usedMeals": [], "validDays": [], "positionAssignments": {}}
+            extract_days(day_problem, solution, meals_input, output)
+            fields["days"] = output["validDays"]
+        metrics.emit("incumbent", **fields)
+    return on_incumbent
+
+def apply_lp_screening(problem, workers, metrics):
+    # Keeps only the combinations whose standalone LP is feasible, which never changes
+    # the optimum. Returns the screening summary with their standalone portions.
+    if not screening_available():
+        log("⚠️ LP screening needs HiGHS (highspy), keeping the interval prescreen only", level="warning")
+        return None
+    with metrics.phase("lpScreening"):
+        feasible, portions = screen_combinations(problem, workers)
+    problem["combination_indices"] = problem["combination_indices"][feasible]
+    problem["combinations"] = [combo for combo, ok in zip(problem["combinations"], feasible.tolist()) if ok]
+    kept = len(problem["combinations"])
+    infeasible = len(feasible) - kept
+    problem["pruning"] = {**problem["pruning"], "pruned": problem["pruning"]["total"] - kept, "kept": kept,
+                          "lpPruned": infeasible}
+    log(f"   LP screening ({workers} worker(s)): {infeasible} more infeasible, remaining: {kept}")
+    return {"workers": workers, "checked": len(feasible), "infeasible": infeasible, "portions": portions}
+
+def solve_heuristic_engine(problem, metrics, backend, deadline, mip_gap, formulation, mip_warm_start, on_incumbent,
+                           heuristic_seconds=TIME_BUDGET):
+    # Local search first, for heuristic_seconds at most; with mip_warm_start the MIP then
+    # gets whatever time is left, starting from the heuristic solution (HiGHS) or cut
+    # off below its day count (GLPK). The better of the two results is returned.
+    search_deadline = time.perf_counter() + heuristic_seconds
+    if deadline is not None:
+        search_deadline = min(search_deadline, deadline)
+    with metrics.phase("heuristicSearch"):
+        solution = solve_heuristic(problem, search_deadline)
+    metrics.set_solver(solution["stats"]["solver"])
+    stats = solution["stats"]["solver"]
+    summary = {"days": int(round(solution["objective"])), "sweeps": stats["sweeps"], "moves": stats["moves"],
+               "rounds": stats["rounds"], "candidates": stats["candidates"], "mipWarmStart": False}
+    log(f"   Heuristic: {summary['days']} valid days after {stats['sweeps']} sweep(s), {stats['moves']} move(s), "
+        f"{stats['rounds']} perturbation round(s)")
+    if not mip_warm_start:
+        return solution, summary
+    if time_left(deadline) == 0:
+        log("   No time left for the MIP, keeping the heuristic result")
+        return solution, summary
+
+    start = None
+    with metrics.phase("modelConstruction"):
+        if backend == "highs":
+            mm = build_matrix_model(problem, formulation=formulation)
+            start = start_from_solution(mm, solution)
+        else:
+            # The cutoff counts combinations, which is the objective unless classes weight them
+            valid_count = int(sum(1 for v in solution["combination_valid"] if v > 0.5))
+            cutoff = {"cutoff": valid_count, "fixed_meals": {}} if "combination_weights" not in problem else None
+            mm = build_matrix_model(problem, cutoff, formulation=formulation)
+    with metrics.phase("solverInvocation"):
+        mip = solve_matrix_model(mm, backend, deadline, mip_gap, on_incumbent(mm) if on_incumbent else None, start)
+    record_solution_stats(metrics, mip)
+    summary["mipWarmStart"] = True
+    if mip["status"] in ("optimal", "feasible") and mip["objective"] >= solution["objective"] - 1e-6:
+        return mip, summary
+    log("   The MIP did not improve on the heuristic result, keeping it")
+    return solution, summary
+
+def record_solution_stats(metrics, solution):
+    metrics.set_model(**solution["stats"]["model"])
+    metrics.set_solver(solution["stats"]["solver"])
+
+def solve_lazy_matrix_model(problem, warm_start=None, metrics=None, backend="glpk", deadline=None, mip_gap=None,
+                            formulation="standard"):
+    if metrics is None:
+        metrics = Metrics()
+
+    # Window rows are generated lazily: every round solves a relaxation that only has
+    # them for the working set, then checks the combinations it marked valid against
+    # the exact windows. At a fixed point the relaxed optimum is feasible for the full
+    # model, which certifies it as the full-model optimum.
+    window = np.array([], dtype=np.int64)
+    iteration = 0
+    while True:
+        iteration += 1
+        with metrics.phase("modelConstruction"):
+            mm = build_matrix_model(problem, warm_start, window_combinations=window, aggregate_positions=True,
+                                    formulation=formulation)
+        with metrics.phase("solverInvocation"):
+            solution = solve_matrix_model(mm, backend, deadline, mip_gap)
+        record_solution_stats(metrics, solution)
+        if solution["status"] != "optimal" or solution["stats"]["solver"]["limit"] is not None:
+            break
+
+        violated = np.setdiff1d(window_violations(problem, solution), window)
+        log(f"   Lazy round {iteration}: objective {solution['objective']}, {len(violated)} violated combinations, working set {len(window)}")
+        if len(violated) == 0:
+            break
+        if time_left(deadline) == 0:
+            solution["stats"]["solver"]["limit"] = "time"
+            break
+        window = np.union1d(window, violated)
+
+    certified = solution["status"] == "optimal" and solution["stats"]["solver"]["limit"] is None
+    if not certified and solution["status"] in ("optimal", "feasible"):
+        # Stopped early: days the relaxation marked valid against windows it did not
+        # have yet are dropped, which leaves a feasible incumbent of the full model
+        violated = window_violations(problem, solution)
+        for c in violated.tolist():
+            solution["combination_valid"][c] = 0.0
+        valid = np.asarray(solution["combination_valid"]) > 0.5
+        weights = problem.get("combination_weights")
+        solution["objective"] = int(valid.sum()) if weights is None else int(weights[valid].sum())
+        if len(violated) > 0:
+            # The relaxation's gap no longer describes the repaired incumbent
+            solution["stats"]["solver"]["gapPct"] = None
+        log(f"   Lazy rows stopped early, dropped {len(violated)} unchecked day(s)")
+
+    solution["lazy"] = {
+        "iterations": iteration,
+        "windowCombinations": len(window),
+        "combinations": len(problem["combinations"]),
+        "certified": certified,
+    }
+    return solution
+
+def fixed_grams_index(meals_input):
+    # Grams of every fixed ingredient by meal name; the first meal with a name and
+    # the first fixed entry of an ingredient win, as with a linear search
+    index = {}
+    for meal in meals_input:
+        if meal["name"] in index:
+            continue
+        grams = index[meal["name"]] = {}
+        for ing in meal["ingredients"]:
+            if ing.get("main", 0) == 0 and ing["name"] not in grams:
+                grams[ing["name"]] = ing["grams"]
+    return index
+
+def meal_breakdown(m, problem, solution, fixed_grams):
+    ingredient_index = problem["ingredient_index"]
+    calories_per_gram = problem["calories_per_gram"]
+    protein_per_gram = problem["protein_per_gram"]
+    nutrients = problem.get("nutrients")
+    names = nutrients["names"] if nutrients is not None else []
+    portions = {}
+    ingredients = []
+    meal_calories = 0
+    meal_protein = 0
+    meal_nutrients = [0] * len(names)
+
+    def add(i, grams):
+        nonlocal meal_calories, meal_protein
+        # Python floats, so round() below rounds like it always has (NumPy scalars round half to even)
+        idx = ingredient_index[i]
+        cal = grams * float(calories_per_gram[idx])
+        prot = grams * float(protein_per_gram[idx])
+        meal_calories += cal
+        meal_protein += prot
+        entry = {"grams": round(grams, 1), "calories": round(cal, 1), "protein": round(prot, 1)}
+        if nutrients is not None:
+            for t, per_gram in enumerate(nutrients["per_gram"][idx].tolist()):
+                meal_nutrients[t] += grams * per_gram
+                entry[names[t]] = round(grams * per_gram, 1)
+        portions[i] = entry
+        ingredients.append({"name": i, **entry})
+
+    # Fixed ingredients keep their predetermined amounts, scalable ones are optimized
+    for i in problem["fixed_ingredients"][m]:
+        if fixed_grams.get(i) is not None:
+            add(i, fixed_grams[i])
+    for i in problem["scalable_ingredients"][m]:
+        grams = solution["meal_portions"][m, i]
+        if grams > 0.1:
+            add(i, grams)
+
+    detailed = {
+        "ingredients": ingredients,
+        "totalCalories": round(meal_calories, 1),
+        "totalProtein": round(meal_protein, 1)
+    }
+    for name, amount in zip(names, meal_nutrients):
+        detailed[total_key(name)] = round(amount, 1)
+    return {
+        "calories": meal_calories,
+        "protein": meal_protein,
+        "nutrients": meal_nutrients,
+        "portions": portions,
+        "detailed": detailed,
+    }
+
+def build_day(combo_meals, meal_positions, problem, solution, fixed_grams, breakdowns):
+    total_calories = 0
+    total_protein = 0
+    nutrients = problem.get("nutrients")
+    names = nutrients["names"] if nutrients is not None else []
+    total_nutrients = [0] * len(names)
+    for m in combo_meals:
+        if m not in breakdowns:
+            breakdowns[m] = meal_breakdown(m, problem, solution, fixed_grams[m])
+        total_calories += breakdowns[m]["calories"]
+        total_protein += breakdowns[m]["protein"]
+        for t, amount in enumerate(breakdowns[m]["nutrients"]):
+            total_nutrients[t] += amount
+
+    totals = {
+        "calories": round(total_calories, 1),
+        "protein": round(total_protein, 1)
+    }
+    for name, amount in zip(names, total_nutrients):
+        totals[name] = round(amount, 1)
+    return {
+        "meals": list(combo_meals),
+        "positions": {m: meal_positions.get(m, None) for m in combo_meals},
+        "totals": totals,
+        "mealsDetailed": {m: breakdowns[m]["detailed"] for m in combo_meals},
+        "ingredientPortions": {m: breakdowns[m]["portions"] for m in combo_meals}
+    }
+
+def describe_status(status, valid_days, gap_pct):
+    gap = f"gap {gap_pct:g}%" if gap_pct is not None else "gap unknown"
+    if status == "optimal":
+        return f"optimal with {valid_days} valid days"
+    if status == "optimalGivenClasses":
+        return f"optimal with {valid_days} valid days among plans where equivalent meals share positions and portions"
+    if status == "optimalGivenKept":
+        return f"optimal with {valid_days} valid days while unchanged meals keep their previous positions and portions"
+    if status == "timeLimit":
+        return f"time-limited with {valid_days} valid days, {gap}"
+    if status == "gapLimit":
+        return f"within the requested gap with {valid_days} valid days, {gap}"
+    return f"{status} with {valid_days} valid days"
+
+def result_output(problem, solution, fingerprint):
+    log(f"   Objective value: {solution['objective']}")
+
+    # Stopping at the deadline or at the requested gap returns the best incumbent
+    # under its own status, so it cannot be mistaken for a proven optimum
+    solver_stats = solution["stats"]["solver"]
+    status = {"time": "timeLimit", "gap": "gapLimit"}.get(solver_stats.get("limit"), solution["status"])
+    objective = int(round(solution["objective"]))
+
+    return {
+        "status": status,
+        "statusDetail": describe_status(status, objective, solver_stats.get("gapPct")),
+        "gapPct": solver_stats.get("gapPct"),
+        "objective": objective,
         "usedMeals": [],
         "validDays": [],
         "positionAssignments": {},
+        "pruning": problem["pruning"],
+        "fingerprint": fingerprint,
     }
 
+def extract_days(problem, solution, meals_input, output, on_day=None):
+    meals_per_day = problem["meals_per_day"]
+    all_combinations = problem["combinations"]
     try:
         meal_positions = {}
-        for m in model.MEALS:
-            if model.meal_used[m]() > 0.5:
+        for m in problem["meals"]:
+            if solution["meal_used"][m] > 0.5:
                 output["usedMeals"].append(m)
-                log(f"   Used meal: {m}")
-                for p in model.POSITIONS:
-                    if model.meal_position[m, p]() > 0.5:
+                if debug_logging:
+                    log(f"   Used meal: {m}", level="debug")
+                for p in range(meals_per_day):
+                    if solution["meal_position"][m, p] > 0.5:
                         meal_positions[m] = p
                         output["positionAssignments"][str(p)] = m
-                        log(f"     Position {p}: {m}")
+                        if debug_logging:
+                            log(f"     Position {p}: {m}", level="debug")
                         break
     except Exception as e:
-        log(f"❌ ERROR processing meal positions: {e}")
+        log(f"❌ ERROR processing meal positions: {e}", level="error")
 
     try:
+        # Portions belong to meals, not days: every meal's breakdown is computed once
+        # and the same objects are referenced by each day that contains it
+        fixed_grams = fixed_grams_index(meals_input)
+        breakdowns = {}
         valid_combinations_count = 0
-        for c in model.COMBINATIONS:
-            if model.combination_valid[c]() > 0.5:
-                valid_combinations_count += 1
-                combo_meals = all_combinations[c]
-                log(f"   Valid combination {c}: {combo_meals}")
-
-                meals_detailed = {}
-                total_calories = 0
-                total_protein = 0
-
-                ingredient_portions = {}
-                for m in combo_meals:
-                    ingredient_portions[m] = {}
-                    
-                    # Add fixed ingredients with their predetermined amounts
-                    for i in fixed_ingredients[m]:
-                        # Find the original grams amount from meals_input
-                        original_grams = None
-                        for meal in meals_input:
-                            if meal["name"] == m:
-                                for ing in meal["ingredients"]:
-                                    if ing["name"] == i and ing["main"] == 0:
-                                        original_grams = ing["grams"]
-                                        break
-                                break
-                        
-                        if original_grams is not None:
-                            cal = original_grams * ingredient_macros[i]['calories_per_gram']
-                            prot = original_grams * ingredient_macros[i]['protein_per_gram']
-                            ingredient_portions[m][i] = {
-                                "grams": round(original_grams, 1),
-                                "calories": round(cal, 1),
-                                "protein": round(prot, 1)
-                            }
-                    
-                    # Add scalable ingredients with optimized amounts
-                    for i in scalable_ingredients[m]:
-                        grams = model.meal_portions[m, i]()
-                        if grams > 0.1:
-                            cal = grams * ingredient_macros[i]['calories_per_gram']
-                            prot = grams * ingredient_macros[i]['protein_per_gram']
-                            ingredient_portions[m][i] = {
-                                "grams": round(grams, 1),
-                                "calories": round(cal, 1),
-                                "protein": round(prot, 1)
-                            }
-
-                for m in combo_meals:
-                    meal_ingredients = []
-                    meal_calories = 0
-                    meal_protein = 0
-
-                    # Add fixed ingredients
-                    for i in fixed_ingredients[m]:
-                        original_grams = None
-                        for meal in meals_input:
-                            if meal["name"] == m:
-                                for ing in meal["ingredients"]:
-                                    if ing["name"] == i and ing["main"] == 0:
-                                        original_grams = ing["grams"]
-                                        break
-                                break
-                        
-                        if original_grams is not None:
-                            cal = original_grams * ingredient_macros[i]['calories_per_gram']
-                            prot = original_grams * ingredient_macros[i]['protein_per_gram']
-                            meal_calories += cal
-                            meal_protein += prot
-
-                            meal_ingredients.append({
-                                "name": i,
-                                "grams": round(original_grams, 1),
-                                "calories": round(cal, 1),
-                                "protein": round(prot, 1)
-                            })
-
-                    # Add scalable ingredients
-                    for i in scalable_ingredients[m]:
-                        grams = model.meal_portions[m, i]()
-                        if grams > 0.1:
-                            cal = grams * ingredient_macros[i]['calories_per_gram']
-                            prot = grams * ingredient_macros[i]['protein_per_gram']
-                            meal_calories += cal
-                            meal_protein += prot
-
-                            meal_ingredients.append({
-                                "name": i,
-                                "grams": round(grams, 1),
-                                "calories": round(cal, 1),
-                                "protein": round(prot, 1)
-                            })
-
-                    meals_detailed[m] = {
-                        "ingredients": meal_ingredients,
-                        "totalCalories": round(meal_calories, 1),
-                        "totalProtein": round(meal_protein, 1)
-                    }
-
-                    total_calories += meal_calories
-                    total_protein += meal_protein
-
-                output["validDays"].append({
-                    "meals": list(combo_meals),
-                    "positions": {m: meal_positions.get(m, None) for m in combo_meals},
-                    "totals": {
-                        "calories": round(total_calories, 1),
-                        "protein": round(total_protein, 1)
-                    },
-                    "mealsDetailed": meals_detailed,
-                    "ingredientPortions": ingredient_portions
-                })
-        
+        for c in np.flatnonzero(np.asarray(solution["combination_valid"]) > 0.5).tolist():
+            valid_combinations_count += 1
+            combo_meals = all_combinations[c]
+            if debug_logging:
+                log(f"   Valid combination {c}: {combo_meals}", level="debug")
+
+            day = build_day(combo_meals, meal_positions, problem, solution, fixed_grams, breakdowns)
+            if on_day is not None:
+                on_day(day)
+            else:
+                output["validDays"].append(day)
+
+        if on_day is not None:
+            del output["validDays"]
+            output["streamedDays"] = valid_combinations_count
+
         log(f"   Total valid combinations found: {valid_combinations_count}")
-        
+
     except Exception as e:
-        log(f"❌ ERROR processing valid combinations: {e}")
+        log(f"❌ ERROR processing valid combinations: {e}", level="error")
         traceback.print_exc(file=sys.stderr)
 
+def generate_optimized_days(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein,
+                            prescreen=True, builder="matrix", previous=None, incremental_mode="keep", lazy_rows=False,
+                            metrics=None, backend="auto", on_day=None, time_limit=None, mip_gap=None,
+                            formulation="standard", collapse_meals=False, lp_screening=False, screening_workers=1,
+                            engine="mip", mip_warm_start=False, nutrients=None, heuristic_seconds=TIME_BUDGET):
+    # nutrients: parse_nutrients() of the request's tracked nutrient bounds, or None
+    log("🔹 Starting optimization function")
+    if metrics is None:
+        metrics = Metrics()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'")
+    if engine == "heuristic" and (previous is not None or lazy_rows):
+        raise ValueError("The heuristic engine cannot be combined with an incremental solve or lazy rows")
+    if engine == "heuristic" and mip_warm_start and builder != "matrix":
+        raise ValueError("A heuristic MIP warm start needs the matrix builder")
+    if engine == "heuristic" and not heuristic_seconds > 0:
+        raise ValueError("heuristicSeconds must be positive")
+    # The time limit is a budget for the whole call; the solver gets what is left of it
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    backend = resolve_backend(backend)
+    log(f"   Solver backend: {backend}")
+
+    fingerprint = solution_fingerprint(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein,
+                                       nutrients["spec"] if nutrients is not None else None)
+    # How the result was reached, so an unchanged request can tell whether it may reuse it
+    fingerprint["solve"] = {"engine": engine, "timeLimit": time_limit, "mipGap": mip_gap}
+
+    incremental = None
+    if previous is not None:
+        delta = diff_previous(fingerprint, previous)
+        log(f"♻️ Incremental solve ({incremental_mode}), delta: {delta}")
+        incremental = {"mode": incremental_mode, **delta, "reused": False}
+        if delta_is_empty(delta):
+            # A proven optimum answers any unchanged request; anything weaker (a limit hit,
+            # kept meals pinned) only answers the same request solved the same way
+            if (previous.get("status") in CACHEABLE_STATUSES or
+                    previous["fingerprint"].get("solve") == fingerprint["solve"]):
+                log("♻️ Nothing changed since the previous solve, reusing it")
+                return {**previous, "incremental": {**incremental, "reused": True}, "metrics": metrics.to_dict()}
+            log(f"♻️ Nothing changed, but the previous result is {previous.get('status')}; re-solving from it")
+            incremental_mode = incremental["mode"] = "warm"
+
+    classes = None
+    model_meals = meals_input
+    if collapse_meals:
+        if previous is not None:
+            raise ValueError("Collapsed meal classes cannot be combined with an incremental solve")
+        # Meals with the same nutritional structure are solved once, as their first member
+        classes = meal_classes(meals_input, ingredient_macros, nutrients["names"] if nutrients is not None else ())
+        model_meals = [meals_input[c[0]] for c in classes]
+        log(f"🔹 Collapsed {len(meals_input)} meals into {len(classes)} equivalence classes")
+
+    problem = prepare_problem(model_meals, ingredient_macros, meals_per_day, target_calories, target_protein, prescreen,
+                              metrics, nutrients)
+    screening = None
+    if lp_screening:
+        screening = apply_lp_screening(problem, screening_workers, metrics)
+    all_combinations = problem["combinations"]
+    if classes is not None:
+        # Each combination of representatives counts the member days it expands to
+        problem["combination_weights"] = combination_weights(problem["combination_indices"], classes)
+
+    if len(all_combinations) == 0:
+        log("⚠️ No combination can reach the daily targets, skipping model", level="warning")
+        output = {
+            "status": "optimal",
+            "statusDetail": describe_status("optimal", 0, 0.0),
+            "gapPct": 0.0,
+            "objective": 0,
+            "usedMeals": [],
+            "validDays": [],
+            "positionAssignments": {},
+            "pruning": problem["pruning"],
+            "fingerprint": fingerprint,
+        }
+        if classes is not None:
+            output["mealClasses"] = {"meals": len(meals_input), "classes": len(classes), "solvedDays": 0}
+        if screening is not None:
+            output["lpScreening"] = {field: value for field, value in screening.items() if field != "portions"}
+        if incremental is not None:
+            output["incremental"] = incremental
+        output["metrics"] = metrics.to_dict()
+        return output
+
+    warm_start = None
+    if previous is not None:
+        warm_start = warm_start_from_previous(problem, previous, delta, incremental_mode)
+        if warm_start is None:
+            log("   Targets changed, solving from scratch")
+        else:
+            incremental["fixedMeals"] = len(warm_start["fixed_meals"])
+            incremental["cutoff"] = warm_start["cutoff"]
+
+    def solve_model(warm_start):
+        heuristic = None
+        if engine == "heuristic":
+            log(f"🧭 Heuristic search{' with MIP warm start' if mip_warm_start else ''}...")
+            solution, heuristic = solve_heuristic_engine(
+                problem, metrics, backend, deadline, mip_gap, formulation, mip_warm_start,
+                lambda mm: incumbent_reporter(metrics, mm, backend, problem, meals_input, classes), heuristic_seconds,
+            )
+        elif builder == "rules":
+            if lazy_rows:
+                raise ValueError("Lazy row generation needs the matrix builder")
+            if formulation != "standard":
+                raise ValueError(f"The {formulation} formulation needs the matrix builder")
+            if classes is not None:
+                raise ValueError("Collapsed meal classes need the matrix builder")
+            if nutrients is not None:
+                raise ValueError("Tracked nutrients need the matrix builder")
+            with metrics.phase("modelConstruction"):
+                model = build_rule_model(problem, warm_start)
+            with metrics.phase("solverInvocation"):
+                solution = solve_rule_model(model, problem, backend, deadline, mip_gap)
+            record_solution_stats(metrics, solution)
+        elif builder == "matrix":
+            log(f"🏗️ Building sparse matrix model ({formulation} formulation)...")
+            if lazy_rows:
+                solution = solve_lazy_matrix_model(problem, warm_start, metrics, backend, deadline, mip_gap,
+                                                   formulation)
+            else:
+                start = None
+                with metrics.phase("modelConstruction"):
+                    mm = build_matrix_model(problem, warm_start, formulation=formulation)
+                    if screening is not None and warm_start is None and backend == "highs":
+                        # The standalone portions, made consistent across shared meals, seed the MIP
+                        start, screening["startDays"] = greedy_start(problem, mm, screening["portions"])
+                        log(f"   MIP start from LP screening: {screening['startDays']} valid days")
+                    elif warm_start is not None and backend == "highs":
+                        # The kept days of the previous plan seed the MIP
+                        start = start_from_solution(mm, warm_start["solution"])
+                        incremental["startDays"] = int(sum(warm_start["solution"]["combination_valid"]))
+                        log(f"   MIP start from the previous plan: {incremental['startDays']} valid days")
+                on_incumbent = incumbent_reporter(metrics, mm, backend, problem, meals_input, classes)
+                with metrics.phase("solverInvocation"):
+                    solution = solve_matrix_model(mm, backend, deadline, mip_gap, on_incumbent, start)
+                record_solution_stats(metrics, solution)
+        else:
+            raise ValueError(f"Unknown model builder '{builder}'")
+        return solution, heuristic
+
+    solution, heuristic = solve_model(warm_start)
+    if warm_start is not None and warm_start["fixed_meals"] and solution["status"] == "infeasible":
+        # The pinned portions are the rounded previous ones and may no longer fit the model;
+        # the previous days still seed an unpinned solve
+        log("⚠️ Kept meals make the model infeasible, solving without pinning them", level="warning")
+        warm_start = {**warm_start, "fixed_meals": {}}
+        incremental["fallback"] = "warm"
+        solution, heuristic = solve_model(warm_start)
+
+    # Process results
+    log("📊 Processing results...")
+    metrics.start("resultExtraction")
+    solved_days = int((np.asarray(solution["combination_valid"]) > 0.5).sum())
+    if classes is not None:
+        problem, solution = expand_solution(problem, solution, meals_input, classes)
+        if solution["status"] == "optimal" and len(classes) < len(meals_input):
+            # Proven only over the restricted plans the classes can express, which may
+            # miss days the full model finds (e.g. two members of one class together)
+            solution["status"] = "optimalGivenClasses"
+    if warm_start is not None and warm_start["fixed_meals"] and solution["status"] == "optimal":
+        # Keep mode proves optimality only with the kept meals pinned to their previous
+        # positions and portions; a solve from scratch may find more days
+        solution["status"] = "optimalGivenKept"
+    output = result_output(problem, solution, fingerprint)
+    if classes is not None:
+        output["mealClasses"] = {"meals": len(meals_input), "classes": len(classes), "solvedDays": solved_days}
+    if incremental is not None:
+        output["incremental"] = incremental
+    if screening is not None:
+        output["lpScreening"] = {field: value for field, value in screening.items() if field != "portions"}
+    if heuristic is not None:
+        output["heuristic"] = heuristic
+    if "lazy" in solution:
+        output["lazyRows"] = solution["lazy"]
+    extract_days(problem, solution, meals_input, output, on_day)
+
+    metrics.stop("resultExtraction")
+    output["metrics"] = metrics.to_dict()
+    log(f"📈 Metrics: {json.dumps(output['metrics'], separators=(',', ':'))}")
     log("✅ Results processing complete")
     return output
 
+# === WEEKLY MODE ===
+
+VARIETY_LEVELS = ["none", "some", "lots"]
+
+# Distinct meals over the week for each variety setting, by meals per day (same
+# ranges as the planner's weekly schedule; None means no upper bound). Other meal
+# counts have no ranges and use exactly mealsPerDay distinct meals, as the planner does.
+VARIETY_UNIQUE_MEALS = {
+    2: {"none": (2, 2), "some": (3, 4), "lots": (5, None)},
+    3: {"none": (3, 3), "some": (4, 5), "lots": (6, None)},
+    4: {"none": (4, 4), "some": (5, 6), "lots": (7, None)},
+}
+
+def week_settings(meals_per_day, days=7, variety="some", min_unique=None, max_unique=None, max_repeats=None):
+    if variety not in VARIETY_LEVELS:
+        raise ValueError(f"Unknown variety '{variety}'")
+    ranges = VARIETY_UNIQUE_MEALS.get(meals_per_day)
+    default = (meals_per_day, meals_per_day) if ranges is None else ranges[variety]
+    return {
+        "days": days,
+        "min_unique": default[0] if min_unique is None else min_unique,
+        "max_unique": default[1] if max_unique is None else max_unique,
+        "max_repeats": days if max_repeats is None else max_repeats,
+    }
+
+def spread_days(combination_counts):
+    # Round-robin over the scheduled combinations, most repeated first, so the same
+    # day does not come back to back while others are left
+    remaining = sorted(combination_counts.items(), key=lambda item: (-item[1], item[0]))
+    order = []
+    while remaining:
+        order.extend(c for c, _ in remaining)
+        remaining = [(c, count - 1) for c, count in remaining if count > 1]
+    return order
+
+def generate_weekly_plan(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein, week,
+                         prescreen=True, metrics=None, backend="auto", time_limit=None, mip_gap=None,
+                         formulation="standard", nutrients=None):
+    # One optimization for the whole week: which valid days to use and how often,
+    # with a single set of portions per meal shared by every day it appears on
+    log(f"🗓️ Weekly plan: {week['days']} days, {week['min_unique']}-{week['max_unique']} distinct meals, "
+        f"a day repeats at most {week['max_repeats']} times")
+    if metrics is None:
+        metrics = Metrics()
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    backend = resolve_backend(backend)
+    log(f"   Solver backend: {backend}")
+
+    problem = prepare_problem(meals_input, ingredient_macros, meals_per_day, target_calories, target_protein, prescreen,
+                              metrics, nutrients)
+    all_combinations = problem["combinations"]
+
+    output = {
+        "status": "optimal",
+        "statusDetail": describe_status("optimal", 0, 0.0),
+        "gapPct": 0.0,
+        "objective": 0,
+        "days": [],
+        "uniqueMeals": [],
+        "positionAssignments": {},
+        "week": {
+            "days": week["days"],
+            "minUniqueMeals": week["min_unique"],
+            "maxUniqueMeals": week["max_unique"],
+            "maxDayRepeats": week["max_repeats"],
+        },
+        "pruning": problem["pruning"],
+    }
+    if len(all_combinations) == 0:
+        log("⚠️ No combination can reach the daily targets, skipping model", level="warning")
+        output["metrics"] = metrics.to_dict()
+        return output
+
+    with metrics.phase("modelConstruction"):
+        mm = build_matrix_model(problem, week=week, formulation=formulation)
+    with metrics.phase("solverInvocation"):
+        solution = solve_matrix_model(mm, backend, deadline, mip_gap)
+    record_solution_stats(metrics, solution)
+
+    log("📊 Processing weekly plan...")
+    metrics.start("resultExtraction")
+    solver_stats = solution["stats"]["solver"]
+    status = {"time": "timeLimit", "gap": "gapLimit"}.get(solver_stats.get("limit"), solution["status"])
+    objective = int(round(solution["objective"]))
+    output.update({
+        "status": status,
+        "statusDetail": describe_status(status, objective, solver_stats.get("gapPct")),
+        "gapPct": solver_stats.get("gapPct"),
+        "objective": objective,
+    })
+
+    meal_positions = {}
+    for (m, p), value in solution["meal_position"].items():
+        if value > 0.5:
+            meal_positions[m] = p
+    counts = {c: int(round(count)) for c, count in enumerate(solution["day_count"]) if count > 0.5}
+    scheduled_meals = set(m for c in counts for m in all_combinations[c])
+    output["uniqueMeals"] = [m for m in problem["meals"] if m in scheduled_meals]
+    output["positionAssignments"] = {str(meal_positions[m]): m for m in output["uniqueMeals"] if m in meal_positions}
+
+    fixed_grams = fixed_grams_index(meals_input)
+    breakdowns = {}
+    for index, c in enumerate(spread_days(counts)):
+        day = build_day(all_combinations[c], meal_positions, problem, solution, fixed_grams, breakdowns)
+        output["days"].append({"day": index + 1, **day})
+    log(f"   Days filled: {len(output['days'])} of {week['days']}, distinct meals: {len(output['uniqueMeals'])}")
+
+    metrics.stop("resultExtraction")
+    output["metrics"] = metrics.to_dict()
+    log(f"📈 Metrics: {json.dumps(output['metrics'], separators=(',', ':'))}")
+    return output
+
+# === TARGET GRID ===
+
+def generate_target_grid(meals_input, ingredient_macros, meals_per_day, targets, prescreen=True, metrics=None,
+                         backend="auto", time_limit=None, mip_gap=None):
+    # Several (calories, protein) targets over the same meals. The model is built over
+    # the union of every target's combinations, so all targets share one sparsity
+    # pattern: with HiGHS the model is passed once and each next target only changes
+    # the target-dependent coefficients and bounds, starting from the previous optimum.
+    log(f"🎯 Target grid: {len(targets)} targets")
+    if metrics is None:
+        metrics = Metrics()
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    backend = resolve_backend(backend)
+    log(f"   Solver backend: {backend}")
+
+    problems = [
+        prepare_problem(meals_input, ingredient_macros, meals_per_day, calories, protein, prescreen, metrics)
+        for calories, protein in targets
+    ]
+    with metrics.phase("combinationGeneration"):
+        union = np.unique(np.concatenate([p["combination_indices"] for p in problems]), axis=0)
+        union_index = {row: c for c, row in enumerate(map(tuple, union.tolist()))}
+        meals = problems[0]["meals"]
+        union_combinations = [tuple(meals[j] for j in row) for row in union.tolist()]
+    log(f"   Combinations over all targets: {len(union)}")
+
+    session = None
+    previous_values = None
+    results = []
+    for (calories, protein), problem in zip(targets, problems):
+        fingerprint = solution_fingerprint(meals_input, ingredient_macros, meals_per_day, calories, protein)
+        if len(union) == 0:
+            results.append({
+                "targetCalories": calories,
+                "targetProtein": protein,
+                "status": "optimal",
+                "statusDetail": describe_status("optimal", 0, 0.0),
+                "gapPct": 0.0,
+                "objective": 0,
+                "usedMeals": [],
+                "validDays": [],
+                "positionAssignments": {},
+                "pruning": problem["pruning"],
+                "fingerprint": fingerprint,
+            })
+            continue
+
+        # Combinations this target's prescreen dropped stay in the model, switched off
+        allowed = [union_index[row] for row in map(tuple, problem["combination_indices"].tolist())]
+        problem = {**problem, "combinations": union_combinations, "combination_indices": union}
+        with metrics.phase("modelConstruction"):
+            mm = build_matrix_model(problem)
+            valid_cols = mm.columns["combination_valid"]
+            off = np.ones(len(union), dtype=bool)
+            off[allowed] = False
+            mm.col_upper[valid_cols[off]] = 0.0
+
+        with metrics.phase("solverInvocation"):
+            if backend == "highs":
+                if session is None:
+                    session = HighsSession(mm, log=log if debug_logging else None, mip_gap=mip_gap)
+                    changes = None
+                else:
+                    changes = session.update(mm)
+                started = previous_values is not None
+                status, objective_value, values, solver_stats = session.solve(time_left(deadline), previous_values)
+                solution = matrix_solution(mm, backend, status, objective_value, values, solver_stats)
+                if status in ("optimal", "feasible"):
+                    previous_values = values
+            else:
+                # glpsol has no persistent model: every target is a separate solve
+                changes = None
+                started = False
+                solution = solve_matrix_model(mm, backend, deadline, mip_gap)
+        record_solution_stats(metrics, solution)
+        log(f"   Target {calories} cal / {protein}g: {solution['status']}, objective {solution['objective']}"
+            + (f", changed {changes}" if changes is not None else ""))
+
+        with metrics.phase("resultExtraction"):
+            output = {"targetCalories": calories, "targetProtein": protein,
+                      **result_output(problem, solution, fingerprint)}
+            output["parametric"] = {
+                "nodes": solution["stats"]["solver"]["nodes"],
+                "warmStart": started,
+                "changed": changes,
+            }
+            extract_days(problem, solution, meals_input, output)
+        results.append(output)
+
+    return {"results": results, "metrics": metrics.to_dict()}
+
+def stream_days(result, on_day):
+    # Cached, reused and skipped results arrive with their days already built
+    if on_day is None or "validDays" not in result:
+        return result
+    result = dict(result)
+    days = result.pop("validDays")
+    for day in days:
+        on_day(day)
+    result["streamedDays"] = len(days)
+    return result
+
+def resolve_ingredients(meals_input, ingredient_macros):
+    # Ingredients may be given by table id instead of name, and macros the request does
+    # not carry come from the shared table (request values win). Only the ingredients
+    # the meals use are looked up, and their values stay in the table (TableMacros).
+    ingredient_macros = ingredient_macros or {}
+    meals = []
+    table_rows = {}
+    for meal in meals_input:
+        ingredients = []
+        for ing in meal["ingredients"]:
+            if "name" not in ing:
+                if ingredient_table is None:
+                    raise ValueError("Ingredients given by id need an ingredient table (--ingredient-table)")
+                ing = {**ing, "name": ingredient_table.name_of(ing["id"])}
+            name = ing["name"]
+            if name not in ingredient_macros and ingredient_table is not None and name in ingredient_table.ids:
+                table_rows[name] = ingredient_table.ids[name]
+            ingredients.append(ing)
+        meals.append({**meal, "ingredients": ingredients})
+    if table_rows:
+        ingredient_macros = TableMacros(ingredient_table, ingredient_macros, table_rows)
+    return meals, ingredient_macros
+
+def run_request(data, parse_seconds=None, on_day=None, on_progress=None):
+    # parse_seconds covers decoding the JSON, which happens before the request gets here;
+    # on_progress receives live progress events. Results are cached in the standard
+    # schema and converted to the requested one on the way out.
+    output_format = data.get("outputFormat", "standard")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'")
+    if output_format == "compact" and on_day is not None:
+        raise ValueError("The compact output format cannot be streamed")
+    if isinstance(data.get("previous"), dict):
+        # A previous result may come back in either schema
+        data = {**data, "previous": expand_result(data["previous"])}
+    result, cache_hit = solve_request(data, parse_seconds, on_day, on_progress)
+    if output_format == "compact":
+        result = compact_result(result)
+    return result, cache_hit
+
+def reject_options(data, mode, options):
+    # options: {request key: default}; any key set to something else is unsupported
+    unsupported = [key for key, default in options.items() if data.get(key, default) != default]
+    if unsupported:
+        raise ValueError(f"{mode} cannot be combined with {', '.join(unsupported)}")
+
+def solve_request(data, parse_seconds=None, on_day=None, on_progress=None):
+    metrics = Metrics(on_progress)
+    start = time.perf_counter()
+    meals, ingredient_macros = resolve_ingredients(data["meals"], data.get("ingredientMacros"))
+    meals_per_day = data["mealsPerDay"]
+    target_calories = data["targetCalories"]
+    target_protein = data["targetProtein"]
+    builder = data.get("builder", "matrix")
+    previous = data.get("previous")
+    incremental_mode = data.get("incrementalMode", "keep")
+    lazy_rows = data.get("lazyRows", False)
+    backend = data.get("backend", "auto")
+    time_limit = data.get("timeLimit")
+    mip_gap = data.get("mipGap")
+    formulation = data.get("formulation", "standard")
+    collapse_meals = data.get("collapseMeals", False)
+    lp_screening = data.get("lpScreening", False)
+    engine = data.get("engine", "mip")
+    mip_warm_start = data.get("mipWarmStart", False)
+    heuristic_seconds = data.get("heuristicSeconds", TIME_BUDGET)
+    screening_workers = data.get("screeningWorkers", screening_workers_default)
+    if incremental_mode not in INCREMENTAL_MODES:
+        raise ValueError(f"Unknown incremental mode '{incremental_mode}'")
+    nutrients = parse_nutrients(data.get("nutrients"))
+    nutrient_names = nutrients["names"] if nutrients is not None else ()
+    metrics.record("inputParsing", (parse_seconds or 0) + time.perf_counter() - start)
+
+    log(f"➡️  Meals: {len(meals)}, MealsPerDay: {meals_per_day}, Target: {target_calories} cal / {target_protein}g prot")
+
+    targets = data.get("targets")
+    if nutrients is not None and targets is not None:
+        raise ValueError("nutrients cannot be combined with targets")
+    if targets is not None:
+        reject_options(data, "targets", {**DAY_PLAN_OPTIONS, "weekly": None, "formulation": "standard"})
+        return run_target_grid(data, meals, ingredient_macros, targets, metrics, backend, time_limit, mip_gap)
+
+    weekly = data.get("weekly")
+    if weekly is not None:
+        reject_options(data, "weekly", DAY_PLAN_OPTIONS)
+        week = week_settings(meals_per_day, weekly.get("days", 7), weekly.get("variety", "some"),
+                             weekly.get("minUniqueMeals"), weekly.get("maxUniqueMeals"), weekly.get("maxDayRepeats"))
+        key = None
+        if result_cache is not None:
+            with metrics.phase("cacheLookup"):
+                options = {"weekly": week, "formulation": formulation}
+                if nutrients is not None:
+                    options["nutrients"] = nutrients["spec"]
+                key = cache_key(meals, ingredient_macros, meals_per_day, target_calories, target_protein, options,
+                                nutrient_names)
+                cached = result_cache.get(key)
+            if cached is not None:
+                log(f"⚡ Cache hit {key[:12]}")
+                return {**cached, "metrics": metrics.to_dict()}, True
+        result = generate_weekly_plan(meals, ingredient_macros, meals_per_day, target_calories, target_protein, week,
+                                      metrics=metrics, backend=backend, time_limit=time_limit, mip_gap=mip_gap,
+                                      formulation=formulation, nutrients=nutrients)
+        if key is not None and result["status"] == "optimal":
+            result_cache.put(key, {k: v for k, v in result.items() if k != "metrics"})
+        return result, False
+
+    if previous is not None:
+        check_previous(previous)
+
+    # Incremental results depend on the previous solution, so they bypass the cache
+    key = None
+    if result_cache is not None and previous is None:
+        with metrics.phase("cacheLookup"):
+            # Formulations and LP screening reach the same objective but may pick other
+            # portions; collapsed classes give a different set of days
+            options = {"formulation": formulation} if formulation != "standard" else {}
+            if collapse_meals:
+                options["collapseMeals"] = True
+            if lp_screening:
+                options["lpScreening"] = True
+            if engine != "mip":
+                options["engine"] = engine
+            if nutrients is not None:
+                options["nutrients"] = nutrients["spec"]
+            key = cache_key(meals, ingredient_macros, meals_per_day, target_calories, target_protein, options,
+                            nutrient_names)
+            cached = result_cache.get(key)
+        if cached is not None:
+            log(f"⚡ Cache hit {key[:12]}")
+            return stream_days({**cached, "metrics": metrics.to_dict()}, on_day), True
+
+    result = generate_optimized_days(meals, ingredient_macros, meals_per_day, target_calories, target_protein,
+                                     builder=builder, previous=previous, incremental_mode=incremental_mode,
+                                     lazy_rows=lazy_rows, metrics=metrics, backend=backend, on_day=on_day,
+                                     time_limit=time_limit, mip_gap=mip_gap, formulation=formulation,
+                                     collapse_meals=collapse_meals, lp_screening=lp_screening,
+                                     screening_workers=screening_workers, engine=engine,
+                                     mip_warm_start=mip_warm_start, nutrients=nutrients,
+                                     heuristic_seconds=heuristic_seconds)
+
+    # Only proven, complete results are reused (streamed ones no longer hold their
+    # days); metrics describe this run, not the cached one
+    if key is not None and result["status"] in CACHEABLE_STATUSES and "validDays" in result:
+        result_cache.put(key, {k: v for k, v in result.items() if k != "metrics"})
+
+    return stream_days(result, on_day), False
+
+def run_target_grid(data, meals, ingredient_macros, targets, metrics, backend, time_limit, mip_gap):
+    # Targets are [{targetCalories, targetProtein}, ...]. Each one is cached like a single
+    # request, so only the targets not seen before go to the solver.
+    meals_per_day = data["mealsPerDay"]
+    pairs = [(t["targetCalories"], t["targetProtein"]) for t in targets]
+
+    results = [None] * len(pairs)
+    keys = [None] * len(pairs)
+    if result_cache is not None:
+        with metrics.phase("cacheLookup"):
+            for index, (calories, protein) in enumerate(pairs):
+                keys[index] = cache_key(meals, ingredient_macros, meals_per_day, calories, protein)
+                cached = result_cache.get(keys[index])
+                if cached is not None:
+                    results[index] = {"targetCalories": calories, "targetProtein": protein, **cached}
+    missing = [index for index, result in enumerate(results) if result is None]
+    log(f"   Targets cached: {len(pairs) - len(missing)}, to solve: {len(missing)}")
+
+    if missing:
+        grid = generate_target_grid(meals, ingredient_macros, meals_per_day, [pairs[index] for index in missing],
+                                    metrics=metrics, backend=backend, time_limit=time_limit, mip_gap=mip_gap)
+        for index, result in zip(missing, grid["results"]):
+            results[index] = result
+            if keys[index] is not None and result["status"] == "optimal":
+                result_cache.put(keys[index], {k: v for k, v in result.items()
+                                               if k not in ("targetCalories", "targetProtein", "parametric")})
+
+    return {"results": results, "metrics": metrics.to_dict()}, len(missing) == 0
+
+def configure_cache(cache_config):
+    global result_cache
+    result_cache = ResultCache(**cache_config) if cache_config is not None else None
+
+def configure_ingredient_table(path):
+    global ingredient_table
+    ingredient_table = load_table(path) if path is not None else None
+    if ingredient_table is not None:
+        log(f"🔹 Ingredient table {path}: {len(ingredient_table)} ingredients")
+
+# === SERVER / BATCH MODE ===
+
+def init_worker(cache_config, level="info", trace_memory=False, table_path=None, screening_workers=1):
+    global screening_workers_default
+    # Solver output (tee) must never reach the NDJSON stream on stdout
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    # Load the solver plugin and locate the executable once per worker
+    SolverFactory('glpk').available(exception_flag=False)
+    configure_cache(cache_config)
+    set_log_level(level)
+    # Every worker maps the same table file, the OS shares its pages between them
+    configure_ingredient_table(table_path)
+    screening_workers_default = screening_workers
+    if trace_memory:
+        tracemalloc.start()
+    log(f"🔹 Worker {os.getpid()} ready")
+
+def run_timed_request(data, parse_seconds=None):
+    start = time.perf_counter()
+    result, cache_hit = run_request(data, parse_seconds)
+    cache_stats = result_cache.stats() if result_cache is not None else None
+    return result, time.perf_counter() - start, cache_hit, cache_stats
+
+def process_stream(lines, workers, cache_config, respond, ordered=False, trace_memory=False, table_path=None):
+    # Fan NDJSON requests out to a pool of preloaded workers. Failures stay confined
+    # to their own response line. With ordered=True responses are emitted in input
+    # order, otherwise as soon as each one completes.
+    # A worker that dies (out of memory, a crash in native solver code) breaks the whole
+    # pool and fails everything it held. The pool is then replaced and those requests
+    # are retried one at a time, so only the one that crashes again on its own is
+    # answered with an error.
+    limit = workers * 2
+    cond = threading.Condition()
+    pending = {}
+    next_index = [0]
+    counts = {"ok": 0, "error": 0}
+    # in_flight: requests read but not yet written; outstanding: futures of the current
+    # pool not yet reported
+    state = {"in_flight": 0, "outstanding": 0, "pool": None}
+    crashed = []
+    unsent = []
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                   initargs=(cache_config, log_level, trace_memory, table_path,
+                                             max(1, (os.cpu_count() or 1) // workers)))
+
+    def emit(index, response):
+        # A slot frees only once its response is written, so in ordered mode a slow
+        # request holds back at most `limit` answered ones behind it
+        with cond:
+            counts["error" if "error" in response else "ok"] += 1
+            if not ordered:
+                respond(response)
+                state["in_flight"] -= 1
+            else:
+                pending[index] = response
+                while next_index[0] in pending:
+                    respond(pending.pop(next_index[0]))
+                    next_index[0] += 1
+                    state["in_flight"] -= 1
+            cond.notify_all()
+
+    def finish(index, request, response, solve_time=None):
+        total = time.perf_counter() - request["submitted"]
+        response["timing"] = {
+            "totalMs": round(total * 1000, 2),
+            "solveMs": round(solve_time * 1000, 2) if solve_time is not None else None,
+            "queueMs": round((total - solve_time) * 1000, 2) if solve_time is not None else None,
+        }
+        log(f"✅ Request {request['id']} done in {response['timing']['totalMs']} ms")
+        emit(index, response)
+
+    def complete(future, index, request):
+        try:
+            result, solve_time, cache_hit, cache_stats = future.result()
+            response = {"index": index, "id": request["id"], "result": result}
+            if cache_stats is not None:
+                response["cache"] = {"hit": cache_hit, **cache_stats}
+        except Exception as e:
+            log(f"❌ Request {request['id']} failed: {e}", level="error")
+            solve_time = None
+            response = {"index": index, "id": request["id"], "error": f"Solver exception: {str(e)}"}
+        finish(index, request, response, solve_time)
+
+    def crash(index, request):
+        log(f"❌ Request {request['id']} crashed its worker process", level="error")
+        finish(index, request, {"index": index, "id": request["id"],
+                                "error": "Solver exception: the worker process solving this request crashed"})
+
+    def on_done(future, index, request):
+        if isinstance(future.exception(), BrokenProcessPool):
+            # Answered by recover() once the pool is replaced
+            with cond:
+                crashed.append((index, request))
+                state["outstanding"] -= 1
+                cond.notify_all()
+            return
+        with cond:
+            state["outstanding"] -= 1
+        complete(future, index, request)
+
+    def submit(index, request):
+        with cond:
+            state["outstanding"] += 1
+        try:
+            future = state["pool"].submit(run_timed_request, request["data"], request["parse_seconds"])
+        except BrokenProcessPool:
+            with cond:
+                state["outstanding"] -= 1
+                unsent.append((index, request))
+                cond.notify_all()
+            return
+        future.add_done_callback(lambda f: on_done(f, index, request))
+
+    def recover():
+        with cond:
+            cond.wait_for(lambda: state["outstanding"] == 0)
+            suspects = sorted(crashed, key=lambda item: item[0])
+            retry = sorted(unsent, key=lambda item: item[0])
+            crashed.clear()
+            unsent.clear()
+        state["pool"].shutdown(wait=True)
+        log(f"⚠️ A worker process died, restarting the pool ({len(suspects)} request(s) affected)", level="warning")
+        state["pool"] = new_pool()
+        if len(suspects) == 1:
+            crash(*suspects[0])
+        else:
+            # Alone in the pool, a crash can only be the request's own
+            for index, request in suspects:
+                future = state["pool"].submit(run_timed_request, request["data"], request["parse_seconds"])
+                wait([future])
+                if isinstance(future.exception(), BrokenProcessPool):
+                    state["pool"].shutdown(wait=True)
+                    state["pool"] = new_pool()
+                    crash(index, request)
+                else:
+                    complete(future, index, request)
+        for index, request in retry:
+            submit(index, request)
+
+    def wait_until(ready):
+        # Blocks until ready() holds, replacing the pool whenever it breaks meanwhile
+        while True:
+            with cond:
+                cond.wait_for(lambda: crashed or unsent or ready())
+                if not (crashed or unsent):
+                    return
+            recover()
+
+    started = time.perf_counter()
+    index = 0
+    state["pool"] = new_pool()
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            wait_until(lambda: state["in_flight"] < limit)
+            with cond:
+                state["in_flight"] += 1
+            try:
+                parse_start = time.perf_counter()
+                data = json.loads(line)
+                parse_seconds = time.perf_counter() - parse_start
+                if not isinstance(data, dict):
+                    raise ValueError("request must be a JSON object")
+            except Exception as e:
+                emit(index, {"index": index, "id": None, "error": f"Invalid JSON: {str(e)}"})
+                index += 1
+                continue
+
+            request = {"data": data, "parse_seconds": parse_seconds, "id": data.get("id"),
+                       "submitted": time.perf_counter()}
+            submit(index, request)
+            index += 1
+
+        wait_until(lambda: state["in_flight"] == 0)
+    finally:
+        state["pool"].shutdown(wait=True)
+
+    elapsed = time.perf_counter() - started
+    log(f"🔹 Processed {index} request(s): {counts['ok']} ok, {counts['error']} failed "
+        f"in {elapsed:.2f}s ({index / elapsed if elapsed > 0 else 0:.1f} req/s)")
+    return counts
+
+def write_line(stream, response):
+    stream.write(json.dumps(response) + "\n")
+    stream.flush()
+
+def write_response(stream, response):
+    # Results (unlike progress events and logs) follow --encoding
+    if output_encoding == "json":
+        write_line(stream, response)
+        return
+    stream.flush()
+    stream.buffer.write(encode(response, output_encoding))
+    stream.buffer.flush()
+
+def progress_writer(fd):
+    # NDJSON progress events on their own descriptor so stdout stays the plain result.
+    # A reader that goes away only stops the events, never the solve.
+    stream = os.fdopen(fd, "w", buffering=1, closefd=False)
+    state = {"open": True}
+
+    def on_progress(event):
+        if not state["open"]:
+            return
+        try:
+            write_line(stream, event)
+        except OSError as e:
+            state["open"] = False
+            log(f"⚠️ Progress stream closed: {e}", level="warning")
+    return on_progress
+
+def serve(workers, cache_config=None, trace_memory=False, table_path=None):
+    log(f"🔹 Serving NDJSON requests on stdin with {workers} worker(s)")
+    process_stream(sys.stdin, workers, cache_config, lambda response: write_response(sys.stdout, response),
+                   trace_memory=trace_memory, table_path=table_path)
+    log("🔹 Input closed, server shutting down")
+
+def run_batch(input_path, output_path, workers, cache_config=None, order="input", trace_memory=False, table_path=None):
+    log(f"🔹 Batch run over {input_path} with {workers} worker(s), {order} order")
+    source = sys.stdin if input_path == "-" else open(input_path)
+    sink = sys.stdout if output_path == "-" else open(output_path, "w")
+    try:
+        return process_stream(source, workers, cache_config, lambda response: write_response(sink, response),
+                              ordered=order == "input", trace_memory=trace_memory, table_path=table_path)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
 # === ENTRY POINT ===
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serve", action="store_true", help="keep running and answer newline-delimited JSON requests")
+    parser.add_argument("--batch", metavar="FILE", help="solve every request in a JSONL file ('-' for stdin) and exit")
+    parser.add_argument("--output", default="-", help="JSONL file for batch results (default stdout)")
+    parser.add_argument("--order", choices=["input", "completion"], default="input", help="order of batch results")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes in server and batch mode")
+    parser.add_argument("--no-cache", action="store_true", help="disable the result cache")
+    parser.add_argument("--cache-entries", type=int, default=128, help="results kept in the in-memory LRU")
+    parser.add_argument("--cache-memory-mb", type=float, default=64, help="size limit of the in-memory LRU")
+    parser.add_argument("--cache-db", help="SQLite file for the on-disk result cache (disabled when omitted)")
+    parser.add_argument("--cache-disk-mb", type=float, default=512, help="size limit of the on-disk cache")
+    parser.add_argument("--log-level", choices=list(LOG_LEVELS), default=os.environ.get("MEAL_SOLVER_LOG_LEVEL", "info"),
+                        help="stderr verbosity; 'debug' adds per-meal, per-ingredient and solver output")
+    parser.add_argument("--trace-memory", action="store_true", help="record per-phase Python heap peaks (slower)")
+    parser.add_argument("--progress-fd", type=int,
+                        help="write NDJSON progress events (phases, model size, incumbents, final result) to this "
+                             "file descriptor while solving a single request")
+    parser.add_argument("--ingredient-table", default=os.environ.get("MEAL_SOLVER_INGREDIENT_TABLE"),
+                        help=".npy ingredient table (see ingredient_table.py); requests may then omit ingredientMacros "
+                             "and refer to ingredients by id")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="json",
+                        help="encoding of results on stdout / --output: one JSON object per line, or back-to-back "
+                             "MessagePack objects (needs the msgpack package)")
+    args = parser.parse_args()
+    if args.encoding == "msgpack" and not msgpack_available():
+        parser.error("--encoding msgpack needs the msgpack package")
+
+    set_log_level(args.log_level)
+    output_encoding = args.encoding
+
+    cache_config = None
+    if not args.no_cache:
+        cache_config = {
+            "max_entries": args.cache_entries,
+            "max_memory_bytes": int(args.cache_memory_mb * (1 << 20)),
+            "disk_path": args.cache_db,
+            "max_disk_bytes": int(args.cache_disk_mb * (1 << 20)),
+        }
+
+    if args.serve:
+        serve(max(1, args.workers), cache_config, args.trace_memory, args.ingredient_table)
+        sys.exit(0)
+
+    if args.batch:
+        run_batch(args.batch, args.output, max(1, args.workers), cache_config, args.order, args.trace_memory,
+                  args.ingredient_table)
+        sys.exit(0)
+
+    # A single request per process can never hit the in-memory LRU; only an on-disk
+    # cache (--cache-db) carries results from one invocation to the next
+    configure_cache(cache_config if args.cache_db is not None else None)
+    configure_ingredient_table(args.ingredient_table)
+    if args.trace_memory:
+        tracemalloc.start()
+    on_progress = progress_writer(args.progress_fd) if args.progress_fd is not None else None
+
     try:
         raw_input = sys.stdin.read()
         log("🔹 Raw input received")
 
+        parse_start = time.perf_counter()
         data = json.loads(raw_input)
+        parse_seconds = time.perf_counter() - parse_start
         log("🔹 JSON parsed successfully")
 
-        meals = data["meals"]
-        ingredient_macros = data["ingredientMacros"]
-        meals_per_day = data["mealsPerDay"]
-        target_calories = data["targetCalories"]
-        target_protein = data["targetProtein"]
-
-        log(f"➡️  Meals: {len(meals)}, MealsPerDay: {meals_per_day}, Target: {target_calories} cal / {target_protein}g prot")
-
-        result = generate_optimized_days(meals, ingredient_macros, meals_per_day, target_calories, target_protein)
-
-        log("✅ Optimization complete")
-        print(json.dumps(result))
-        sys.stdout.flush()
+        # With "stream": true every valid day is written as its own NDJSON line as soon
+        # as it is extracted, followed by the result without validDays
+        if data.get("stream", False):
+            result, _ = run_request(data, parse_seconds, on_day=lambda day: write_response(sys.stdout, {"day": day}),
+                                    on_progress=on_progress)
+            log("✅ Optimization complete")
+            write_response(sys.stdout, {"result": result})
+        else:
+            result, _ = run_request(data, parse_seconds, on_progress=on_progress)
+            log("✅ Optimization complete")
+            write_response(sys.stdout, result)
+        if on_progress is not None:
+            on_progress({"event": "result", "result": result})
 
     except Exception as e:
-        log("❌ Exception occurred:")
+        log("❌ Exception occurred:", level="error")
         traceback.print_exc(file=sys.stderr)
-        print(json.dumps({"error": f"Solver exception: {str(e)}"}))
+        write_response(sys.stdout, {"error": f"Solver exception: {str(e)}"})
+        if on_progress is not None:
+            on_progress({"event": "error", "error": f"Solver exception: {str(e)}"})
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,44 @@
+import os
+import sys
+import copy
+import random
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import solver
+from matrix_model import highs_available
+
+solver.set_log_level("error")
+
+requires_highs = pytest.mark.skipif(not highs_available(), reason="needs highspy")
+
+INGREDIENTS = {
+    "chicken": (1.65, 0.31), "rice": (1.3, 0.027), "olive oil": (8.84, 0.0), "broccoli": (0.34, 0.028),
+    "salmon": (2.08, 0.20), "oats": (3.89, 0.169), "egg": (1.55, 0.13), "greek yogurt": (0.59, 0.10),
+    "banana": (0.89, 0.011), "beef": (2.5, 0.26), "potato": (0.77, 0.02), "tofu": (0.76, 0.08),
+}
+
+def library(num_meals, seed=0, duplicates=0, meals_per_day=3):
+    # Request over random two-scalable-ingredient meals; the first `duplicates` meals
+    # are repeated under another name at the end
+    rng = random.Random(seed)
+    names = list(INGREDIENTS)
+    meals = []
+    for j in range(num_meals):
+        picked = rng.sample(names, 3)
+        meals.append({"name": f"Meal {j}", "ingredients": [
+            {"name": picked[0], "main": 1, "grams": 150},
+            {"name": picked[1], "main": 1, "grams": 100},
+            {"name": picked[2], "main": 0, "grams": rng.choice([5, 10, 30, 50])},
+        ]})
+    for j in range(duplicates):
+        meals.append({**copy.deepcopy(meals[j]), "name": f"Meal {j} copy"})
+    return {
+        "meals": meals,
+        "ingredientMacros": {name: {"calories_per_gram": c, "protein_per_gram": p} for name, (c, p) in INGREDIENTS.items()},
+        "mealsPerDay": meals_per_day,
+        "targetCalories": 2000,
+        "targetProtein": 150,
+        "backend": "highs",
+    }
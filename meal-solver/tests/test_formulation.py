@@ -0,0 +1,41 @@
+import copy
+import numpy as np
+import pytest
+import solver
+from matrix_model import build_matrix_model
+from conftest import library, requires_highs
+
+def problem_of(data):
+    meals, macros = solver.resolve_ingredients(data["meals"], data["ingredientMacros"])
+    return solver.prepare_problem(meals, macros, data["mealsPerDay"], data["targetCalories"], data["targetProtein"])
+
+def coefficient_range(mm):
+    values = np.abs(mm.data[mm.data != 0])
+    return values.max() / values.min()
+
+def test_tight_model_is_smaller_and_row_scaled():
+    problem = problem_of(library(10, seed=3))
+    standard = build_matrix_model(problem)
+    tight = build_matrix_model(problem, formulation="tight")
+
+    assert tight.num_rows <= standard.num_rows
+    assert coefficient_range(tight) < coefficient_range(standard)
+    row_max = np.maximum.reduceat(np.abs(tight.data), tight.indptr[:-1][np.diff(tight.indptr) > 0])
+    assert np.allclose(row_max, 1.0)
+
+@requires_highs
+@pytest.mark.parametrize("seed", [0, 3, 7])
+def test_tight_formulation_reaches_the_standard_optimum(seed):
+    data = library(9, seed=seed)
+    standard, _ = solver.run_request(copy.deepcopy(data))
+    tight, _ = solver.run_request({**copy.deepcopy(data), "formulation": "tight"})
+
+    assert tight["status"] == standard["status"] == "optimal"
+    assert tight["objective"] == standard["objective"]
+    # Portions come back in grams, not in the model's hectogram unit
+    for day in tight["validDays"]:
+        assert abs(day["totals"]["calories"] - data["targetCalories"]) <= 100.1
+
+def test_unknown_formulation_is_rejected():
+    with pytest.raises(ValueError, match="formulation"):
+        build_matrix_model(problem_of(library(4)), formulation="loose")
@@ -0,0 +1,22 @@
+import pytest
+import solver
+from conftest import library, requires_highs
+
+def test_heuristic_stops_at_its_budget():
+    # 30 meals at 4 per day run all perturbation rounds in seconds without a budget
+    data = {**library(30, seed=1, meals_per_day=4), "engine": "heuristic", "heuristicSeconds": 0.1}
+    result, _ = solver.run_request(data)
+
+    assert result["status"] == "heuristic"
+    assert result["heuristic"]["rounds"] < 30
+    assert result["metrics"]["phases"]["heuristicSearch"]["wallMs"] < 1000
+    assert result["objective"] == len(result["validDays"]) > 0
+
+def test_heuristic_budget_must_be_positive():
+    with pytest.raises(ValueError, match="heuristicSeconds"):
+        solver.run_request({**library(4), "engine": "heuristic", "heuristicSeconds": 0})
+
+@requires_highs
+def test_heuristic_budget_is_ignored_by_the_mip_engine():
+    result, _ = solver.run_request({**library(4), "heuristicSeconds": 0})
+    assert result["status"] == "optimal"
@@ -0,0 +1,110 @@
+import copy
+import pytest
+import solver
+from conftest import library, requires_highs
+
+def changed_library(data):
+    # The same request with one meal's fixed ingredient changed
+    changed = copy.deepcopy(data)
+    changed["meals"][0]["ingredients"][2]["grams"] += 20
+    return changed
+
+@requires_highs
+def test_keep_mode_is_optimal_only_given_the_kept_meals():
+    data = library(8, seed=2)
+    previous, _ = solver.run_request(copy.deepcopy(data))
+    result, _ = solver.run_request({**changed_library(data), "previous": previous, "incrementalMode": "keep"})
+
+    assert result["incremental"]["fixedMeals"] > 0
+    assert result["status"] == "optimalGivenKept"
+    assert "previous positions" in result["statusDetail"]
+
+@requires_highs
+def test_warm_mode_is_a_full_solve():
+    data = library(8, seed=2)
+    previous, _ = solver.run_request(copy.deepcopy(data))
+    fresh, _ = solver.run_request(changed_library(data))
+    result, _ = solver.run_request({**changed_library(data), "previous": previous, "incrementalMode": "warm"})
+
+    assert result["status"] == "optimal"
+    assert result["objective"] == fresh["objective"]
+
+@requires_highs
+def test_warm_mode_starts_from_the_previous_plan():
+    data = library(8, seed=2)
+    previous, _ = solver.run_request(copy.deepcopy(data))
+    changed = changed_library(data)
+    result, _ = solver.run_request({**changed, "previous": previous, "incrementalMode": "warm"})
+
+    kept = [day for day in previous["validDays"] if changed["meals"][0]["name"] not in day["meals"]]
+    assert result["incremental"]["startDays"] == len(kept) > 0
+    assert result["objective"] >= len(kept)
+
+@requires_highs
+@pytest.mark.parametrize("seed", [0, 1])
+def test_keep_mode_survives_a_reordered_library(seed):
+    # Slots follow the input order, so reordering moves every meal's slot; the
+    # previous positions must not be pinned or counted as a cutoff
+    data = library(8, seed=seed)
+    previous, _ = solver.run_request(copy.deepcopy(data))
+    changed = changed_library(data)
+    changed["meals"].reverse()
+    fresh, _ = solver.run_request(copy.deepcopy(changed))
+    result, _ = solver.run_request({**changed, "previous": previous, "incrementalMode": "keep"})
+
+    assert result["status"] in ("optimal", "optimalGivenKept")
+    assert len(result["validDays"]) > 0
+    assert result["objective"] <= fresh["objective"]
+
+@requires_highs
+def test_keep_mode_falls_back_when_the_kept_portions_do_not_fit():
+    data = library(8, seed=2)
+    previous, _ = solver.run_request(copy.deepcopy(data))
+    for day in previous["validDays"]:
+        for portions in day["ingredientPortions"].values():
+            for portion in portions.values():
+                portion["grams"] = 10000.0
+    fresh, _ = solver.run_request(changed_library(data))
+    result, _ = solver.run_request({**changed_library(data), "previous": previous, "incrementalMode": "keep"})
+
+    assert result["incremental"]["fallback"] == "warm"
+    assert result["status"] == "optimal"
+    assert result["objective"] == fresh["objective"]
+
+@requires_highs
+def test_an_unchanged_request_reuses_a_proven_optimum():
+    data = library(6, seed=1)
+    previous, _ = solver.run_request(copy.deepcopy(data))
+    result, _ = solver.run_request({**data, "previous": previous, "mipGap": 0.5})
+
+    assert result["incremental"]["reused"]
+    assert result["validDays"] == previous["validDays"]
+
+@requires_highs
+def test_an_unchanged_request_re_solves_a_result_stopped_at_a_limit():
+    data = library(6, seed=1)
+    previous, _ = solver.run_request(copy.deepcopy(data))
+    previous["status"] = "timeLimit"
+    previous["fingerprint"]["solve"]["timeLimit"] = 0.01
+
+    result, _ = solver.run_request({**copy.deepcopy(data), "previous": previous})
+    assert not result["incremental"]["reused"]
+    assert result["incremental"]["mode"] == "warm"
+    assert result["status"] == "optimal"
+
+    again, _ = solver.run_request({**copy.deepcopy(data), "previous": previous, "timeLimit": 0.01})
+    assert again["incremental"]["reused"]
+
+@pytest.mark.parametrize("previous, message", [
+    ({"error": "Solver exception: infeasible"}, "error response"),
+    ({"status": "optimal", "streamedDays": 3}, "streamed"),
+    ({"status": "optimal", "days": []}, "no validDays"),
+    ({"status": "optimal", "validDays": [{"meals": ["Meal 0"]}]}, "positions"),
+])
+def test_unusable_previous_results_are_rejected(previous, message):
+    with pytest.raises(ValueError, match=message):
+        solver.run_request({**library(4), "previous": previous})
+
+def test_unknown_incremental_mode_is_rejected():
+    with pytest.raises(ValueError, match="incremental mode"):
+        solver.run_request({**library(4), "incrementalMode": "reuse"})
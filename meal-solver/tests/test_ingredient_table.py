@@ -0,0 +1,53 @@
+import copy
+import pytest
+import numpy as np
+import solver
+from ingredient_table import build_table, save_table, load_table, TableMacros, per_gram_values
+from conftest import library, requires_highs
+
+def table_file(tmp_path, macros):
+    path = tmp_path / "table.npy"
+    save_table(build_table(macros), path)
+    return path
+
+def test_per_gram_values_read_table_columns_with_request_overrides(tmp_path):
+    data = library(4)
+    table = load_table(table_file(tmp_path, data["ingredientMacros"]))
+    own = {"rice": {"calories_per_gram": 9.0, "protein_per_gram": 0.5}}
+    rows = {name: table.ids[name] for name in ("chicken", "oats")}
+    macros = TableMacros(table, own, rows)
+
+    names = ["oats", "rice", "chicken"]
+    expected = [data["ingredientMacros"]["oats"]["calories_per_gram"], 9.0,
+                data["ingredientMacros"]["chicken"]["calories_per_gram"]]
+    assert np.array_equal(per_gram_values(macros, names, "calories_per_gram"), expected)
+    assert dict(macros["oats"]) == data["ingredientMacros"]["oats"]
+    assert sorted(macros) == ["chicken", "oats", "rice"]
+
+@requires_highs
+def test_requests_by_id_match_requests_by_name(tmp_path):
+    data = library(8, seed=3)
+    data["ingredientMacros"]["rice"] = {"calories_per_gram": 1.5, "protein_per_gram": 0.03}
+    table_macros = {**data["ingredientMacros"], "rice": {"calories_per_gram": 1.3, "protein_per_gram": 0.027}}
+    solver.configure_ingredient_table(table_file(tmp_path, table_macros))
+    try:
+        by_id = copy.deepcopy(data)
+        by_id["ingredientMacros"] = {"rice": data["ingredientMacros"]["rice"]}
+        for meal in by_id["meals"]:
+            meal["ingredients"] = [{"id": solver.ingredient_table.ids[ing.pop("name")], **ing}
+                                   for ing in meal["ingredients"]]
+        result, _ = solver.run_request(by_id)
+    finally:
+        solver.configure_ingredient_table(None)
+    expected, _ = solver.run_request(copy.deepcopy(data))
+
+    result.pop("metrics")
+    expected.pop("metrics")
+    assert result == expected
+
+@pytest.mark.parametrize("ingredient_id, message", [("3", "integer"), (2.0, "integer"), (True, "integer"),
+                                                    (99, "not in the ingredient table")])
+def test_bad_ingredient_ids_are_rejected(tmp_path, ingredient_id, message):
+    table = load_table(table_file(tmp_path, library(4)["ingredientMacros"]))
+    with pytest.raises(ValueError, match=message):
+        table.name_of(ingredient_id)
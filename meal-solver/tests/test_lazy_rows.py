@@ -0,0 +1,31 @@
+import copy
+import pytest
+import solver
+from conftest import library, requires_highs
+
+@requires_highs
+@pytest.mark.parametrize("seed", [0, 3, 7])
+def test_lazy_rows_certify_the_full_model_optimum(seed):
+    data = library(8, seed=seed)
+    full, _ = solver.run_request(copy.deepcopy(data))
+    lazy, _ = solver.run_request({**copy.deepcopy(data), "lazyRows": True})
+
+    assert lazy["lazyRows"]["certified"]
+    assert lazy["lazyRows"]["windowCombinations"] <= lazy["lazyRows"]["combinations"]
+    assert lazy["status"] == "optimal"
+    assert lazy["objective"] == full["objective"] == len(lazy["validDays"])
+
+@requires_highs
+def test_lazy_days_meet_the_daily_window():
+    # Every reported day passed the exact window check, not just the relaxation
+    data = library(8, seed=3)
+    result, _ = solver.run_request({**copy.deepcopy(data), "lazyRows": True})
+
+    assert result["validDays"]
+    for day in result["validDays"]:
+        assert abs(day["totals"]["calories"] - data["targetCalories"]) <= 100.1
+        assert abs(day["totals"]["protein"] - data["targetProtein"]) <= 10.1
+
+def test_lazy_rows_need_the_matrix_builder():
+    with pytest.raises(ValueError, match="matrix builder"):
+        solver.run_request({**library(4), "lazyRows": True, "builder": "rules"})
@@ -0,0 +1,37 @@
+import copy
+import numpy as np
+import pytest
+import lp_screen
+import solver
+from lp_screen import screen_combinations
+from conftest import library, requires_highs
+
+def problem_of(data):
+    meals, macros = solver.resolve_ingredients(data["meals"], data["ingredientMacros"])
+    return solver.prepare_problem(meals, macros, data["mealsPerDay"], data["targetCalories"], data["targetProtein"])
+
+@requires_highs
+@pytest.mark.parametrize("seed", [0, 2, 5])
+def test_screening_drops_only_combinations_no_plan_uses(seed):
+    data = library(10, seed=seed)
+    problem = problem_of(data)
+    feasible, portions = screen_combinations(problem)
+    dropped = {combo for combo, ok in zip(problem["combinations"], feasible.tolist()) if not ok}
+    full, _ = solver.run_request(copy.deepcopy(data))
+    screened, _ = solver.run_request({**copy.deepcopy(data), "lpScreening": True})
+
+    assert len(portions) == feasible.sum()
+    assert not any(tuple(day["meals"]) in dropped for day in full["validDays"])
+    assert screened["lpScreening"]["infeasible"] == len(dropped)
+    assert screened["objective"] == full["objective"]
+    assert screened["lpScreening"]["startDays"] <= screened["objective"]
+
+@requires_highs
+def test_parallel_screening_matches_a_single_worker(monkeypatch):
+    monkeypatch.setattr(lp_screen, "CHUNK_SIZE", 16)
+    problem = problem_of(library(10, seed=2))
+    serial, _ = screen_combinations(problem, workers=1)
+    parallel, _ = screen_combinations(problem, workers=2)
+
+    assert len(problem["combinations"]) > 16
+    assert np.array_equal(serial, parallel)
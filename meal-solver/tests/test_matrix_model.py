@@ -0,0 +1,25 @@
+import copy
+import pytest
+import solver
+from conftest import library, requires_highs
+
+@requires_highs
+@pytest.mark.parametrize("seed, meals_per_day", [(0, 3), (3, 3), (6, 2)])
+def test_matrix_builder_reaches_the_rule_model_optimum(seed, meals_per_day):
+    data = library(7, seed=seed, meals_per_day=meals_per_day)
+    matrix, _ = solver.run_request(copy.deepcopy(data))
+    rules, _ = solver.run_request({**copy.deepcopy(data), "builder": "rules"})
+
+    assert matrix["status"] == rules["status"] == "optimal"
+    assert matrix["objective"] == rules["objective"] == len(matrix["validDays"])
+
+@requires_highs
+def test_matrix_days_meet_the_daily_window():
+    data = library(8, seed=3)
+    result, _ = solver.run_request(copy.deepcopy(data))
+
+    # Daily slack of 100 kcal and 10 g protein, plus the 0.1 rounding of the totals
+    assert result["validDays"]
+    for day in result["validDays"]:
+        assert abs(day["totals"]["calories"] - data["targetCalories"]) <= 100.1
+        assert abs(day["totals"]["protein"] - data["targetProtein"]) <= 10.1
@@ -0,0 +1,37 @@
+import copy
+from itertools import product
+import numpy as np
+import solver
+from meal_classes import ordered_choices
+from conftest import library, requires_highs
+
+def follows_input_order(day, meals):
+    order = [meal["name"] for meal in meals]
+    ranked = sorted(day["meals"], key=order.index)
+    return all(day["positions"][m] == p for p, m in enumerate(ranked))
+
+def test_ordered_choices_counts_increasing_picks():
+    slots = [np.array([0, 4, 9]), np.array([2, 5]), np.array([3, 6, 10])]
+    expected = sum(1 for choice in product(*slots) if choice[0] < choice[1] < choice[2])
+    assert ordered_choices(slots) == expected
+
+@requires_highs
+def test_collapsed_plan_is_a_plan_of_the_full_model():
+    data = library(8, seed=4, duplicates=3)
+    full, _ = solver.run_request(copy.deepcopy(data))
+    collapsed, _ = solver.run_request({**copy.deepcopy(data), "collapseMeals": True})
+
+    assert full["status"] == "optimal"
+    assert collapsed["status"] == "optimalGivenClasses"
+    assert collapsed["objective"] == len(collapsed["validDays"])
+    assert collapsed["objective"] <= full["objective"]
+    assert all(follows_input_order(day, data["meals"]) for day in collapsed["validDays"])
+
+@requires_highs
+def test_collapse_without_duplicates_matches_full_model():
+    data = library(8, seed=4)
+    full, _ = solver.run_request(copy.deepcopy(data))
+    collapsed, _ = solver.run_request({**copy.deepcopy(data), "collapseMeals": True})
+
+    assert collapsed["status"] == "optimal"
+    assert collapsed["objective"] == full["objective"]
@@ -0,0 +1,45 @@
+import copy
+import pytest
+import solver
+from conftest import library, requires_highs
+
+CARBS = {
+    "chicken": 0.0, "rice": 0.28, "olive oil": 0.0, "broccoli": 0.07, "salmon": 0.0, "oats": 0.66,
+    "egg": 0.01, "greek yogurt": 0.04, "banana": 0.23, "beef": 0.0, "potato": 0.17, "tofu": 0.02,
+}
+FIBER = {name: round(carbs / 10, 3) for name, carbs in CARBS.items()}
+
+def tracked_library(num_meals, seed, nutrients):
+    data = library(num_meals, seed=seed)
+    for name, macros in data["ingredientMacros"].items():
+        macros.update(carbs_per_gram=CARBS[name], fiber_per_gram=FIBER[name])
+    return {**data, "nutrients": nutrients}
+
+@requires_highs
+def test_days_and_meals_stay_within_the_nutrient_bounds():
+    bounds = {"carbs": {"meal": {"max": 100}, "day": {"min": 120, "max": 220}}, "fiber": {"day": {"min": 12}}}
+    free, _ = solver.run_request(tracked_library(8, 2, {"carbs": {}, "fiber": {}}))
+    bounded, _ = solver.run_request(tracked_library(8, 2, bounds))
+
+    assert bounded["status"] == "optimal"
+    assert 0 < bounded["objective"] < free["objective"]
+    for day in bounded["validDays"]:
+        assert 120 - 0.1 <= day["totals"]["carbs"] <= 220 + 0.1
+        assert day["totals"]["fiber"] >= 12 - 0.1
+        assert all(meal["totalCarbs"] <= 100 + 0.1 for meal in day["mealsDetailed"].values())
+
+@requires_highs
+def test_loose_nutrient_bounds_keep_the_optimum():
+    data = tracked_library(8, 2, {"carbs": {"day": {"max": 10000}}})
+    plain, _ = solver.run_request({k: v for k, v in copy.deepcopy(data).items() if k != "nutrients"})
+    loose, _ = solver.run_request(data)
+
+    assert loose["objective"] == plain["objective"]
+
+@pytest.mark.parametrize("nutrients, message", [
+    ({"carbs": {"day": {"min": 300, "max": 200}}}, "minimum above its maximum"),
+    ({"sugar": {"day": {"max": 50}}}, "sugar_per_gram"),
+])
+def test_bad_nutrient_bounds_are_rejected(nutrients, message):
+    with pytest.raises(ValueError, match=message):
+        solver.run_request(tracked_library(4, 0, nutrients))
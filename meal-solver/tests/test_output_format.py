@@ -0,0 +1,57 @@
+import copy
+import json
+import pytest
+import solver
+from output_format import compact_result, expand_result, encode
+from conftest import library, requires_highs
+
+def without_metrics(result):
+    return {k: v for k, v in result.items() if k != "metrics"}
+
+def standard_result(data):
+    # As a client reads it back: JSON types only
+    result, _ = solver.run_request(copy.deepcopy(data))
+    return json.loads(json.dumps(without_metrics(result)))
+
+@requires_highs
+@pytest.mark.parametrize("mode", [
+    {},
+    {"weekly": {"days": 5}},
+    {"targets": [{"targetCalories": 2000, "targetProtein": 150}, {"targetCalories": 1800, "targetProtein": 140}]},
+])
+def test_compact_result_expands_back_to_the_standard_one(mode):
+    result = standard_result({**library(8, seed=2), **mode})
+    compact = json.loads(json.dumps(compact_result(result)))
+
+    assert expand_result(compact) == result
+    assert len(json.dumps(compact)) < len(json.dumps(result)) / 2
+
+@requires_highs
+def test_compact_requests_answer_the_compacted_standard_result():
+    data = library(8, seed=2)
+    standard = standard_result(data)
+    compact, _ = solver.run_request({**copy.deepcopy(data), "outputFormat": "compact"})
+
+    assert compact["format"] == "compact"
+    assert expand_result(json.loads(json.dumps(without_metrics(compact)))) == standard
+
+@requires_highs
+def test_a_compact_result_can_be_the_previous_of_an_incremental_solve():
+    data = library(8, seed=2)
+    previous, _ = solver.run_request({**copy.deepcopy(data), "outputFormat": "compact"})
+    result, _ = solver.run_request({**copy.deepcopy(data), "previous": previous})
+
+    assert result["incremental"]["reused"]
+    assert result["validDays"] == standard_result(data)["validDays"]
+
+@requires_highs
+def test_msgpack_encoding_round_trips_a_compact_result():
+    msgpack = pytest.importorskip("msgpack")
+    result = compact_result(standard_result(library(8, seed=2)))
+
+    assert msgpack.unpackb(encode(result, "msgpack"), raw=False) == result
+    assert json.loads(encode(result, "json")) == result
+
+def test_compact_results_cannot_be_streamed():
+    with pytest.raises(ValueError, match="streamed"):
+        solver.run_request({**library(4), "outputFormat": "compact"}, on_day=lambda day: None)
@@ -0,0 +1,45 @@
+import copy
+from itertools import combinations
+import numpy as np
+import prescreen
+import solver
+from prescreen import feasible_combinations
+from conftest import library, requires_highs
+
+def intervals(num_meals, seed):
+    rng = np.random.default_rng(seed)
+    cal_lo = rng.uniform(200, 700, num_meals)
+    prot_lo = rng.uniform(10, 50, num_meals)
+    cal_hi = cal_lo + rng.uniform(0, 300, num_meals)
+    prot_hi = prot_lo + rng.uniform(0, 30, num_meals)
+    usable = np.ones(num_meals, dtype=bool)
+    usable[0] = False
+    return np.where(usable, cal_lo, np.inf), cal_hi, prot_lo, prot_hi, usable
+
+def test_blocked_screen_matches_a_scan_of_every_combination(monkeypatch):
+    # A block size that does not divide the combination count exercises the last partial block
+    monkeypatch.setattr(prescreen, "BLOCK_SIZE", 7)
+    cal_lo, cal_hi, prot_lo, prot_hi, usable = bounds = intervals(9, seed=1)
+    calories, protein = (1800, 2200), (120, 180)
+
+    kept, total = feasible_combinations(bounds, 3, calories, protein)
+
+    expected = [c for c in combinations(range(9), 3)
+                if cal_lo[list(c)].sum() <= calories[1] and cal_hi[list(c)].sum() >= calories[0]
+                and prot_lo[list(c)].sum() <= protein[1] and prot_hi[list(c)].sum() >= protein[0]]
+    assert total == 84
+    assert [tuple(row) for row in kept.tolist()] == expected
+    assert not any(0 in row for row in kept.tolist())
+
+@requires_highs
+def test_pruned_model_reaches_the_unpruned_optimum():
+    data = library(8, seed=0)
+    meals, macros = solver.resolve_ingredients(data["meals"], data["ingredientMacros"])
+    args = (meals, macros, data["mealsPerDay"], data["targetCalories"], data["targetProtein"])
+
+    pruned = solver.generate_optimized_days(*copy.deepcopy(args), backend="highs")
+    full = solver.generate_optimized_days(*copy.deepcopy(args), prescreen=False, backend="highs")
+
+    assert full["pruning"]["pruned"] == 0
+    assert pruned["pruning"]["kept"] < full["pruning"]["kept"]
+    assert pruned["objective"] == full["objective"]
@@ -0,0 +1,66 @@
+import json
+import os
+import signal
+import time
+import solver
+from conftest import library, requires_highs
+
+run_timed_request = solver.run_timed_request
+
+def crashing_request(data, parse_seconds=None):
+    # Stands in for a segfault or an OOM kill inside the worker
+    if data.get("crash"):
+        os.kill(os.getpid(), signal.SIGKILL)
+    return run_timed_request(data, parse_seconds)
+
+def sleeping_request(data, parse_seconds=None):
+    time.sleep(data.get("sleep", 0))
+    return {"status": "optimal"}, 0.0, False, None
+
+def stream(requests, workers, monkeypatch, ordered=True):
+    monkeypatch.setattr(solver, "run_timed_request", crashing_request)
+    responses = []
+    counts = solver.process_stream([json.dumps(r) for r in requests], workers, None, responses.append,
+                                   ordered=ordered)
+    return responses, counts
+
+@requires_highs
+def test_worker_crash_fails_only_its_own_request(monkeypatch):
+    requests = [{**library(6, seed=i), "id": f"r{i}"} for i in range(5)]
+    requests[1]["crash"] = True
+
+    responses, counts = stream(requests, 2, monkeypatch)
+
+    assert [r["id"] for r in responses] == [f"r{i}" for i in range(5)]
+    assert "crashed" in responses[1]["error"]
+    assert all(r["result"]["status"] == "optimal" for i, r in enumerate(responses) if i != 1)
+    assert counts == {"ok": 4, "error": 1}
+
+@requires_highs
+def test_stream_keeps_serving_after_repeated_crashes(monkeypatch):
+    requests = [{**library(5, seed=i), "id": f"r{i}", "crash": i in (0, 3)} for i in range(6)]
+
+    responses, counts = stream(requests, 1, monkeypatch, ordered=False)
+
+    failed = sorted(r["id"] for r in responses if "error" in r)
+    assert failed == ["r0", "r3"]
+    assert counts == {"ok": 4, "error": 2}
+
+def test_ordered_stream_reads_a_bounded_window_ahead(monkeypatch):
+    # A slow first request must not let every later answer pile up behind it
+    monkeypatch.setattr(solver, "run_timed_request", sleeping_request)
+    read = [0]
+    read_when_written = []
+
+    def lines():
+        for i in range(30):
+            read[0] += 1
+            yield json.dumps({"id": i, "sleep": 0.5 if i == 0 else 0})
+
+    def respond(response):
+        read_when_written.append(read[0])
+
+    solver.process_stream(lines(), 2, None, respond, ordered=True)
+
+    assert len(read_when_written) == 30
+    assert read_when_written[0] <= 2 * 2 + 1
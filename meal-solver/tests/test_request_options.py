@@ -0,0 +1,37 @@
+import pytest
+import solver
+from conftest import library, requires_highs
+
+MODES = {
+    "weekly": {"weekly": {"days": 3}},
+    "targets": {"targets": [{"targetCalories": 2000, "targetProtein": 150}]},
+}
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("option, value", [
+    ("builder", "rules"), ("lazyRows", True), ("engine", "heuristic"), ("lpScreening", True),
+    ("collapseMeals", True), ("previous", {"validDays": []}),
+])
+def test_day_plan_options_are_rejected_in_other_modes(mode, option, value):
+    with pytest.raises(ValueError, match=f"{mode} cannot be combined with {option}"):
+        solver.run_request({**library(4), **MODES[mode], option: value})
+
+def test_targets_reject_formulation_and_weekly():
+    with pytest.raises(ValueError, match="formulation, weekly|weekly, formulation"):
+        solver.run_request({**library(4), **MODES["targets"], **MODES["weekly"], "formulation": "tight"})
+
+@requires_highs
+@pytest.mark.parametrize("mode", MODES)
+def test_default_valued_options_are_accepted(mode):
+    result, _ = solver.run_request({**library(5), **MODES[mode], "builder": "matrix", "engine": "mip",
+                                    "lazyRows": False})
+    assert "error" not in result
+
+@pytest.mark.parametrize("meals_per_day", [3, 5])
+def test_unknown_weekly_variety_is_rejected(meals_per_day):
+    with pytest.raises(ValueError, match="variety"):
+        solver.week_settings(meals_per_day, variety="plenty")
+
+def test_variety_without_ranges_uses_meals_per_day():
+    week = solver.week_settings(5, variety="lots")
+    assert (week["min_unique"], week["max_unique"]) == (5, 5)
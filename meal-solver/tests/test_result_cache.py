@@ -0,0 +1,59 @@
+import copy
+import result_cache
+import solver
+from result_cache import ResultCache, cache_key
+from conftest import library, requires_highs
+
+def key_of(data):
+    return cache_key(data["meals"], data["ingredientMacros"], data["mealsPerDay"], data["targetCalories"],
+                     data["targetProtein"])
+
+def test_memory_tier_evicts_the_least_recently_used_entry():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"objective": 1})
+    cache.put("b", {"objective": 2})
+    assert cache.get("a") == {"objective": 1}
+    cache.put("c", {"objective": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"objective": 1}
+    assert cache.get("c") == {"objective": 3}
+    assert cache.stats()["memoryEntries"] == 2
+
+def test_disk_tier_outlives_the_process_cache(tmp_path):
+    path = str(tmp_path / "results.db")
+    ResultCache(disk_path=path).put("a", {"objective": 1})
+
+    cache = ResultCache(disk_path=path)
+    assert cache.get("a") == {"objective": 1}
+    assert cache.get("a") == {"objective": 1}
+    assert cache.stats()["diskHits"] == 1
+    assert cache.stats()["memoryHits"] == 1
+
+def test_key_ignores_unused_ingredients_and_follows_the_cache_version(monkeypatch):
+    data = library(4)
+    extended = copy.deepcopy(data)
+    extended["ingredientMacros"]["kale"] = {"calories_per_gram": 0.5, "protein_per_gram": 0.04}
+    assert key_of(extended) == key_of(data)
+
+    changed = copy.deepcopy(data)
+    changed["meals"][0]["ingredients"][2]["grams"] += 1
+    assert key_of(changed) != key_of(data)
+
+    old = key_of(data)
+    monkeypatch.setattr(result_cache, "CACHE_VERSION", result_cache.CACHE_VERSION + 1)
+    assert key_of(data) != old
+
+@requires_highs
+def test_repeated_request_is_answered_from_the_cache(tmp_path):
+    solver.configure_cache({"disk_path": str(tmp_path / "results.db")})
+    try:
+        data = library(6, seed=1)
+        first, first_hit = solver.run_request(copy.deepcopy(data))
+        second, second_hit = solver.run_request(copy.deepcopy(data))
+        other, other_hit = solver.run_request({**copy.deepcopy(data), "targetCalories": 1900})
+    finally:
+        solver.configure_cache(None)
+
+    assert not first_hit and second_hit and not other_hit
+    assert second["validDays"] == first["validDays"]
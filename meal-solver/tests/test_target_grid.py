@@ -0,0 +1,38 @@
+import copy
+import solver
+from conftest import library, requires_highs
+
+TARGETS = [(2000, 150), (1600, 120), (2400, 170), (2000, 110)]
+
+def grid_request(data):
+    return {**copy.deepcopy(data),
+            "targets": [{"targetCalories": c, "targetProtein": p} for c, p in TARGETS]}
+
+@requires_highs
+def test_grid_matches_one_solve_per_target():
+    data = library(8, seed=2)
+    grid, _ = solver.run_request(grid_request(data))
+
+    assert [(r["targetCalories"], r["targetProtein"]) for r in grid["results"]] == TARGETS
+    for (calories, protein), result in zip(TARGETS, grid["results"]):
+        single, _ = solver.run_request({**copy.deepcopy(data), "targetCalories": calories, "targetProtein": protein})
+        assert result["status"] == single["status"] == "optimal"
+        assert result["objective"] == single["objective"] == len(result["validDays"])
+        for day in result["validDays"]:
+            assert abs(day["totals"]["calories"] - calories) <= 100.1
+            assert abs(day["totals"]["protein"] - protein) <= 10.1
+
+@requires_highs
+def test_grid_targets_are_cached_one_by_one(tmp_path):
+    data = library(6, seed=1)
+    solver.configure_cache({"disk_path": str(tmp_path / "results.db")})
+    try:
+        single, _ = solver.run_request(copy.deepcopy(data))
+        grid, grid_hit = solver.run_request(grid_request(data))
+        again, again_hit = solver.run_request(grid_request(data))
+    finally:
+        solver.configure_cache(None)
+
+    assert not grid_hit and again_hit
+    assert grid["results"][0]["validDays"] == single["validDays"]
+    assert [r["objective"] for r in again["results"]] == [r["objective"] for r in grid["results"]]